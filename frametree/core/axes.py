@@ -136,11 +136,13 @@ class Axes(Enum):
     def __invert__(self) -> "Axes":
         return type(self)(~self.value)
 
+    # `_value_` is accessed directly (instead of the `value` property) as hashing
+    # frequencies is in the inner loop of data tree construction
     def __hash__(self) -> int:
-        return self.value  # type: ignore[no-any-return]
+        return self._value_  # type: ignore[no-any-return]
 
     def __bool__(self) -> bool:
-        return bool(self.value)
+        return bool(self._value_)
 
     def bin(self) -> str:
         return bin(self.value)
@@ -71,10 +71,22 @@ class DataCell:
     def intersection(
         cls, column: DataColumn, row: DataRow, allow_empty: ty.Optional[bool] = None
     ) -> DataCell:
+        """Returns the cell at the intersection of the column and the row. Cells are
+        cached in the row until the entries of the row change, so repeated calls on
+        an unchanged tree don't need to match the entries against the column again
+        """
         if allow_empty is None:
             allow_empty = column.is_sink
-        return cls(
-            row=row,
-            column=column,
-            entry=column.match_entry(row, allow_none=allow_empty),
-        )
+        cell = row._cells.get(column.name)
+        if (
+            cell is None
+            or cell.column is not column
+            or (cell.is_empty and not allow_empty)
+        ):
+            cell = cls(
+                row=row,
+                column=column,
+                entry=column.match_entry(row, allow_none=allow_empty),
+            )
+            row._cells[column.name] = cell
+        return cell
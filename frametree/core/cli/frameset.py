@@ -3,6 +3,7 @@ import click
 import logging
 from frametree.core.frameset.base import FrameSet
 from frametree.core.store import Store
+from frametree.core.store.transfer import TransferMode
 from frametree.core.axes import Axes
 from fileformats.core import DataType
 from frametree.core.serialize import ClassResolver
@@ -343,6 +344,15 @@ COLUMN_NAMES, [COLUMN_NAMES, ...] to be included in the export, by default all w
         "names, or whether to use the original paths in the source store"
     ),
 )
+@click.option(
+    "--transfer-mode",
+    type=click.Choice([m.name for m in TransferMode]),
+    default=None,
+    help=(
+        "how the files of the exported data items are transferred into the destination "
+        "store, by default the transfer mode of the destination store is used"
+    ),
+)
 def export(
     address,
     store_nickname,
@@ -351,6 +361,7 @@ def export(
     id_pattern,
     hierarchy,
     use_original_paths,
+    transfer_mode,
 ):
     dataset = FrameSet.load(address)
     store = Store.load(store_nickname)
@@ -365,6 +376,7 @@ def export(
         id_patterns=id_pattern,
         hierarchy=hierarchy,
         use_original_paths=use_original_paths,
+        transfer_mode=transfer_mode,
     )
 
 
@@ -3,6 +3,7 @@ from operator import itemgetter
 import click
 
 from frametree.core.exceptions import FrameTreeUsageError
+from frametree.core.frameset import FrameSet
 from frametree.core.serialize import ClassResolver
 from frametree.core.store import Store
 from frametree.core.utils import get_home_dir
@@ -155,3 +156,52 @@ def ls():
             if key == "password":
                 val = "********"
             click.echo(f"    {key}: {val}")
+
+
+@store.command(
+    help="""Warms the local cache of a remote store by downloading the items in the
+given columns of a frameset in parallel, so they don't need to be downloaded when they
+are used (e.g. by a pipeline). Reports the transfer rate and any items that could not
+be downloaded
+
+ADDRESS of the dataset including store and dataset name (where
+    applicable), e.g. central-xnat//MYXNATPROJECT:pass_t1w_qc
+
+COLUMN_NAMES, [COLUMN_NAMES, ...] for the columns to download, defaults to all source
+columns
+"""
+)
+@click.argument("address")
+@click.argument("column_names", nargs=-1)
+@click.option(
+    "--id",
+    "ids",
+    multiple=True,
+    default=None,
+    help="The IDs of the rows to download the items of, defaults to all rows",
+)
+@click.option(
+    "--max-workers",
+    "-w",
+    type=int,
+    default=8,
+    help="The maximum number of items to download at the same time",
+)
+def warm(address, column_names, ids, max_workers):
+    frameset = FrameSet.load(address)
+    if not column_names:
+        column_names = [n for n, c in frameset.columns.items() if not c.is_sink]
+    report = frameset.prefetch(
+        column_names, ids=(ids if ids else None), max_workers=max_workers
+    )
+    click.echo(
+        f"Downloaded {report.num_items} items ({report.num_bytes} bytes) in "
+        f"{report.duration:.1f} s ({report.rate:.0f} bytes/s)"
+    )
+    if report.failures:
+        click.echo(f"{len(report.failures)} items could not be downloaded:")
+        for key, error in sorted(report.failures.items()):
+            click.echo(f"    {key}: {error}")
+        raise click.ClickException(
+            f"Failed to download {len(report.failures)} items of {address}"
+        )
@@ -132,7 +132,10 @@ def test_define_cli(dataset: FrameSet, cli_runner):
     assert loaded_dataset.exclude == excluded
 
 
-def test_export_import_roundtrip(cli_runner, work_dir: Path, frametree_home):
+@pytest.mark.parametrize("transfer_mode", [None, "hardlink"])
+def test_export_import_roundtrip(
+    cli_runner, work_dir: Path, frametree_home, transfer_mode
+):
     blueprint = TEST_DATASET_BLUEPRINTS["skip_single"]
     cache_dir = work_dir / "remote-cache"
     cache_dir.mkdir()
@@ -160,14 +163,10 @@ def test_export_import_roundtrip(cli_runner, work_dir: Path, frametree_home):
     original.save()
     local_dataset_id = str(work_dir / "exported")
     # Add source column to saved dataset
-    result = cli_runner(
-        export,
-        [
-            original.address,
-            "file_system",
-            local_dataset_id,
-        ],
-    )
+    args = [original.address, "file_system", local_dataset_id]
+    if transfer_mode is not None:
+        args.extend(["--transfer-mode", transfer_mode])
+    result = cli_runner(export, args)
     assert result.exit_code == 0, show_cli_trace(result)
     local_dataset = FileSystem().load_frameset(local_dataset_id)
     result = cli_runner(
@@ -1,6 +1,11 @@
-from frametree.core.cli.store import add, ls, remove, rename
+from fileformats.generic import Directory
+
+from frametree.core.cli.store import add, ls, remove, rename, warm
+from frametree.core.entry import item_cache
 from frametree.core.utils import show_cli_trace
 from frametree.core.store import Store
+from frametree.testing import MockRemote
+from frametree.testing.blueprint import TEST_DATASET_BLUEPRINTS
 
 STORE_URI = "http://dummy.uri"
 STORE_USER = "a_user"
@@ -120,3 +125,31 @@ def test_store_cli_encrypt_credentials(cli_runner, frametree_home, work_dir):
     assert loaded_store.password is not STORE_PASSWORD
     assert loaded_store.user != ""
     assert loaded_store.user is not STORE_USER
+
+
+def test_store_cli_warm(cli_runner, frametree_home, work_dir):
+    remote_dir = work_dir / "remote-dir"
+    remote_dir.mkdir()
+    (work_dir / "remote-cache").mkdir()
+    mock_remote = MockRemote(
+        server=STORE_URI,
+        user=STORE_USER,
+        password=STORE_PASSWORD,
+        cache_dir=work_dir / "remote-cache",
+        remote_dir=remote_dir,
+    )
+    mock_remote.save("warm_mock_remote")
+    blueprint = TEST_DATASET_BLUEPRINTS["skip_single"]
+    dataset = blueprint.make_dataset(store=mock_remote, dataset_id="warmed")
+    dataset.add_source("doubledir1", Directory, path="doubledir1")
+    dataset.add_source("doubledir2", Directory, path="doubledir2")
+    dataset.save()
+    mock_remote.clear_cache()
+    item_cache.clear()
+    result = cli_runner(warm, [dataset.address, "doubledir1", "--max-workers", "4"])
+    assert result.exit_code == 0, show_cli_trace(result)
+    assert "Downloaded 12 items" in result.output
+    assert "bytes/s" in result.output
+    cached = list((work_dir / "remote-cache" / "warmed").glob("leaves/*/doubledir1"))
+    assert len(cached) == 12
+    assert not list((work_dir / "remote-cache" / "warmed").glob("leaves/*/doubledir2"))
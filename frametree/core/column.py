@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import functools
 import inspect
 import logging
 import re
@@ -30,6 +31,24 @@ if ty.TYPE_CHECKING:  # pragma: no cover
 logger = logging.getLogger("frametree")
 
 
+@functools.lru_cache(maxsize=None)
+def compile_path(path: str) -> ty.Tuple[ty.Tuple[str, ...], ty.Optional[str]]:
+    """Splits a column path into its sections (to compare against
+    ``DataEntry.path_parts``) and the dataset name, so it is only done once per path
+    instead of for every entry that is matched against the column"""
+    base_path, dataset_name = DataEntry.split_dataset_name_from_path(path)
+    return tuple(DataEntry.path_split_re.split(base_path)), dataset_name
+
+
+@functools.lru_cache(maxsize=None)
+def compile_path_regex(pattern: str) -> re.Pattern:
+    """Compiles a regular-expression column path, allowing paths to match with
+    additional text after a '/' or a '.' but not additional characters otherwise"""
+    if not pattern.endswith("$"):
+        pattern += r"(?:(?:/|\.).*)?$"
+    return re.compile(pattern)
+
+
 def datatype_converter(datatype: ty.Union[type, str]) -> ty.Type[DataType]:
     """Convert a datatype to a DataType subclass if it is not already one
 
@@ -81,6 +100,11 @@ class DataColumn(metaclass=ABCMeta):
     _mismatch_log: list = attrs.field(
         default=None, eq=False, hash=False, repr=False, init=False
     )
+    # The entries matched against the column in each row, along with the row and the
+    # version of its entries they were matched against (see ``cells``)
+    _cells_index: ty.Dict[
+        str, ty.Tuple[DataRow, int, ty.Union[DataEntry, None, FrameTreeDataMatchError]]
+    ] = attrs.field(factory=dict, eq=False, hash=False, repr=False, init=False)
 
     is_sink = False
 
@@ -109,7 +133,11 @@ class DataColumn(metaclass=ABCMeta):
             allow_empty=allow_empty,
         )
 
-    def cells(self, allow_empty: ty.Optional[bool] = None) -> ty.Iterable[DataCell]:
+    def cells(
+        self,
+        allow_empty: ty.Optional[bool] = None,
+        ids: ty.Optional[ty.Collection[str]] = None,
+    ) -> ty.Iterable[DataCell]:
         """Return an iterator over all cells in the column.
 
         Parameters
@@ -118,16 +146,52 @@ class DataColumn(metaclass=ABCMeta):
             whether to allow cells to be empty (i.e. if they don't match to an entry
             in the corresponding dataset row). If None, then cells of sink columns can
             be empty (i.e. not derived yet) and source columns can't, by default None
+        ids : Collection[str], optional
+            the IDs of the rows to return the cells of, by default all rows
 
         Returns
         -------
         cells : Iterable[DataCell]
             an iterator over all cells in the column
         """
-        return (
-            DataCell.intersection(self, row, allow_empty=allow_empty)
-            for row in self.frameset.rows(self.row_frequency)
-        )
+        if allow_empty is None:
+            allow_empty = self.is_sink
+        rows = list(self.frameset.rows(self.row_frequency, ids))
+        self.frameset.populate_rows(rows)
+        self._update_cells_index(rows)
+        return (self._indexed_cell(row, allow_empty) for row in rows)
+
+    def _update_cells_index(self, rows: ty.List[DataRow]) -> None:
+        """Matches the entries of the rows that have been added or changed since the
+        index was last updated against the column in a single pass, so that repeated
+        calls to ``cells`` don't need to match the entries of every row again"""
+        for row in rows:
+            indexed = self._cells_index.get(row.id)
+            if (
+                indexed is not None
+                and indexed[0] is row
+                and indexed[1] == row._entries_version
+            ):
+                continue
+            try:
+                entry = self.match_entry(row, allow_none=True)
+            except FrameTreeDataMatchError as e:
+                entry = e  # raised when the cell is accessed
+            self._cells_index[row.id] = (row, row._entries_version, entry)
+
+    def _indexed_cell(self, row: DataRow, allow_empty: bool) -> DataCell:
+        """Returns the cell of the row from the index, which must be up to date"""
+        entry = self._cells_index[row.id][2]
+        if isinstance(entry, FrameTreeDataMatchError) or (
+            entry is None and not allow_empty
+        ):
+            # Match the entries again to raise the error with its details
+            self.match_entry(row, allow_none=allow_empty)
+        cell = row._cells.get(self.name)
+        if cell is None or cell.column is not self or cell.entry is not entry:
+            cell = DataCell(row=row, column=self, entry=entry)
+            row._cells[self.name] = cell
+        return cell
 
     @property
     def ids(self) -> ty.List[str]:
@@ -188,9 +252,8 @@ class DataColumn(metaclass=ABCMeta):
 
     def matches_path(self, entry: DataEntry) -> bool:
         "that matched the path '{self.path}'"
-        path, dataset_name = DataEntry.split_dataset_name_from_path(self.path)
-        path_parts = self.path_split_re.split(path)
-        entry_parts = self.path_split_re.split(entry.base_path)[: len(path_parts)]
+        path_parts, dataset_name = compile_path(self.path)
+        entry_parts = entry.path_parts[: len(path_parts)]
         if entry_parts == path_parts:
             if dataset_name == entry.dataset_name or dataset_name == "*":
                 return True
@@ -205,8 +268,8 @@ class DataColumn(metaclass=ABCMeta):
             return self._log_mismatch(
                 entry,
                 "path sections {} do not match {}",
-                entry_parts,
-                path_parts,
+                list(entry_parts),
+                list(path_parts),
             )
 
     def matches_datatype(self, entry: DataEntry) -> bool:
@@ -224,7 +287,7 @@ class DataColumn(metaclass=ABCMeta):
                 entry.datatype,
             )
         try:
-            entry.get_item(self.datatype)
+            entry.row.frameset.store.probe_datatype(entry, self.datatype)
         except FormatMismatchError as e:
             return self._log_mismatch(entry, "datatype does not match, {}", str(e))
         else:
@@ -263,7 +326,7 @@ class DataColumn(metaclass=ABCMeta):
         return False
 
     # Split a path into sections delimited by '/' or '.'
-    path_split_re = re.compile(r"/|\.|@")
+    path_split_re = DataEntry.path_split_re
 
     def __bytes_repr__(self, cache):
         """For Pydra input hashing"""
@@ -356,16 +419,12 @@ class SourceColumn(DataColumn):
 
     def matches_path_regex(self, entry: DataEntry) -> bool:
         "that matched the path pattern '{self.path}'"
-        pattern = self.path
-        if not pattern.endswith("$"):
-            # Allow paths to match with additional text after a '/' or a '.' but not
-            # additional characters otherwise
-            pattern += r"(?:(?:/|\.).*)?$"
-        if re.match(pattern, entry.path):
+        pattern = compile_path_regex(self.path)
+        if pattern.match(entry.path):
             return True
         else:
             return self._log_mismatch(
-                entry, "entry path {} doesn't match regular expression", pattern
+                entry, "entry path {} doesn't match regular expression", pattern.pattern
             )
 
     def matches_quality(self, entry: DataEntry) -> bool:
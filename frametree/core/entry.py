@@ -1,9 +1,13 @@
 from __future__ import annotations
 import typing as ty
 import os
+import re
+import sys
+import threading
+from collections import OrderedDict
 import attrs
 from pydra.utils.typing import TypeParser, optional_type, is_optional
-from fileformats.core import DataType, FileSetPrimitive, FieldPrimitive
+from fileformats.core import DataType, FileSet, FileSetPrimitive, FieldPrimitive
 from frametree.core.exceptions import FrameTreeDataMatchError, FrameTreeUsageError
 from .quality import DataQuality
 from .utils import to_datatype
@@ -68,6 +72,116 @@ class ItemMetadata:
         self._has_been_loaded = True
 
 
+@attrs.define
+class ItemCache:
+    """A bounded, least-recently used cache of the items retrieved from data entries
+    in the current process, so that repeated accesses don't need to reread (and
+    revalidate) them from the store. Items are keyed by their location in the store
+    and the datatype they were retrieved as, and are only returned if the change token
+    provided by the store (e.g. modification time or checksums) still matches.
+
+    Parameters
+    ----------
+    max_items : int
+        the maximum number of items to hold in the cache
+    max_size : int
+        the maximum (approximate) size in bytes of the items held in the cache. Note
+        that only the in-memory size of items is counted (i.e. paths not file contents)
+    """
+
+    max_items: int = 1024
+    max_size: int = 64 * 1024**2
+    hits: int = attrs.field(default=0, init=False)
+    misses: int = attrs.field(default=0, init=False)
+    _items: OrderedDict[
+        tuple[ty.Hashable, ty.Any], tuple[ty.Hashable, DataType, int]
+    ] = attrs.field(factory=OrderedDict, init=False, repr=False)
+    _size: int = attrs.field(default=0, init=False, repr=False)
+    _lock: threading.Lock = attrs.field(factory=threading.Lock, init=False, repr=False)
+
+    def get(
+        self, location: ty.Hashable, token: ty.Hashable, datatype: ty.Any
+    ) -> DataType | None:
+        """Returns the cached item if its change token matches, otherwise None"""
+        with self._lock:
+            try:
+                cached_token, item, _ = self._items[(location, datatype)]
+            except KeyError:
+                self.misses += 1
+                return None
+            if cached_token != token:
+                self._pop((location, datatype))
+                self.misses += 1
+                return None
+            self._items.move_to_end((location, datatype))
+            self.hits += 1
+            return item
+
+    def put(
+        self,
+        location: ty.Hashable,
+        token: ty.Hashable,
+        datatype: ty.Any,
+        item: DataType,
+    ) -> None:
+        """Adds an item to the cache, evicting the least recently used items if the
+        cache limits are exceeded"""
+        size = self.item_size(item)
+        if size > self.max_size:
+            return
+        with self._lock:
+            self._pop((location, datatype))
+            self._items[(location, datatype)] = (token, item, size)
+            self._size += size
+            while len(self._items) > self.max_items or self._size > self.max_size:
+                self._pop(next(iter(self._items)))
+
+    def invalidate(self, location: ty.Hashable) -> None:
+        """Drops all items cached for the given location (i.e. for any datatype)"""
+        with self._lock:
+            for key in [k for k in self._items if k[0] == location]:
+                self._pop(key)
+
+    def clear(self) -> None:
+        """Drops all items from the cache and resets the hit/miss counters"""
+        with self._lock:
+            self._items.clear()
+            self._size = 0
+            self.hits = self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @classmethod
+    def item_size(cls, item: DataType) -> int:
+        """Estimates the in-memory size of an item"""
+        if isinstance(item, FileSet):
+            return sys.getsizeof(item) + sum(
+                sys.getsizeof(str(p)) for p in item.fspaths
+            )
+        value = getattr(item, "value", item)
+        size = sys.getsizeof(value)
+        if isinstance(value, (list, tuple)):
+            size += sum(sys.getsizeof(v) for v in value)
+        return size
+
+    def _pop(self, key: tuple[ty.Hashable, ty.Any]) -> None:
+        try:
+            _, _, size = self._items.pop(key)
+        except KeyError:
+            pass
+        else:
+            self._size -= size
+
+
+# Items retrieved from data entries within the current process
+item_cache = ItemCache()
+
+
 @attrs.define()
 class DataEntry:
     """An entry in a node of the dataset tree, such as a scan in an imaging
@@ -108,6 +222,15 @@ class DataEntry:
     )
     provenance: dict[str, ty.Any] | None = attrs.field(default=None, repr=False)
 
+    # Parts of the path split up in advance, as they are compared against the paths
+    # of every column the entry's row is matched against
+    _base_path: str = attrs.field(init=False, repr=False, eq=False)
+    _dataset_name: str | None = attrs.field(init=False, repr=False, eq=False)
+    _path_parts: tuple[str, ...] = attrs.field(init=False, repr=False, eq=False)
+
+    # Split a path into sections delimited by '/' or '.'
+    path_split_re = re.compile(r"/|\.|@")
+
     def __attrs_post_init__(self) -> None:
         self.item_metadata._entry = self
         # Validate path
@@ -116,6 +239,9 @@ class DataEntry:
             raise FrameTreeUsageError(
                 f"Path '{self.path}' has an invalid dataset_name '{dataset_name}')"
             )
+        self._base_path = path
+        self._dataset_name = dataset_name
+        self._path_parts = tuple(self.path_split_re.split(path))
 
     @property
     def item(self) -> DataType:
@@ -123,20 +249,83 @@ class DataEntry:
 
     @item.setter
     def item(self, item: DataType | FileSetPrimitive | FieldPrimitive) -> None:
+        item = self._coerce_item(item)
+        store = self.row.frameset.store
+        store.put(item, self)
+        self._invalidate_item_cache()
+
+    def get_item(self, datatype: type[DataType] | None = None) -> DataType:
+        if datatype is None:
+            datatype = self.datatype
+        store = self.row.frameset.store
+        cache_key, item = self._lookup_item_cache(datatype)
+        if item is not None:
+            return item
+        item = to_datatype(store.get(self, datatype), datatype)
+        self._put_item_cache(cache_key, datatype, item)
+        return item
+
+    async def aget_item(self, datatype: type[DataType] | None = None) -> DataType:
+        """Asynchronous version of ``get_item``, which retrieves the item from the
+        store with ``Store.aget``"""
+        if datatype is None:
+            datatype = self.datatype
+        store = self.row.frameset.store
+        cache_key, item = self._lookup_item_cache(datatype)
+        if item is not None:
+            return item
+        item = to_datatype(await store.aget(self, datatype), datatype)
+        self._put_item_cache(cache_key, datatype, item)
+        return item
+
+    async def aput_item(
+        self, item: DataType | FileSetPrimitive | FieldPrimitive
+    ) -> None:
+        """Asynchronous version of setting ``item``, which puts the item into the store
+        with ``Store.aput``"""
+        item = self._coerce_item(item)
+        store = self.row.frameset.store
+        await store.aput(item, self)
+        self._invalidate_item_cache()
+
+    def _coerce_item(
+        self, item: DataType | FileSetPrimitive | FieldPrimitive
+    ) -> DataType:
         if isinstance(item, DataType):
             if not isinstance(item, self.datatype):
                 raise FrameTreeDataMatchError(
                     f"Cannot put {item} into {self.datatype} entry of {self.row}"
                 )
-        else:
-            item = to_datatype(item, self.datatype)  # type: ignore
-        self.row.frameset.store.put(item, self)
+            return item
+        return to_datatype(item, self.datatype)  # type: ignore
 
-    def get_item(self, datatype: type[DataType] | None = None) -> DataType:
-        if datatype is None:
-            datatype = self.datatype
-        item = self.row.frameset.store.get(self, datatype)
-        return to_datatype(item, datatype)
+    def _invalidate_item_cache(self) -> None:
+        cache_key = self.row.frameset.store.item_cache_key(self)
+        if cache_key is not None:
+            item_cache.invalidate(cache_key[0])
+
+    def _lookup_item_cache(
+        self, datatype: type[DataType]
+    ) -> tuple[tuple[ty.Hashable, ty.Hashable | None] | None, DataType | None]:
+        """Returns the key of the entry in the item cache, along with the cached item
+        if there is an up-to-date one"""
+        cache_key = self.row.frameset.store.item_cache_key(self)
+        if cache_key is None:
+            return None, None
+        location, token = cache_key
+        if token is None:
+            item_cache.invalidate(location)
+            return cache_key, None
+        return cache_key, item_cache.get(location, token, datatype)
+
+    @staticmethod
+    def _put_item_cache(
+        cache_key: tuple[ty.Hashable, ty.Hashable | None] | None,
+        datatype: type[DataType],
+        item: DataType,
+    ) -> None:
+        if cache_key is not None and cache_key[1] is not None:
+            item_cache.put(cache_key[0], cache_key[1], datatype, item)
 
     @property
     def recorded_checksums(self) -> dict[str, ty.Any] | None:
@@ -151,11 +340,16 @@ class DataEntry:
 
     @property
     def base_path(self) -> str:
-        return self.split_dataset_name_from_path(self.path)[0]
+        return self._base_path
 
     @property
     def dataset_name(self) -> str | None:
-        return self.split_dataset_name_from_path(self.path)[1]
+        return self._dataset_name
+
+    @property
+    def path_parts(self) -> tuple[str, ...]:
+        """The sections of the base path delimited by '/' or '.'"""
+        return self._path_parts
 
     @classmethod
     def split_dataset_name_from_path(cls, path: str) -> tuple[str, str | None]:
@@ -1,4 +1,4 @@
-from .base import FrameSet
+from .base import FrameSet, PrefetchReport
 from .metadata import Metadata
 
-__all__ = ["FrameSet", "Metadata"]
+__all__ = ["FrameSet", "Metadata", "PrefetchReport"]
@@ -1,21 +1,26 @@
 from __future__ import annotations
 
+import asyncio
 import logging
 import re
 import shutil
+import time
 import typing as ty
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from warnings import warn
 
 import attrs
 import attrs.filters
 from attrs.converters import default_if_none
+from fileformats.core import FileSet
 from fileformats.text import Plain as PlainText
 from pydra.compose import workflow
 from pydra.utils.hash import bytes_repr_mapping_contents, hash_single
 
 from frametree.core.exceptions import (
     FrameTreeDataMatchError,
+    FrameTreeError,
     FrameTreeLicenseNotFoundError,
     FrameTreeNameError,
     FrameTreeUsageError,
@@ -31,6 +36,7 @@ from ..tree import DataTree
 from .metadata import Metadata, metadata_converter
 
 if ty.TYPE_CHECKING:  # pragma: no cover
+    from frametree.core.cell import DataCell
     from frametree.core.entry import DataEntry
     from frametree.core.pipeline import Pipeline, PipelineField
 
@@ -65,6 +71,35 @@ def include_exclude_converter(
     return ids
 
 
+@attrs.define
+class PrefetchReport:
+    """Summary of the items retrieved by ``FrameSet.prefetch``
+
+    Parameters
+    ----------
+    num_items : int
+        the number of items that were retrieved
+    num_bytes : int
+        the total size of the files that were transferred from the store, i.e.
+        excluding file-sets that were already available locally
+    duration : float
+        the time taken to retrieve the items in seconds
+    failures : dict[str, str]
+        error messages for the items that couldn't be retrieved, keyed by
+        "<column>:<row-id>"
+    """
+
+    num_items: int = 0
+    num_bytes: int = 0
+    duration: float = 0.0
+    failures: ty.Dict[str, str] = attrs.field(factory=dict)
+
+    @property
+    def rate(self) -> float:
+        "The rate the files were transferred from the store at in bytes/s"
+        return self.num_bytes / self.duration if self.duration else 0.0
+
+
 @attrs.define
 class FrameSet:
     """
@@ -660,6 +695,74 @@ class FrameSet:
                 rows = (n for n in rows if n.id in set(ids))
             return rows
 
+    def populate_rows(self, rows: ty.Iterable[DataRow]) -> None:
+        """Populates the entries of the given rows that haven't already been populated
+        as a single batch, so that the store can list their entries in bulk instead of
+        one row at a time (see ``Store.populate_rows``)
+
+        Parameters
+        ----------
+        rows : Iterable[DataRow]
+            the rows to populate
+        """
+        to_populate = [r for r in rows if not r.populated]
+        if not to_populate:
+            return
+        for row in to_populate:
+            # Mark the rows as populated so they aren't repopulated if they are empty
+            row._entries_dict = {}
+        self.store.populate_rows(to_populate)
+
+    async def aiter_rows(
+        self,
+        frequency: ty.Optional[str] = None,
+        ids: ty.Optional[ty.Collection[str]] = None,
+        max_concurrency: int = 16,
+    ) -> ty.AsyncIterator[DataRow]:
+        """Iterates over the rows of the dataset, populating their entries concurrently
+        with ``Store.apopulate_row``. Rows are yielded in the order they finish being
+        populated, and their items can be retrieved concurrently with ``DataRow.aget``
+
+        Parameters
+        ----------
+        frequency : Axes, optional
+            The "frequency" of the rows, e.g. per-session, per-subject, defaults to
+            leaf rows
+        ids : Sequence[str or Tuple[str]]
+            The IDs of the rows to iterate over, by default all rows
+        max_concurrency : int
+            the maximum number of rows populated at the same time
+
+        Yields
+        ------
+        DataRow
+            the populated rows of the dataset
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def populate(row: DataRow) -> DataRow:
+            async with semaphore:
+                if not row.populated:
+                    # Mark the row as populated so it isn't repopulated if it is empty
+                    row._entries_dict = {}
+                    try:
+                        await self.store.apopulate_row(row)
+                    except BaseException:
+                        row._entries_dict = None
+                        raise
+            return row
+
+        # The rows are loaded before the first one is yielded so that the tree isn't
+        # left entered if the caller stops iterating without closing the generator
+        rows = self.rows(frequency, ids)
+        tasks = [asyncio.ensure_future(populate(r)) for r in rows]
+        try:
+            for populated in asyncio.as_completed(tasks):
+                yield await populated
+        finally:
+            for task in tasks:
+                task.cancel()
+
     def row_ids(self, frequency: ty.Optional[str] = None) -> ty.List[ty.Optional[str]]:
         """Return all the IDs in the dataset for a given row_frequency
 
@@ -803,6 +906,8 @@ class FrameSet:
         *sink_names: str,
         ids: ty.Optional[ty.Iterable[str]] = None,
         cache_dir: Path = None,
+        rows_per_job: int = 1,
+        row_workers: int = 1,
         **kwargs: ty.Any,
     ) -> list[DataColumn]:
         """Generate derivatives from the workflows
@@ -814,24 +919,137 @@ class FrameSet:
         ids : Iterable[str]
             The IDs of the data rows in each column to derive
         cache_dir
+        rows_per_job : int
+            the number of rows processed by each job. Rows are processed in a separate
+            nested workflow each by default, which adds considerable overhead for
+            cheap tasks over many rows
+        row_workers : int
+            the number of rows in each job processed at the same time
+        **kwargs
+            passed on to the pydra submitter, e.g. ``worker``. Stores that upload
+            items in the background (e.g. ``RemoteStore.async_uploads``) can only be
+            derived from by worker processes when the rows are processed in chunks,
+            as the uploads are waited for at the end of each chunk
 
         Returns
         -------
         Sequence[List[DataType]]
             The derived columns
-        """
-        from frametree.core.pipeline import Pipeline
 
+        Raises
+        ------
+        FrameTreeError
+            if any of the rows fail to be processed in chunks, once the remaining rows
+            have been processed (the errors of the rows are logged). Otherwise, the
+            error of the first row to fail is raised by the workflow
+        """
+        from frametree.core.pipeline import Pipeline, PipelineStackWorkflow
+
+        worker = kwargs.get("worker") or "debug"
+        worker_name = worker if isinstance(worker, str) else worker.plugin_name()
+        if (
+            getattr(self.store, "async_uploads", False)
+            and rows_per_job == 1
+            and worker_name != "debug"
+        ):
+            raise FrameTreeUsageError(
+                f"Cannot derive items with the '{worker_name}' worker from a store "
+                "that uploads them in the background (see 'async_uploads'), as items "
+                "put into the store by one worker process can't be waited for by the "
+                "others. Either use the 'debug' worker or process the rows in chunks "
+                "with 'rows_per_job' > 1"
+            )
         sinks = [self[s] for s in set(sink_names)]
-        for pipeline, _ in Pipeline.stack(*sinks):
-            # Execute pipelines in stack
-            # FIXME: Should combine the pipelines into a single workflow and
-            # dilate the IDs that need to be run when summarising over different
-            # data axes
-            with self.tree:
-                pipeline(ids=ids)(cache_root=cache_dir, **kwargs)
+        # Execute the pipelines in the stack as a single workflow
+        stages = [pipeline for pipeline, _ in Pipeline.stack(*sinks)]
+        with self.tree:
+            # Only the rows of the upstream pipelines that are related to the
+            # requested rows need to be processed
+            stage_ids = Pipeline.stack_ids(stages, sinks, ids)
+            outputs = PipelineStackWorkflow(
+                frameset=self,
+                stages=stages,
+                ids=stage_ids,
+                rows_per_job=rows_per_job,
+                row_workers=row_workers,
+            )(cache_root=cache_dir, **kwargs)
+        # Items put into the store in the background need to be uploaded before they
+        # can be found by other processes, and so any errors are raised
+        self.store.wait_for_uploads()
+        if outputs.cant_process:
+            logger.warning(
+                "Cannot derive %s for the following rows as their outputs are only "
+                "partially present: %s",
+                ", ".join(sink_names),
+                ", ".join(outputs.cant_process),
+            )
+        if outputs.failed:
+            raise FrameTreeError(
+                f"Failed to derive {', '.join(sink_names)} for the following rows "
+                "(see the logged errors for details): " + ", ".join(outputs.failed)
+            )
         return sinks
 
+    def prefetch(
+        self,
+        columns: ty.Optional[ty.Iterable[str]] = None,
+        ids: ty.Optional[ty.Iterable[str]] = None,
+        max_workers: int = 8,
+    ) -> PrefetchReport:
+        """Retrieves the items in the given columns from the store in parallel, so
+        that they are cached locally before they are needed (e.g. by a pipeline)
+
+        Parameters
+        ----------
+        columns : Iterable[str], optional
+            the names of the columns to retrieve the items of, by default all columns
+        ids : Iterable[str], optional
+            the IDs of the rows to retrieve the items from, by default all rows
+        max_workers : int
+            the maximum number of items to retrieve at the same time
+
+        Returns
+        -------
+        PrefetchReport
+            the number and total size of the items retrieved, along with any failures
+        """
+        if columns is None:
+            columns = list(self.columns)
+        if ids is not None:
+            ids = set(ids)
+        report = PrefetchReport()
+        start = time.monotonic()
+        with self.store.connection:
+            cells = [
+                c
+                for n in columns
+                for c in self[n].cells(allow_empty=True, ids=ids)
+                if not c.is_empty
+            ]
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = {executor.submit(self._prefetch_cell, c): c for c in cells}
+                for future in as_completed(futures):
+                    cell = futures[future]
+                    try:
+                        num_bytes = future.result()
+                    except Exception as e:
+                        key = f"{cell.column.name}:{cell.row.id}"
+                        logger.warning("Could not prefetch %s: %s", key, e)
+                        report.failures[key] = str(e)
+                    else:
+                        report.num_items += 1
+                        report.num_bytes += num_bytes
+        report.duration = time.monotonic() - start
+        logger.info(
+            "Prefetched %s items (%s bytes transferred) in %.1f s (%.0f bytes/s), %s failed",
+            report.num_items,
+            report.num_bytes,
+            report.duration,
+            report.rate,
+            len(report.failures),
+        )
+        return report
+
     def parse_frequency(self, freq: ty.Union[Axes, str, None]) -> Axes:
         """Parses the data row_frequency, converting from string if necessary and
         checks it matches the dimensions of the dataset"""
@@ -852,6 +1070,23 @@ class FrameSet:
     def _sink_path(cls, workflow_name: str, sink_name: str) -> str:
         return f"{workflow_name}/{sink_name}"
 
+    def _prefetch_cell(self, cell: "DataCell") -> int:
+        """Retrieves the item of a cell, returning the total size of its files if they
+        were transferred from the store"""
+        is_local = self.store.is_local(cell.entry)
+        item = cell.item
+        if is_local or not isinstance(item, FileSet):
+            return 0
+        num_bytes = 0
+        for fspath in item.fspaths:
+            if fspath.is_dir():
+                num_bytes += sum(
+                    p.stat().st_size for p in fspath.rglob("*") if p.is_file()
+                )
+            else:
+                num_bytes += fspath.stat().st_size
+        return num_bytes
+
     @classmethod
     def parse_id_str(cls, id: str) -> ty.Tuple[str, str, str]:
         parts = id.split("//")
@@ -1,7 +1,10 @@
+import json
 import logging
 import typing as ty
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from copy import copy
+from pathlib import Path
 
 import attrs
 import attrs.converters
@@ -10,12 +13,15 @@ from fileformats.core.exceptions import FormatConversionError
 from pydra.compose import python, workflow
 from pydra.compose.base import Task
 from pydra.utils import get_fields
-from pydra.utils.typing import StateArray, TypeParser, is_union
+from pydra.utils.hash import hash_function
+from pydra.utils.typing import TypeParser, is_union
 
 import frametree.core.frameset.base
 import frametree.core.row
+from frametree.core.row import RowSnapshot
 from frametree.core.axes import Axes
 from frametree.core.column import SinkColumn
+from frametree.core.entry import DataEntry
 from frametree.core.exceptions import (
     FrameTreeDataMatchError,
     FrameTreeDesignError,
@@ -211,16 +217,22 @@ class Pipeline:
     # self.wf.to_process.inputs.parameterisation = parameterisation
     # self.wf.per_node.source.inputs.parameterisation = parameterisation
 
-    def __call__(self, ids: ty.List[str] = None) -> workflow.Task:
+    def __call__(
+        self, ids: ty.List[str] = None, rows_per_job: int = 1, row_workers: int = 1
+    ) -> workflow.Task:
         """
         Create an "outer" workflow that interacts with the frameset to pull input
         data, process it and then push the derivatives back to the store.
 
         Parameters
         ----------
-        **kwargs
-            passed directly to the Pydra.Workflow init. The `ids` arg can be
+        ids : list[str], optional
             used to filter the data rows over which the pipeline is run.
+        rows_per_job : int
+            the number of rows processed by each job, rows are processed in a separate
+            nested workflow each by default
+        row_workers : int
+            the number of rows in each job processed at the same time
 
         Returns
         -------
@@ -243,6 +255,8 @@ class Pipeline:
             inputs=self.inputs,
             outputs=self.outputs,
             converter_args=self.converter_args,
+            rows_per_job=rows_per_job,
+            row_workers=row_workers,
         )
 
     PROVENANCE_VERSION = "1.0"
@@ -361,6 +375,59 @@ class Pipeline:
 
         return reversed(stack.values())
 
+    @classmethod
+    def stack_ids(
+        cls,
+        stack: ty.Sequence["Pipeline"],
+        sinks: ty.Sequence[SinkColumn],
+        ids: ty.Optional[ty.Iterable[str]],
+    ) -> ty.List[ty.Optional[ty.List[str]]]:
+        """Determines the rows that each pipeline in a stack needs to process to
+        produce the sinks for the given IDs, by mapping the IDs through the
+        relationships between the row frequencies of the downstream and upstream
+        pipelines (e.g. all the sessions of the requested subjects)
+
+        Parameters
+        ----------
+        stack : Sequence[Pipeline]
+            the pipelines stack, in order of execution (see ``Pipeline.stack``)
+        sinks : Sequence[SinkColumn]
+            the sink columns that are to be generated
+        ids : Iterable[str], optional
+            the IDs of the rows of the sinks to generate, all rows if None
+
+        Returns
+        -------
+        list[list[str] or None]
+            the IDs of the rows to process for each pipeline in the stack, None if
+            all rows are to be processed
+        """
+        if ids is None:
+            return [None] * len(stack)
+        ids = list(ids)
+        frameset = stack[0].frameset
+        required: ty.Dict[str, ty.List[str]] = {}
+        for pipeline in reversed(stack):
+            pipeline_ids = []
+            if any(s.pipeline_name == pipeline.name for s in sinks):
+                pipeline_ids.extend(ids)
+            produced = set(pipeline.output_varnames)
+            # Add the rows required by the downstream pipelines, which have already
+            # been visited as the stack is traversed in reverse order
+            for downstream in stack[stack.index(pipeline) + 1 :]:
+                if produced.isdisjoint(downstream.input_varnames):
+                    continue
+                pipeline_ids.extend(
+                    _related_ids(
+                        frameset,
+                        downstream.row_frequency,
+                        required[downstream.name],
+                        pipeline.row_frequency,
+                    )
+                )
+            required[pipeline.name] = list(dict.fromkeys(pipeline_ids))
+        return [required[p.name] for p in stack]
+
 
 def append_side_car_suffix(name: str, suffix: str) -> str:
     """Creates a new combined field name out of a basename and a side car"""
@@ -372,7 +439,7 @@ def split_side_car_suffix(name: str) -> ty.List[str]:
     return name.split("__o__")
 
 
-@workflow.define(outputs=["processed", "cant_process"])
+@workflow.define(outputs=["processed", "cant_process", "failed"])
 def PipelineWorkflow(
     task: Task,
     frameset: FrameSet,
@@ -381,21 +448,64 @@ def PipelineWorkflow(
     outputs: ty.List[PipelineField],
     converter_args: ty.Dict[str, dict],
     ids: ty.Optional[ty.List[str]] = None,
-) -> ty.Tuple[ty.List[str], ty.List[str]]:
+    rows_per_job: int = 1,
+    row_workers: int = 1,
+) -> ty.Tuple[ty.List[str], ty.List[str], ty.List[str]]:
     """Create the outer workflow to link the analysis workflow with the
-    data row iteration and store connection rows
+    data row iteration and store connection rows. If ``rows_per_job`` is greater than
+    one, the rows are processed in chunks by ``ProcessRows`` (with ``row_workers``
+    rows of each chunk processed at the same time) instead of a nested workflow per
+    row, and the rows that fail to be processed are reported in ``failed`` instead of
+    failing the workflow
     """
 
+    definition_hash = _definition_hash(task, inputs, outputs, converter_args)
+
     # Generate list of rows to process checking existing outputs
     to_process = workflow.add(
         ToProcess(
             frameset=frameset,
             row_frequency=row_frequency,
+            inputs=inputs,
             outputs=outputs,
             requested_ids=ids,
+            definition_hash=definition_hash,
         )
     )
 
+    if rows_per_job > 1:
+        chunks = workflow.add(
+            ChunkRows(
+                row_ids=to_process.row_ids,
+                rows=to_process.rows,
+                rows_per_job=rows_per_job,
+            )
+        )
+        stage = Pipeline(
+            name=Pipeline.WORKFLOW_NAME,
+            row_frequency=row_frequency,
+            task=task,
+            inputs=inputs,
+            outputs=outputs,
+            converter_args=converter_args,
+            frameset=frameset,
+        )
+        per_chunk = workflow.add(
+            ProcessRows(frameset=frameset, stages=[stage], max_workers=row_workers)
+            .split(
+                ("row_ids", "rows", "first_stages"),
+                row_ids=chunks.row_ids,
+                rows=chunks.rows,
+                first_stages=chunks.first_stages,
+            )
+            .combine("row_ids")
+        )
+        return (
+            _collect_row_ids("processed", [(per_chunk.processed, True)]),
+            to_process.cant_process,
+            _collect_row_ids("failed", [(per_chunk.failed, True)]),
+        )
+
     per_row = workflow.add(
         PipelineRowWorkflow(
             task=task,
@@ -404,10 +514,11 @@ def PipelineWorkflow(
             inputs=inputs,
             outputs=outputs,
             converter_args=converter_args,
-        ).split(row_id=to_process.row_ids)
+            definition_hash=definition_hash,
+        ).split(("row_id", "row"), row_id=to_process.row_ids, row=to_process.rows)
     )
 
-    return per_row.row_id, to_process.cant_process
+    return per_row.row_id, to_process.cant_process, _collect_row_ids("failed", [])
 
 
 @workflow.define(outputs=["row_id"])
@@ -419,6 +530,9 @@ def PipelineRowWorkflow(
     inputs: ty.List[PipelineField],
     outputs: ty.List[PipelineField],
     converter_args: ty.Dict[str, dict],
+    definition_hash: ty.Optional[str] = None,
+    refresh: bool = False,
+    row: ty.Optional[RowSnapshot] = None,
 ) -> str:
 
     # Get the values from the frameset, caching remote files locally
@@ -427,7 +541,10 @@ def PipelineRowWorkflow(
             frameset=frameset,
             row_frequency=row_frequency,
             row_id=row_id,
+            row=row,
             inputs=inputs,
+            definition_hash=definition_hash,
+            refresh=refresh,
         )
     )
 
@@ -447,7 +564,7 @@ def PipelineRowWorkflow(
         if inpt.datatype is not frametree.core.row.DataRow and not frameset[
             inpt.name
         ].row_frequency.is_parent(row_frequency, if_match=True):
-            dtype = StateArray[dtype]
+            dtype = ty.List[dtype]
         source_types[inpt.name] = dtype
 
     column_names = list(source_types)
@@ -514,10 +631,12 @@ def PipelineRowWorkflow(
             for nm, val in converter_args.get(inpt.name, {}).items():
                 setattr(converter_task, nm, val)
         # Split converter input if state array
-        if ty.get_origin(source_types[inpt.name]) is StateArray:
+        if ty.get_origin(source_types[inpt.name]) is list:
             # Iterate over all items in the sequence and convert them
-            # separately
-            converter_task.split(in_file_name, **{in_file_name: in_file})
+            # separately, before collecting them back into a list
+            converter_task = converter_task.split(
+                in_file_name, **{in_file_name: in_file}
+            ).combine(in_file_name)
         else:
             setattr(converter_task, in_file_name, in_file)
         # Add converter to workflow
@@ -593,46 +712,541 @@ def PipelineRowWorkflow(
             frameset=frameset,
             row_frequency=row_frequency,
             row_id=row_id,
+            row=row,
             items=sink_inputs.items,
+            provenance=source.provenance,
         )
     )
     # we just need to return something that can be connected to downstream nodes
     return sink.row_id
 
 
-@python.define(outputs=["row_ids", "cant_process"])
+@workflow.define(outputs=["processed", "cant_process", "failed"])
+def PipelineStackWorkflow(
+    frameset: FrameSet,
+    stages: ty.List[Pipeline],
+    ids: ty.Optional[ty.List[ty.Optional[ty.List[str]]]] = None,
+    rows_per_job: int = 1,
+    row_workers: int = 1,
+) -> ty.Tuple[ty.List[str], ty.List[str], ty.List[str]]:
+    """Combines a stack of pipelines (as returned by ``Pipeline.stack``) into a single
+    workflow. Consecutive pipelines of the same row frequency are chained together for
+    each row, so that a row is passed on to the downstream pipelines as soon as their
+    inputs have been derived for it. Only pipelines of a different row frequency (e.g.
+    summaries over the rows of the upstream pipelines) wait for all the rows of the
+    upstream pipelines to be processed
+
+    Parameters
+    ----------
+    frameset : FrameSet
+        the frameset the pipelines have been applied to
+    stages : list[Pipeline]
+        the pipelines stack, in order of execution
+    ids : list[list[str] or None], optional
+        the IDs of the rows to process for each pipeline in the stack (see
+        ``Pipeline.stack_ids``), all rows by default
+    rows_per_job : int
+        the number of rows processed by each job. If greater than one, the rows are
+        processed in chunks by ``ProcessRows`` instead of a nested workflow per row
+    row_workers : int
+        the number of rows in each chunk that are processed at the same time
+
+    Returns
+    -------
+    processed : list[str]
+        the IDs of the rows processed by the pipelines
+    cant_process : list[str]
+        the IDs of the rows that can't be processed by the pipelines due to partially
+        present outputs
+    failed : list[str]
+        the IDs of the rows that failed to be processed when processed in chunks (rows
+        that fail otherwise fail the workflow)
+    """
+    processed = []
+    cant_process = []
+    failed = []
+    upstream = None
+    if ids is None:
+        ids = [None] * len(stages)
+    for i, (chained, chain_ids) in enumerate(_chain_stages(stages, ids)):
+        to_process = workflow.add(
+            StagesToProcess(
+                frameset=frameset,
+                stages=chained,
+                requested_ids=chain_ids,
+                refresh=i > 0,
+                upstream=upstream,
+            ),
+            name=f"to_process{i}",
+        )
+        cant_process.append((to_process.cant_process, False))
+        if rows_per_job > 1:
+            chunks = workflow.add(
+                ChunkRows(
+                    row_ids=to_process.row_ids,
+                    rows=to_process.rows,
+                    first_stages=to_process.first_stages,
+                    rows_per_job=rows_per_job,
+                ),
+                name=f"chunk_rows{i}",
+            )
+            per_chunk = workflow.add(
+                ProcessRows(
+                    frameset=frameset,
+                    stages=chained,
+                    refresh=i > 0,
+                    max_workers=row_workers,
+                )
+                .split(
+                    ("row_ids", "rows", "first_stages"),
+                    row_ids=chunks.row_ids,
+                    rows=chunks.rows,
+                    first_stages=chunks.first_stages,
+                )
+                .combine("row_ids"),
+                name=f"per_chunk{i}",
+            )
+            upstream = per_chunk.processed
+            processed.append((per_chunk.processed, True))
+            failed.append((per_chunk.failed, True))
+        else:
+            per_row = workflow.add(
+                PipelineChainWorkflow(
+                    frameset=frameset,
+                    stages=chained,
+                    refresh=i > 0,
+                )
+                .split(
+                    ("row_id", "row", "first_stage"),
+                    row_id=to_process.row_ids,
+                    row=to_process.rows,
+                    first_stage=to_process.first_stages,
+                )
+                .combine("row_id"),
+                name=f"per_row{i}",
+            )
+            upstream = per_row.row_id
+            processed.append((per_row.row_id, False))
+
+    return (
+        _collect_row_ids("processed", processed),
+        _collect_row_ids("cant_process", cant_process),
+        _collect_row_ids("failed", failed),
+    )
+
+
+@workflow.define(outputs=["row_id"])
+def PipelineChainWorkflow(
+    frameset: FrameSet,
+    stages: ty.List[Pipeline],
+    row_id: str,
+    row: ty.Optional[RowSnapshot] = None,
+    first_stage: int = 0,
+    refresh: bool = False,
+) -> str:
+    """Runs a chain of pipelines of the same row frequency over a single row, starting
+    from the first pipeline whose outputs need to be derived for the row"""
+    for i, stage in enumerate(stages[first_stage:]):
+        per_stage = workflow.add(
+            PipelineRowWorkflow(
+                task=stage.task,
+                frameset=frameset,
+                row_frequency=stage.row_frequency,
+                row_id=row_id,
+                row=row,
+                inputs=stage.inputs,
+                outputs=stage.outputs,
+                converter_args=stage.converter_args,
+                definition_hash=_definition_hash(
+                    stage.task, stage.inputs, stage.outputs, stage.converter_args
+                ),
+                # The row needs to be found in the store again after the outputs of
+                # the upstream pipelines have been put into it
+                refresh=refresh or i > 0,
+            ),
+            name=stage.name,
+        )
+        row_id = per_stage.row_id
+    return row_id
+
+
+@python.define(outputs=["row_ids", "rows", "first_stages", "cant_process"])
+def StagesToProcess(
+    frameset: frametree.core.frameset.base.FrameSet,
+    stages: ty.List[Pipeline],
+    requested_ids: ty.Union[ty.List[str], None],
+    refresh: bool = False,
+    upstream: ty.Optional[ty.List[ty.Any]] = None,
+) -> ty.Tuple[ty.List[str], ty.List[RowSnapshot], ty.List[int], ty.List[str]]:
+    """Selects the rows that need to be processed by a chain of pipelines of the same
+    row frequency (see ``ToProcess``), along with the first pipeline in the chain that
+    needs to derive its outputs for each row. Rows that can't be processed by any of
+    the pipelines in the chain aren't processed by any of them
+
+    Parameters
+    ----------
+    refresh : bool
+        whether to find the entries of the rows in the store again, because some of
+        them have been derived since the rows were populated
+    upstream : list, optional
+        the rows (or chunks of rows) processed by the upstream pipelines, only used to
+        wait for them to be processed
+
+    Returns
+    -------
+    row_ids : list[str]
+        the IDs of the rows to process
+    rows : list[RowSnapshot]
+        snapshots of the rows to process, which are passed to the jobs that process
+        them so that they don't need to scan the data tree to access them
+    first_stages : list[int]
+        the index of the first pipeline in the chain to run for each row to process
+    cant_process : list[str]
+        the IDs of the rows that can't be processed due to partially present outputs
+    """
+    row_frequency = stages[0].row_frequency
+    if requested_ids is None:
+        requested_ids = frameset.row_ids(row_frequency)
+    row_ids = []
+    rows_to_process = []
+    first_stages = []
+    cant_process = []
+    rows = list(frameset.rows(row_frequency, ids=requested_ids))
+    related_freqs = _related_frequencies(
+        frameset, row_frequency, [i for s in stages for i in s.inputs]
+    )
+    if refresh:
+        frameset.store.wait_for_uploads()
+        for row in rows:
+            row.reset()
+        # Including the rows of any inputs of a different row frequency
+        for related in _related_rows(rows, related_freqs):
+            related.reset()
+    frameset.populate_rows(rows + _related_rows(rows, related_freqs))
+    definition_hashes = [
+        _definition_hash(s.task, s.inputs, s.outputs, s.converter_args) for s in stages
+    ]
+    with frameset.store.connection:
+        for row in rows:
+            statuses = [
+                _row_status(row, s.inputs, s.outputs, h)
+                for s, h in zip(stages, definition_hashes)
+            ]
+            if CANT_PROCESS in statuses:
+                cant_process.append(row.id)
+            elif PROCESS in statuses:
+                row_ids.append(row.id)
+                rows_to_process.append(row.snapshot(related=related_freqs))
+                first_stages.append(statuses.index(PROCESS))
+    logger.debug(
+        "Found %s ids to process with %s, and can't process %s due to partially "
+        "present outputs",
+        row_ids,
+        [s.name for s in stages],
+        cant_process,
+    )
+    return row_ids, rows_to_process, first_stages, cant_process
+
+
+def _related_frequencies(
+    frameset: FrameSet, row_frequency: Axes, inputs: ty.List[PipelineField]
+) -> ty.List[Axes]:
+    """The row frequencies of the input columns that differ from the frequency of the
+    rows being processed, whose related rows are sourced along with each row"""
+    row_frequency = frameset.parse_frequency(row_frequency)
+    frequencies = (
+        frameset[i.name].row_frequency
+        for i in inputs
+        if i.datatype is not frametree.core.row.DataRow
+    )
+    return list(dict.fromkeys(f for f in frequencies if f != row_frequency))
+
+
+def _related_rows(
+    rows: ty.List[frametree.core.row.DataRow], frequencies: ty.List[Axes]
+) -> ty.List[frametree.core.row.DataRow]:
+    """The rows of the given frequencies that are related to any of the rows, without
+    duplicates (e.g. the parent subject of several sessions)"""
+    related = {
+        id(r): r for row in rows for f in frequencies for r in row.related_rows(f)
+    }
+    return list(related.values())
+
+
+def _chain_stages(
+    stages: ty.List[Pipeline], ids: ty.List[ty.Optional[ty.List[str]]]
+) -> ty.List[ty.Tuple[ty.List[Pipeline], ty.Optional[ty.List[str]]]]:
+    """Groups consecutive pipelines in a stack with the same row frequency, which can be
+    chained together for each row, along with the IDs of the rows any of them need to
+    process"""
+    chains: ty.List[ty.Tuple[ty.List[Pipeline], ty.Optional[ty.List[str]]]] = []
+    for stage, stage_ids in zip(stages, ids):
+        if chains and chains[-1][0][-1].row_frequency == stage.row_frequency:
+            chained, chain_ids = chains[-1]
+            chained.append(stage)
+            if chain_ids is not None:
+                chain_ids = None if stage_ids is None else chain_ids + stage_ids
+            chains[-1] = chained, chain_ids
+        else:
+            chains.append(([stage], stage_ids))
+    return [(c, None if i is None else list(dict.fromkeys(i))) for c, i in chains]
+
+
+def _related_ids(
+    frameset: FrameSet,
+    frequency: Axes,
+    ids: ty.List[str],
+    related_frequency: Axes,
+) -> ty.List[str]:
+    """Maps the IDs of rows of one frequency onto the IDs of the rows of another
+    frequency that are related to them, i.e. that share the same IDs along the axes
+    common to both frequencies (e.g. the parent subject of sessions, or the sessions
+    of subjects)"""
+    frequency = frameset.parse_frequency(frequency)
+    related_frequency = frameset.parse_frequency(related_frequency)
+    if related_frequency == frequency:
+        return list(ids)
+    common = frequency & related_frequency
+    keys = {r.ids[common] for r in frameset.rows(frequency, ids=ids)}
+    return [r.id for r in frameset.rows(related_frequency) if r.ids[common] in keys]
+
+
+@python.define(outputs=["row_ids", "rows", "cant_process"])
 def ToProcess(
     frameset: frametree.core.frameset.base.FrameSet,
     row_frequency: Axes,
+    inputs: ty.List[PipelineField],
     outputs: ty.List[PipelineField],
     requested_ids: ty.Union[ty.List[str], None],
-) -> ty.Tuple[ty.List[str], ty.List[str]]:
+    definition_hash: str,
+) -> ty.Tuple[ty.List[str], ty.List[RowSnapshot], ty.List[str]]:
+    """Selects the rows that need to be processed, i.e. the rows that don't have any
+    outputs yet, or whose outputs were derived from different inputs or a different
+    pipeline definition (as recorded in their provenance) or were only partially
+    produced. Rows with outputs that weren't derived by FrameTree can't be processed
+    unless all of their outputs are present, in which case they are left as they are
+
+    Returns
+    -------
+    row_ids : list[str]
+        the IDs of the rows to process
+    rows : list[RowSnapshot]
+        snapshots of the rows to process, which are passed to the jobs that process
+        them so that they don't need to scan the data tree to access them
+    cant_process : list[str]
+        the IDs of the rows that can't be processed due to partially present outputs
+    """
     if requested_ids is None:
         requested_ids = frameset.row_ids(row_frequency)
     row_ids = []
+    rows_to_process = []
     cant_process = []
-    for row in frameset.rows(row_frequency, ids=requested_ids):
-        # TODO: Should check provenance of existing rows to see if it matches
-        empty = [row.cell(o.name).is_empty for o in outputs]
-        if all(empty):
-            row_ids.append(row.id)
-        elif any(empty):
-            cant_process.append(row.id)
+    rows = list(frameset.rows(row_frequency, ids=requested_ids))
+    related_freqs = _related_frequencies(frameset, row_frequency, inputs)
+    frameset.populate_rows(rows + _related_rows(rows, related_freqs))
+    with frameset.store.connection:
+        for row in rows:
+            status = _row_status(row, inputs, outputs, definition_hash)
+            if status == PROCESS:
+                row_ids.append(row.id)
+                rows_to_process.append(row.snapshot(related=related_freqs))
+            elif status == CANT_PROCESS:
+                cant_process.append(row.id)
     logger.debug(
         "Found %s ids to process, and can't process %s due to partially present outputs",
         row_ids,
         cant_process,
     )
-    return row_ids, cant_process
+    return row_ids, rows_to_process, cant_process
+
+
+# Statuses of the outputs of a row with respect to a pipeline (see ``_row_status``)
+PROCESS = "process"
+SKIP = "skip"
+CANT_PROCESS = "cant_process"
+
+
+def _row_status(
+    row: frametree.core.row.DataRow,
+    inputs: ty.List[PipelineField],
+    outputs: ty.List[PipelineField],
+    definition_hash: str,
+) -> str:
+    """Determines whether the outputs of a pipeline need to be derived for a row, by
+    comparing the provenance recorded against the outputs with that of the row, and
+    checking that the outputs haven't been modified since they were derived"""
+    cells = [row.cell(o.name) for o in outputs]
+    recorded = [None if c.is_empty else _recorded_provenance(c) for c in cells]
+    if not any(recorded):
+        # None of the outputs have been derived by FrameTree
+        if all(c.is_empty for c in cells):
+            return PROCESS
+        if any(c.is_empty for c in cells):
+            return CANT_PROCESS
+        return SKIP
+    provenance = _row_provenance(
+        row, inputs, definition_hash, recorded=next(r for r in recorded if r)
+    )
+    if any(r is None or r.get("hash") != provenance["hash"] for r in recorded):
+        # The outputs are out of date or have only been partially produced
+        return PROCESS
+    store = row.frameset.store
+    for cell, rec in zip(cells, recorded):
+        output = _output_record(cell.entry, rec.get("output"))
+        if output is None:
+            logger.warning(
+                "%s in %s:%s row has been modified since it was derived, so will be "
+                "derived again",
+                cell.entry.path,
+                row.frequency,
+                row.id,
+            )
+            return PROCESS
+        if rec.get("tokens") != provenance["tokens"] or rec.get("output") != output:
+            # Record the change tokens that couldn't be relied on when the outputs
+            # were derived (e.g. of files that had only just been written), so that
+            # the checksums don't need to be calculated again next time
+            rec = {**rec, "tokens": provenance["tokens"], "output": output}
+            store.put_provenance(rec, cell.entry)
+            cell.entry.provenance = rec
+    return SKIP
+
+
+def _definition_hash(
+    task: Task,
+    inputs: ty.List[PipelineField],
+    outputs: ty.List[PipelineField],
+    converter_args: ty.Dict[str, dict],
+) -> str:
+    """A hash of the parts of a pipeline's definition that affect its outputs"""
+    return hash_function(
+        [
+            task,
+            [(i.name, i.field, i.datatype) for i in inputs],
+            [(o.name, o.field, o.datatype) for o in outputs],
+            converter_args,
+        ]
+    )
+
+
+def _row_provenance(
+    row: frametree.core.row.DataRow,
+    inputs: ty.List[PipelineField],
+    definition_hash: str,
+    recorded: ty.Optional[ty.Dict[str, ty.Any]] = None,
+) -> ty.Dict[str, ty.Any]:
+    """Generates the provenance of the outputs derived from a row, including a hash of
+    the checksums of the inputs and the pipeline definition. The checksums recorded in
+    the provenance of previously derived outputs are reused for inputs whose change
+    tokens (see ``Store.item_change_token``) are the same as those recorded with them
+    """
+    store = row.frameset.store
+    input_hashes: ty.Dict[str, ty.Optional[str]] = {}
+    tokens: ty.Dict[str, ty.Any] = {}
+    for inpt in inputs:
+        if inpt.datatype is frametree.core.row.DataRow:
+            # Tasks passed the whole row depend on any of its (non-derivative) items
+            entries = [e for e in row.entries if not e.is_derivative]
+        else:
+            try:
+                cells = _input_cells(row, inpt.name)
+            except FrameTreeDataMatchError:
+                # Missing inputs are reported when the row is processed
+                input_hashes[inpt.name] = None
+                tokens[inpt.name] = None
+                continue
+            entries = [c.entry for c in (cells if isinstance(cells, list) else [cells])]
+        tokens[inpt.name] = token = _change_token(store, entries)
+        if (
+            token is not None
+            and recorded is not None
+            and recorded.get("tokens", {}).get(inpt.name) == token
+        ):
+            input_hashes[inpt.name] = recorded["inputs"][inpt.name]
+            continue
+        if inpt.datatype is frametree.core.row.DataRow:
+            checksums = [
+                (e.path, e.order_key, store.item_checksums(e)) for e in entries
+            ]
+        elif isinstance(cells, list):
+            checksums = [store.item_checksums(e) for e in entries]
+        else:
+            checksums = store.item_checksums(cells.entry)
+        input_hashes[inpt.name] = hash_function(checksums)
+    return {
+        "version": Pipeline.PROVENANCE_VERSION,
+        "hash": hash_function([definition_hash, input_hashes]),
+        "definition": definition_hash,
+        "inputs": input_hashes,
+        "tokens": tokens,
+    }
+
+
+def _change_token(
+    store: "frametree.core.store.Store", entries: ty.List[DataEntry]
+) -> ty.Optional[ty.List[ty.Any]]:
+    """The change tokens of a list of entries (see ``Store.item_change_token``) in the
+    form they are recorded in the provenance, or None if any of them doesn't have one
+    """
+    tokens = [store.item_change_token(e) for e in entries]
+    if any(t is None for t in tokens):
+        return None
+    # Normalised to how it is loaded from JSON so it can be compared with recorded ones
+    return json.loads(json.dumps(tokens))
+
 
+def _output_record(
+    entry: DataEntry, recorded: ty.Optional[ty.Dict[str, ty.Any]] = None
+) -> ty.Optional[ty.Dict[str, ty.Any]]:
+    """The checksums and change token of an output recorded in the provenance of its
+    entry, which are used to detect whether it has been modified since it was derived
+
+    Parameters
+    ----------
+    entry : DataEntry
+        the entry of the output
+    recorded : dict, optional
+        the record saved when the output was derived, which is checked against the
+        current state of the output
 
-@python.define(outputs=["items"])
+    Returns
+    -------
+    dict or None
+        the record of the output, or None if it doesn't match the recorded one
+    """
+    store = entry.row.frameset.store
+    token = _change_token(store, [entry])
+    if recorded is not None and token is not None and token == recorded.get("token"):
+        return recorded
+    checksums = hash_function(store.item_checksums(entry))
+    if recorded is not None and checksums != recorded["checksums"]:
+        return None
+    return {"checksums": checksums, "token": token}
+
+
+def _recorded_provenance(
+    cell: "frametree.core.cell.DataCell",
+) -> ty.Optional[ty.Dict[str, ty.Any]]:
+    """The provenance recorded against the entry of a cell, if any"""
+    entry = cell.entry
+    if entry.provenance is None:
+        entry.provenance = cell.row.frameset.store.get_provenance(entry)
+    return entry.provenance
+
+
+@python.define(outputs=["items", "provenance"])
 def SourceItems(
     frameset: frametree.core.frameset.base.FrameSet,
     row_frequency: Axes,
     row_id: str,
     inputs: ty.List[PipelineField],
-) -> ty.Dict[str, ty.Union["frametree.core.row.DataRow", DataType, ty.List[DataType]]]:
+    definition_hash: ty.Optional[str] = None,
+    refresh: bool = False,
+    row: ty.Optional[RowSnapshot] = None,
+) -> ty.Tuple[
+    ty.Dict[str, ty.Union["frametree.core.row.DataRow", DataType, ty.List[DataType]]],
+    ty.Optional[ty.Dict[str, ty.Any]],
+]:
     """Selects the items from the frameset corresponding to the input
     sources and retrieves them from the store to a cache on
     the host
@@ -645,30 +1259,33 @@ def SourceItems(
         the frequency of the row to source the data from
     row_id : str
         the ID of the row to source from
+    inputs : list[PipelineField]
+        the inputs of the pipeline to source
+    definition_hash : str, optional
+        hash of the pipeline definition to include in the provenance of the outputs
+    refresh : bool
+        whether to find the entries of the row in the store again, because some of
+        them have been derived since the row was populated
+    row : RowSnapshot, optional
+        a snapshot of the row to source from, which is used instead of looking up the
+        row in the data tree of the frameset
 
     Returns
     -------
-    dict[str, DataType | DataRow]
-        the sourced data items, or the whole row if the input
+    items : dict[str, DataType | list[DataType] | DataRow]
+        the sourced data items, or the whole row if the input datatype is DataRow.
+        Inputs of a child row frequency are sourced from all the rows related to the
+        row as a list (see ``_input_cells``)
+    provenance : dict[str, Any] or None
+        the provenance to record against the outputs derived from the items, if a
+        definition hash is provided
     """
-    logger.debug("Sourcing %s", inputs)
-    sourced: ty.Dict[str, ty.Union["frametree.core.row.DataRow", DataType]] = {}
-    missing_inputs: ty.Dict[str, str] = {}
-    with frameset.store.connection:
-        row = frameset.row(row_frequency, row_id)
-        for inpt in inputs:
-            # If the required datatype is of type DataRow then provide the whole
-            # row to the pipeline input
-            if inpt.datatype == frametree.core.row.DataRow:
-                sourced[inpt.name] = row
-                continue
-            try:
-                sourced[inpt.name] = row[inpt.name]
-            except FrameTreeDataMatchError as e:
-                missing_inputs[inpt.name] = str(e)
-    if missing_inputs:
-        raise FrameTreeDataMatchError("\n\n" + "\n\n".join(missing_inputs.values()))
-    return sourced
+    return _source_items(
+        _get_row(frameset, row_frequency, row_id, row),
+        inputs,
+        definition_hash,
+        refresh,
+    )
 
 
 @python.define(outputs=["row_id"])
@@ -678,6 +1295,7 @@ def SinkItems(
     row_id: str,
     items: ty.Dict[str, ty.Any],
     provenance: ty.Optional[ty.Dict[str, ty.Any]] = None,
+    row: ty.Optional[RowSnapshot] = None,
 ) -> str:
     """Stores items generated by the pipeline back into the store
 
@@ -691,6 +1309,9 @@ def SinkItems(
         the ID of the row to source from
     provenance : dict
         provenance information to be stored alongside the generated data
+    row : RowSnapshot, optional
+        a snapshot of the row to sink to, which is used instead of looking up the
+        row in the data tree of the frameset
     **to_sink : dict[str, DataType]
         data items to be stored in the data store
 
@@ -699,14 +1320,316 @@ def SinkItems(
     row_id: str
         the ID of the row that was processed
     """
-    if provenance is not None:
-        raise NotImplementedError("Provenance storage not implemented yet")
+    _sink_items(_get_row(frameset, row_frequency, row_id, row), items, provenance)
+    return row_id
+
+
+@python.define(outputs=["row_ids", "rows", "first_stages"])
+def ChunkRows(
+    row_ids: ty.List[str],
+    rows: ty.List[RowSnapshot],
+    rows_per_job: int,
+    first_stages: ty.Optional[ty.List[int]] = None,
+) -> ty.Tuple[
+    ty.List[ty.List[str]], ty.List[ty.List[RowSnapshot]], ty.List[ty.List[int]]
+]:
+    """Groups the rows to process into chunks that are processed by a single job
+
+    Returns
+    -------
+    row_ids : list[list[str]]
+        the IDs of the rows in each chunk
+    rows : list[list[RowSnapshot]]
+        snapshots of the rows in each chunk
+    first_stages : list[list[int]]
+        the index of the first pipeline to run for each row in each chunk
+    """
+    if first_stages is None:
+        first_stages = [0] * len(row_ids)
+    starts = range(0, len(row_ids), rows_per_job)
+    return (
+        [row_ids[i : i + rows_per_job] for i in starts],
+        [rows[i : i + rows_per_job] for i in starts],
+        [first_stages[i : i + rows_per_job] for i in starts],
+    )
+
+
+@python.define(outputs=["processed", "failed"])
+def ProcessRows(
+    frameset: FrameSet,
+    stages: ty.List[Pipeline],
+    row_ids: ty.List[str],
+    rows: ty.List[RowSnapshot],
+    first_stages: ty.List[int],
+    refresh: bool = False,
+    max_workers: int = 1,
+) -> ty.Tuple[ty.List[str], ty.List[str]]:
+    """Processes a chunk of rows within a single job, instead of a separate nested
+    workflow for each row, running the tasks of the pipelines directly. Rows that fail
+    to be processed are reported instead of failing the whole chunk
+
+    Parameters
+    ----------
+    frameset : FrameSet
+        the frameset the pipelines have been applied to
+    stages : list[Pipeline]
+        a chain of pipelines of the same row frequency to run over each row
+    row_ids : list[str]
+        the IDs of the rows in the chunk
+    rows : list[RowSnapshot]
+        snapshots of the rows in the chunk
+    first_stages : list[int]
+        the index of the first pipeline to run for each row
+    refresh : bool
+        whether to find the entries of the rows in the store again, because some of
+        them have been derived since the rows were populated
+    max_workers : int
+        the number of rows processed at the same time (in separate threads)
+
+    Returns
+    -------
+    processed : list[str]
+        the IDs of the rows that were processed
+    failed : list[str]
+        the IDs of the rows that failed to be processed
+    """
+    cache_root = Path.cwd() / "rows"
+
+    def process(snapshot: RowSnapshot, first_stage: int) -> None:
+        # The restored row is shared by the chained pipelines, so the outputs of the
+        # upstream pipelines are added to it as they are put into the store
+        row = snapshot.restore(frameset)
+        for i, stage in enumerate(stages[first_stage:]):
+            _process_row(row, stage, refresh and i == 0, cache_root=cache_root)
+
+    processed = []
+    failed = []
+    # Rows are processed in worker threads even when they are processed one at a
+    # time, as the tasks can't be run from within the event loop running this job
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            i: executor.submit(process, r, s)
+            for i, r, s in zip(row_ids, rows, first_stages)
+        }
+        for row_id, future in futures.items():
+            try:
+                future.result()
+            except Exception:
+                logger.exception("Processing of %s row failed", row_id)
+                failed.append(row_id)
+            else:
+                processed.append(row_id)
+    # Items put into the store in the background are uploaded before the job
+    # completes, so that they can be found by the jobs of downstream pipelines, which
+    # may run in other processes
+    frameset.store.wait_for_uploads()
+    return processed, failed
+
+
+def _process_row(
+    row: frametree.core.row.DataRow,
+    stage: Pipeline,
+    refresh: bool,
+    cache_root: Path,
+) -> None:
+    """Runs the task of a pipeline over a row, converting its inputs and outputs
+    between the datatypes of the columns and the task as required (i.e. the same steps
+    as ``PipelineRowWorkflow`` without a separate node for each of them)"""
+    frameset = row.frameset
+    items, provenance = _source_items(
+        row,
+        stage.inputs,
+        _definition_hash(stage.task, stage.inputs, stage.outputs, stage.converter_args),
+        refresh,
+    )
+    task = copy(stage.task)
+    for inpt in stage.inputs:
+        item = items[inpt.name]
+        if not (
+            inpt.datatype == frametree.core.row.DataRow
+            or not inpt.datatype
+            or is_coercible(inpt.datatype, frameset[inpt.name].datatype)
+        ):
+            kwargs = stage.converter_args.get(inpt.name, {})
+            if isinstance(item, list):
+                item = [inpt.datatype.convert(i, **kwargs) for i in item]
+            else:
+                item = inpt.datatype.convert(item, **kwargs)
+        setattr(task, inpt.field, item)
+    outputs = task(cache_root=cache_root)
+    to_sink = {}
+    for outpt in stage.outputs:
+        output = getattr(outputs, outpt.field)
+        stored_format = frameset[outpt.name].datatype
+        if (
+            outpt.datatype
+            and not TypeParser.is_subclass(outpt.datatype, stored_format)
+            and not TypeParser.is_subclass(stored_format, outpt.datatype)
+        ):
+            output = stored_format.convert(
+                output, **stage.converter_args.get(outpt.name, {})
+            )
+        to_sink[outpt.name] = output
+    _sink_items(row, to_sink, provenance)
+
+
+def _collect_row_ids(
+    name: str, groups: ty.List[ty.Tuple[ty.Any, bool]]
+) -> ty.List[str]:
+    """Adds a node to the workflow being constructed that concatenates lists of row
+    IDs output by other nodes, some of which may be nested in lists of chunks
+
+    Parameters
+    ----------
+    name : str
+        the name of the node to add
+    groups : list[tuple[LazyOutField, bool]]
+        the lists of row IDs to concatenate, and whether they are nested in chunks
+    """
+    group_names = [f"group{i}" for i in range(len(groups))]
+    group_types = {
+        n: ty.List[ty.List[str]] if nested else ty.List[str]
+        for n, (_, nested) in zip(group_names, groups)
+    }
+
+    # Dynamically collect the row IDs of each group
+    @python.define(inputs=group_types, outputs=["row_ids"])
+    def CollectRowIds(
+        group_names: ty.List[str], nested: ty.List[bool], **groups: ty.List[ty.Any]
+    ) -> ty.List[str]:
+        row_ids = []
+        for group_name, is_nested in zip(group_names, nested):
+            for ids in groups[group_name]:
+                if is_nested:
+                    row_ids.extend(ids)
+                else:
+                    row_ids.append(ids)
+        return row_ids
+
+    collect = workflow.add(
+        CollectRowIds(
+            group_names=group_names,
+            nested=[n for _, n in groups],
+            **{n: g for n, (g, _) in zip(group_names, groups)},
+        ),
+        name=name,
+    )
+    return collect.row_ids
+
+
+def _get_row(
+    frameset: FrameSet,
+    row_frequency: Axes,
+    row_id: str,
+    snapshot: ty.Optional[RowSnapshot],
+) -> frametree.core.row.DataRow:
+    """Restores a row from its snapshot if provided, otherwise looks it up in the data
+    tree of the frameset"""
+    if snapshot is not None:
+        return snapshot.restore(frameset)
+    return frameset.row(row_frequency, row_id)
+
+
+def _source_items(
+    row: frametree.core.row.DataRow,
+    inputs: ty.List[PipelineField],
+    definition_hash: ty.Optional[str],
+    refresh: bool,
+) -> ty.Tuple[
+    ty.Dict[str, ty.Union["frametree.core.row.DataRow", DataType, ty.List[DataType]]],
+    ty.Optional[ty.Dict[str, ty.Any]],
+]:
+    """Retrieves the input items of a row (see ``SourceItems``)"""
+    logger.debug("Sourcing %s", inputs)
+    sourced: ty.Dict[str, ty.Union["frametree.core.row.DataRow", DataType]] = {}
+    missing_inputs: ty.Dict[str, str] = {}
+    provenance = None
+    store = row.frameset.store
+    with store.connection, store.pin_cached():
+        if refresh:
+            # Items derived by upstream pipelines in the background need to be
+            # uploaded before they can be found in the store
+            store.wait_for_uploads()
+            row.reset()
+        for inpt in inputs:
+            # If the required datatype is of type DataRow then provide the whole
+            # row to the pipeline input
+            if inpt.datatype == frametree.core.row.DataRow:
+                sourced[inpt.name] = row
+                continue
+            try:
+                cells = _input_cells(row, inpt.name, refresh=refresh)
+            except FrameTreeDataMatchError as e:
+                missing_inputs[inpt.name] = str(e)
+                continue
+            if isinstance(cells, list):
+                sourced[inpt.name] = [c.item for c in cells]
+            else:
+                sourced[inpt.name] = cells.item
+        if definition_hash is not None and not missing_inputs:
+            provenance = _row_provenance(row, inputs, definition_hash)
+    if missing_inputs:
+        raise FrameTreeDataMatchError("\n\n" + "\n\n".join(missing_inputs.values()))
+    return sourced, provenance
+
+
+def _input_cells(
+    row: frametree.core.row.DataRow, column_name: str, refresh: bool = False
+) -> ty.Union["frametree.core.cell.DataCell", ty.List["frametree.core.cell.DataCell"]]:
+    """Returns the cell of an input column in a row. If the column is of a different
+    row frequency to the row (e.g. the sessions summarised by a per-subject pipeline),
+    the cells of the rows related to it are returned instead (see
+    ``DataRow.related_rows``), as a list unless the column is of a parent frequency of
+    the row (and therefore there is only one)
+
+    Parameters
+    ----------
+    row : DataRow
+        the row to return the cell(s) of
+    column_name : str
+        the name of the input column
+    refresh : bool
+        whether to find the entries of the related rows in the store again, because
+        some of them have been derived since the rows were populated
+
+    Raises
+    ------
+    FrameTreeDataMatchError
+        if any of the cells are empty
+    """
+    frameset = row.frameset
+    column = frameset[column_name]
+    if column.row_frequency == row.frequency:
+        return row.cell(column_name, allow_empty=False)
+    related = row.related_rows(column.row_frequency)
+    if refresh:
+        for related_row in related:
+            related_row.reset()
+    frameset.populate_rows(related)
+    cells = [r.cell(column_name, allow_empty=False) for r in related]
+    if (row.frequency & column.row_frequency) == column.row_frequency:
+        return cells[0]
+    return cells
+
+
+def _sink_items(
+    row: frametree.core.row.DataRow,
+    items: ty.Dict[str, ty.Any],
+    provenance: ty.Optional[ty.Dict[str, ty.Any]],
+) -> None:
+    """Puts the output items of a row into the store (see ``SinkItems``), along with
+    their provenance, which includes the checksums of each output so that outputs
+    modified outside of the pipeline can be detected"""
     logger.debug("Sinking %s", items)
-    with frameset.store.connection:
-        row = frameset.row(row_frequency, row_id)
+    store = row.frameset.store
+    with store.connection, store.batch_writes():
         for outpt_name, output in items.items():
-            row.cell(outpt_name).item = output
-    return row_id
+            cell = row.cell(outpt_name)
+            cell.item = output
+            if provenance is not None:
+                entry_provenance = {**provenance, "output": _output_record(cell.entry)}
+                store.put_provenance(entry_provenance, cell.entry)
+                cell.entry.provenance = entry_provenance
 
 
 @workflow.define(outputs=["out_file"])
@@ -55,6 +55,14 @@ class DataRow:
         default=None, init=False, repr=False
     )
     _cells: dict[str, DataCell] = attrs.field(factory=dict, init=False, repr=False)
+    # Incremented whenever the entries of the row change, so that cells matched
+    # against its previous entries (see ``DataColumn.cells``) can be invalidated
+    _entries_version: int = attrs.field(default=0, init=False, repr=False)
+    # Related rows restored along with the row from a snapshot, keyed by their
+    # frequency, which are used instead of looking them up in the data tree
+    _related: dict[Axes, list[DataRow]] = attrs.field(
+        factory=dict, init=False, repr=False
+    )
 
     @frameset.validator  # pyright: ignore[reportAttributeAccessIssue]
     def dataset_validator(
@@ -92,18 +100,28 @@ class DataRow:
         """
         return self.cell(column_name, allow_empty=False).item
 
+    async def aget(self, column_name: str) -> DataType:
+        """Asynchronous version of ``row[column_name]``, which retrieves the item from
+        the store with ``Store.aget``
+
+        Parameters
+        ----------
+        column_name : str
+            Name of a selected column in the dataset
+
+        Returns
+        -------
+        DataType
+            The item matching the provided name specified by the column name
+        """
+        cell = self.cell(column_name, allow_empty=False)
+        return await cell.entry.aget_item(cell.column.datatype)
+
     def __setitem__(self, column_name: str, value: DataType) -> DataRow:
         self.cell(column_name).item = value
         return self
 
     def cell(self, column_name: str, allow_empty: bool | None = None) -> DataCell:
-        try:
-            cell = self._cells[column_name]
-        except KeyError:
-            pass
-        else:
-            if not cell.is_empty:
-                return cell
         try:
             column = self.frameset[column_name]
         except KeyError as e:
@@ -121,9 +139,7 @@ class DataRow:
                 f"frequency and therefore not in rows of {self.frequency}"
                 " frequency",
             )
-        cell = DataCell.intersection(column=column, row=self, allow_empty=allow_empty)
-        self._cells[column_name] = cell
-        return cell
+        return DataCell.intersection(column=column, row=self, allow_empty=allow_empty)
 
     def cells(self, allow_empty: bool | None = None) -> ty.Iterable[DataCell]:
         for column_name in self.frameset.columns:
@@ -175,6 +191,96 @@ class DataRow:
                 raise KeyError()
             return self.entries_dict[(name, key)]
 
+    @property
+    def populated(self) -> bool:
+        """Whether the row has been populated with the entries found in the store"""
+        return self._entries_dict is not None
+
+    def related_rows(self, frequency: Axes | str) -> list[DataRow]:
+        """Returns the rows of another frequency that are related to the row, i.e. that
+        share its IDs along the axes common to both frequencies (e.g. the parent
+        subject of a session, or the sessions of a subject). The rows are looked up via
+        the parent rows in the data tree, unless they were restored along with the row
+        from a snapshot
+
+        Parameters
+        ----------
+        frequency : Axes or str
+            the frequency of the related rows
+
+        Returns
+        -------
+        list[DataRow]
+            the related rows
+        """
+        frequency = self.frameset.parse_frequency(frequency)
+        if frequency == self.frequency:
+            return [self]
+        try:
+            return self._related[frequency]
+        except KeyError:
+            pass
+        common = self.frequency & frequency
+        if common == frequency:
+            return [self.frameset.row(frequency, self.ids[frequency])]
+        if common:
+            parent = self.frameset.row(common, self.ids[common])
+        else:
+            parent = self.frameset.root
+        return list(parent.children.get(frequency, {}).values())
+
+    def snapshot(self, related: ty.Iterable[Axes] = ()) -> RowSnapshot:
+        """Takes a compact copy of the row and the entries found for it in the store,
+        which can be passed to other processes in place of the frameset's data tree
+
+        Parameters
+        ----------
+        related : Iterable[Axes]
+            the frequencies of the related rows (see ``related_rows``) to include in
+            the snapshot, so that they don't need to be looked up in the data tree
+            either
+
+        Returns
+        -------
+        RowSnapshot
+            the snapshot of the row, which can be restored with ``RowSnapshot.restore``
+        """
+        if self._entries_dict is None:
+            entries = None
+        else:
+            entries = [
+                {
+                    "path": e.path,
+                    "datatype": e.datatype,
+                    "uri": e.uri,
+                    "item_metadata": e.item_metadata.loaded,
+                    "order_key": e.order_key,
+                    "quality": e.quality,
+                    "checksums": e.checksums,
+                    "provenance": e.provenance,
+                }
+                for e in self._entries_dict.values()
+            ]
+        return RowSnapshot(
+            ids={str(f): i for f, i in self.ids.items()},
+            frequency=str(self.frequency),
+            tree_path=self.tree_path,
+            uri=self.uri,
+            metadata=self.metadata,
+            entries=entries,
+            related={
+                str(f): [r.snapshot() for r in self.related_rows(f)] for f in related
+            },
+        )
+
+    def reset(self) -> None:
+        """Discards the entries found in the store, so that the row is populated again
+        the next time its entries are accessed (e.g. after items have been put into the
+        store by another process)"""
+        self._entries_dict = None
+        self._cells.clear()
+        self._entries_version += 1
+
     @property
     def entries_dict(self) -> dict[tuple[str, int | str | None], DataEntry]:
         if self._entries_dict is None:
@@ -333,9 +439,82 @@ class DataRow:
                 f"{self}, {self._entries_dict[(path, order_key)]} and {entry}"
             )
         self._entries_dict[(path, order_key)] = entry
+        # Cells matched against the previous entries may no longer be valid
+        self._cells.clear()
+        self._entries_version += 1
         return entry
 
 
+@attrs.define(kw_only=True)
+class RowSnapshot:
+    """A compact copy of a row and the entries found for it in the store (see
+    ``DataRow.snapshot``), which is restored into a row that is detached from the data
+    tree of the frameset, so that the tree doesn't need to be scanned to access it
+
+    Parameters
+    ----------
+    ids : dict[str, str]
+        the ids of the row, keyed by the names of their frequencies
+    frequency : str
+        the name of the frequency of the row
+    tree_path : list[str], optional
+        the path to the row within the data tree
+    uri : str, optional
+        the URI of the row
+    metadata : dict[str, Any], optional
+        the metadata of the row
+    entries : list[dict[str, Any]], optional
+        the arguments to recreate the entries of the row with, None if the row hadn't
+        been populated when the snapshot was taken
+    related : dict[str, list[RowSnapshot]], optional
+        snapshots of the related rows of other frequencies, keyed by the names of
+        their frequencies (see ``DataRow.related_rows``)
+    """
+
+    ids: dict[str, str | tuple[str, ...] | None]
+    frequency: str
+    tree_path: list[str] | None = None
+    uri: str | None = None
+    metadata: dict[str, ty.Any] | None = None
+    entries: list[dict[str, ty.Any]] | None = None
+    related: dict[str, list[RowSnapshot]] = attrs.field(factory=dict)
+
+    @property
+    def id(self) -> str | tuple[str, ...] | None:
+        return self.ids[self.frequency]
+
+    def restore(self, frameset: FrameSet) -> DataRow:
+        """Restores the row from the snapshot
+
+        Parameters
+        ----------
+        frameset : FrameSet
+            the frameset the row belongs to
+
+        Returns
+        -------
+        DataRow
+            the restored row, which doesn't have any children as it is detached from
+            the data tree
+        """
+        row = DataRow(
+            ids={frameset.axes[f]: i for f, i in self.ids.items()},
+            frameset=frameset,
+            frequency=frameset.axes[self.frequency],
+            tree_path=self.tree_path,
+            uri=self.uri,
+            metadata=self.metadata,
+        )
+        if self.entries is not None:
+            row._entries_dict = {}
+            for kwargs in self.entries:
+                entry = DataEntry(row=row, **kwargs)
+                row._entries_dict[(entry.path, entry.order_key)] = entry
+        for freq, snapshots in self.related.items():
+            row._related[frameset.axes[freq]] = [s.restore(frameset) for s in snapshots]
+        return row
+
+
 @register_serializer(DataRow)  # type: ignore[untyped-decorator]
 def bytes_repr_data_row(row: DataRow, cache: Cache) -> ty.Iterator[bytes]:
     yield "frametree.core.row.DataRow:(".encode()
@@ -1,15 +1,22 @@
 from __future__ import annotations
 
+import asyncio
 import logging
+import os
 import re
+import threading
+import time
 import typing as ty
+import weakref
 from abc import ABCMeta, abstractmethod
+from contextlib import contextmanager
 from pathlib import Path
 from pprint import pformat
+from types import TracebackType
 
 import attrs
 import yaml
-from fileformats.core import DataType, FieldPrimitive, FileSetPrimitive
+from fileformats.core import DataType, FieldPrimitive, FileSet, FileSetPrimitive
 from fileformats.text import Plain as PlainText
 from pydra.utils.typing import is_union
 
@@ -25,9 +32,12 @@ from frametree.core.serialize import asdict, fromdict
 from frametree.core.utils import NestedContext, get_config_file_path
 
 from ..axes import Axes
+from .checksums import hash_fileset
+from .transfer import TransferMode, override_transfer_mode
 
 S = ty.TypeVar("S", bound="Store")
 DT = ty.TypeVar("DT", bound="DataType")
+T = ty.TypeVar("T")
 
 
 logger = logging.getLogger("frametree")
@@ -40,20 +50,211 @@ if ty.TYPE_CHECKING:  # pragma: no cover
     from ..tree import DataTree
 
 
+# Session pools of the connection managers in the current process, keyed by the ID of
+# the manager. They are kept outside of the managers so that the stores they belong to
+# can still be pickled (e.g. by pydra)
+_session_pools: ty.Dict[int, _SessionPool] = {}
+_session_pools_guard = threading.Lock()
+
+
 @attrs.define
 class ConnectionManager(NestedContext):
+    """Manages the sessions used to access a store. Each thread that enters the context
+    checks out a session from a pool, which it keeps until it exits the outermost
+    context, so that threads don't share a session unless the maximum number of sessions
+    are already open, in which case the session with the fewest users is shared.
+    Threads that haven't entered the context themselves (e.g. the worker threads of a
+    thread pool started within it) use the session of the thread that entered it first.
+
+    Released sessions are kept open for reuse for up to ``idle_timeout`` seconds, and
+    are checked with ``Store.check_connection`` before they are reused.
+
+    Parameters
+    ----------
+    store : Store
+        the store the sessions are opened to
+    max_connections : int
+        the maximum number of sessions open at the same time, by default 1
+    idle_timeout : float
+        the number of seconds released sessions are kept open for, by default 0 (i.e.
+        they are closed as soon as they are released)
+    """
+
     store: ty.Any = None
-    session: ty.Any = attrs.field(default=None, init=False)
+    max_connections: int = 1
+    idle_timeout: float = 0.0
+
+    @property
+    def session(self) -> ty.Any:
+        """The session checked out by the current thread, or if it hasn't entered the
+        context, the session of the enclosing context. None if no thread is in the
+        context"""
+        pool = self._pool()
+        pooled = getattr(pool.local, "pooled", None)
+        if pooled is None:
+            pooled = pool.outer
+        return pooled.session if pooled is not None else None
 
     def __getattr__(self, attr_name: str) -> ty.Any:
         return getattr(self.session, attr_name)
 
-    def enter(self) -> None:
-        self.session = self.store.connect()
+    def __enter__(self) -> ty.Self:
+        pool = self._pool()
+        depth = getattr(pool.local, "depth", 0)
+        if not depth:
+            pool.local.pooled = self._checkout(pool)
+            with pool.lock:
+                if pool.outer is None:
+                    pool.outer = pool.local.pooled
+        pool.local.depth = depth + 1
+        with self._depth_lock():
+            self.depth += 1
+        return self
+
+    def __exit__(
+        self,
+        exception_type: ty.Optional[ty.Type[BaseException]],
+        exception_value: ty.Optional[BaseException],
+        traceback: ty.Optional[TracebackType],
+    ) -> None:
+        pool = self._pool()
+        with self._depth_lock():
+            self.depth -= 1
+        pool.local.depth -= 1
+        if not pool.local.depth:
+            pooled, pool.local.pooled = pool.local.pooled, None
+            self._release(pool, pooled)
+
+    def close(self) -> None:
+        """Disconnects the sessions that are being kept open for reuse"""
+        pool = self._pool()
+        with pool.lock:
+            idle = [p for p in pool.sessions if not p.users]
+            for pooled in idle:
+                pool.sessions.remove(pooled)
+            pool.changed.notify_all()
+        self._discard(idle)
+
+    def _checkout(self, pool: _SessionPool) -> _PooledSession:
+        while True:
+            with pool.lock:
+                expired = pool.expire(self.idle_timeout)
+                idle = [p for p in pool.sessions if not p.users]
+                if idle:
+                    pooled = max(idle, key=lambda p: p.released)
+                elif len(pool.sessions) + pool.connecting < self.max_connections:
+                    pool.connecting += 1
+                    pooled = None
+                elif pool.sessions:
+                    shared = min(pool.sessions, key=lambda p: p.users)
+                    shared.users += 1
+                    return shared
+                else:
+                    # Wait for the sessions that are being opened by other threads
+                    pool.changed.wait()
+                    continue
+                if pooled is not None:
+                    pooled.users += 1
+            self._discard(expired)
+            if pooled is None:
+                return self._connect(pool)
+            try:
+                healthy = self.store.check_connection(pooled.session)
+            except Exception as e:
+                logger.warning("Could not check connection to %s: %s", self.store, e)
+                healthy = False
+            if healthy:
+                return pooled
+            logger.info("Replacing stale connection to %s", self.store)
+            with pool.lock:
+                pool.sessions.remove(pooled)
+                pool.changed.notify_all()
+            self._discard([pooled])
+
+    def _connect(self, pool: _SessionPool) -> _PooledSession:
+        try:
+            pooled = _PooledSession(self.store.connect(), users=1)
+        except BaseException:
+            with pool.lock:
+                pool.connecting -= 1
+                pool.changed.notify_all()
+            raise
+        with pool.lock:
+            pool.connecting -= 1
+            pool.sessions.append(pooled)
+            pool.changed.notify_all()
+        return pooled
+
+    def _release(self, pool: _SessionPool, pooled: _PooledSession) -> None:
+        with pool.lock:
+            pooled.users -= 1
+            if pooled.users:
+                return
+            if pool.outer is pooled:
+                pool.outer = None
+            pooled.released = time.monotonic()
+            if self.idle_timeout > 0:
+                expired = pool.expire(self.idle_timeout)
+            else:
+                pool.sessions.remove(pooled)
+            pool.changed.notify_all()
+        if self.idle_timeout > 0:
+            self._discard(expired)
+        else:
+            self.store.disconnect(pooled.session)
+
+    def _discard(self, sessions: ty.List[_PooledSession]) -> None:
+        for pooled in sessions:
+            try:
+                self.store.disconnect(pooled.session)
+            except Exception as e:
+                logger.warning("Could not disconnect from %s: %s", self.store, e)
 
-    def exit(self) -> None:
-        self.store.disconnect(self.session)
-        self.session = None
+    def _pool(self) -> _SessionPool:
+        key = id(self)
+        with _session_pools_guard:
+            pool = _session_pools.get(key)
+            # Sessions inherited from a parent process (via fork) aren't reused
+            if pool is None or pool.pid != os.getpid():
+                if pool is None:
+                    weakref.finalize(self, _session_pools.pop, key, None)
+                pool = _session_pools[key] = _SessionPool()
+            return pool
+
+
+@attrs.define(eq=False)
+class _PooledSession:
+    session: ty.Any
+    users: int = 0
+    released: float = 0.0
+
+
+@attrs.define
+class _SessionPool:
+    pid: int = attrs.field(factory=os.getpid)
+    sessions: ty.List[_PooledSession] = attrs.field(factory=list)
+    connecting: int = 0
+    # The session of the first thread to enter the context, which is used by threads
+    # that haven't entered it themselves
+    outer: ty.Optional[_PooledSession] = None
+    local: threading.local = attrs.field(factory=threading.local)
+    lock: threading.Lock = attrs.field(factory=threading.Lock)
+    changed: threading.Condition = attrs.field(
+        default=attrs.Factory(
+            lambda self: threading.Condition(self.lock), takes_self=True
+        )
+    )
+
+    def expire(self, idle_timeout: float) -> ty.List[_PooledSession]:
+        """Removes the sessions that have been idle for longer than the timeout, which
+        need to be disconnected by the caller (outside of the lock)"""
+        now = time.monotonic()
+        expired = [
+            p for p in self.sessions if not p.users and now - p.released > idle_timeout
+        ]
+        for pooled in expired:
+            self.sessions.remove(pooled)
+        return expired
 
 
 @attrs.define
@@ -369,6 +570,7 @@ class Store(metaclass=ABCMeta):
         hierarchy: ty.Optional[ty.List[str]] = None,
         id_patterns: ty.Optional[ty.Dict[str, str]] = None,
         use_original_paths: bool = False,
+        transfer_mode: ty.Union[TransferMode, str, None] = None,
         **kwargs: ty.Any,
     ) -> None:
         """Import a dataset from another store, transferring metadata and columns
@@ -396,6 +598,11 @@ class Store(metaclass=ABCMeta):
         use_original_paths : bool, optional
             use the original paths in the source store instead of renaming the imported
             entries to match their column names
+        transfer_mode : TransferMode or str, optional
+            how the files of imported file-sets are transferred into the store (i.e.
+            copy, hardlink, reflink, symlink or move), overriding the transfer mode of
+            the store. Note that "move" will remove the files from the original dataset
+            if they aren't converted to a new datatype on import
         **kwargs:
             keyword arguments passed through to the `create_data_tree` method
         """
@@ -449,13 +656,16 @@ class Store(metaclass=ABCMeta):
                     row_frequency=column.row_frequency,
                 )
                 # Copy across data from dataset to import
-                for cell in column.cells():
-                    item = cell.item
-                    if not isinstance(item, imported_col.datatype):
-                        item = imported_col.datatype.convert(item)
-                    imported_col[
-                        tuple(cell.row.frequency_id(a) for a in dataset.axes.bases())
-                    ] = item
+                with self.batch_writes(), override_transfer_mode(self, transfer_mode):
+                    for cell in column.cells():
+                        item = cell.item
+                        if not isinstance(item, imported_col.datatype):
+                            item = imported_col.datatype.convert(item)
+                        imported_col[
+                            tuple(
+                                cell.row.frequency_id(a) for a in dataset.axes.bases()
+                            )
+                        ] = item
             imported.save(name="")
 
     @classmethod
@@ -711,6 +921,22 @@ class Store(metaclass=ABCMeta):
             The row to populate with entries
         """
 
+    def populate_rows(self, rows: ty.Sequence[DataRow]) -> None:
+        """
+        Populate multiple rows with the data entries found in their corresponding
+        nodes in the data store. Called by column-wide operations, so stores that are
+        able to list the entries of multiple rows at once (e.g. in a single API
+        request) should override this method. Defaults to calling ``populate_row``
+        for each row in turn.
+
+        Parameters
+        ----------
+        rows : Sequence[DataRow]
+            The rows to populate with entries
+        """
+        for row in rows:
+            self.populate_row(row)
+
     @abstractmethod
     def get(
         self, entry: DataEntry, datatype: ty.Type[DT]
@@ -931,10 +1157,269 @@ class Store(metaclass=ABCMeta):
             self.put(item, entry)
         return entry
 
+    # Can be overridden by stores with asyncio clients, so that many items can be
+    # retrieved concurrently without tying up a thread each
+    async def aget(
+        self, entry: DataEntry, datatype: ty.Type[DT]
+    ) -> FileSetPrimitive | FieldPrimitive:
+        """Asynchronous version of ``get``, which calls ``get`` in a worker thread by
+        default
+
+        Parameters
+        ----------
+        entry : DataEntry
+            the data entry to retrieve the item from
+        datatype : type
+            the datatype to interpret the entry's item as
+
+        Returns
+        -------
+        item : DataType
+            the item stored within the specified entry
+        """
+        return await self._run_in_thread(self.get, entry, datatype)
+
+    # Can be overridden by stores with asyncio clients
+    async def aput(self, item: DT, entry: DataEntry) -> DT:
+        """Asynchronous version of ``put``, which calls ``put`` in a worker thread by
+        default
+
+        Parameters
+        ----------
+        item : DataType
+            the item to replace the current item in the data store
+        entry: DataEntry
+            the data entry to update
+
+        Returns
+        -------
+        cached : DataType
+            returns the cached version of the item, if applicable
+        """
+        return await self._run_in_thread(self.put, item, entry)
+
+    # Can be overridden by stores with asyncio clients
+    async def apopulate_row(self, row: DataRow) -> None:
+        """Asynchronous version of ``populate_row``, which calls ``populate_row`` in a
+        worker thread by default
+
+        Parameters
+        ----------
+        row : DataRow
+            The row to populate with entries
+        """
+        await self._run_in_thread(self.populate_row, row)
+
+    # Can be overridden by stores that are able to combine multiple writes into a
+    # single update (e.g. ``LocalStore`` fields JSON files)
+    @contextmanager
+    def batch_writes(self) -> ty.Iterator[None]:
+        """Context manager within which the store may buffer writes (e.g. of fields
+        and provenance), flushing them together on exit instead of one at a time.
+        Writes are made immediately by default.
+
+        Within the context, the values of buffered writes are still returned when the
+        written entries are read back from the store (in the same thread).
+        """
+        yield
+
+    # Can be overridden by stores that keep local copies of items in a cache that is
+    # limited in size (e.g. ``RemoteStore``)
+    @contextmanager
+    def pin_cached(self) -> ty.Iterator[None]:
+        """Context manager within which local copies of the items retrieved from the
+        store are protected from being evicted from the store's cache, by this or any
+        other process. Does nothing by default.
+        """
+        yield
+
+    # Can be overridden by stores that retrieve items into a local cache (e.g.
+    # ``RemoteStore``)
+    def is_local(self, entry: DataEntry) -> bool:
+        """Whether the item in the entry can be accessed without transferring it from
+        the store, e.g. because an up-to-date copy is in the local cache. Items are
+        assumed to be local by default
+
+        Parameters
+        ----------
+        entry : DataEntry
+            the entry to check
+
+        Returns
+        -------
+        bool
+            whether the item can be accessed without being transferred
+        """
+        return True
+
+    # Can be overridden by stores that are able to upload items in the background (e.g.
+    # ``RemoteStore``)
+    def wait_for_uploads(self) -> None:
+        """Waits for any items that are being put into the store in the background to
+        finish uploading. Items are put into the store synchronously by default.
+
+        Raises
+        ------
+        FrameTreeError
+            if any of the uploads failed
+        """
+
+    # Can be overridden by stores whose sessions can be dropped by the server while they
+    # are kept open for reuse (see ``RemoteStore.connection_idle_timeout``)
+    def check_connection(self, session: ty.Any) -> bool:
+        """Checks whether a session that has been kept open for reuse is still usable
+        before it is reused. Sessions are assumed to remain usable by default.
+
+        Parameters
+        ----------
+        session : Any
+            the session object returned by `connect`
+
+        Returns
+        -------
+        bool
+            whether the session can be reused, otherwise it is disconnected and a new
+            session is opened in its place
+        """
+        return True
+
+    # Can be overridden by stores that need to download items before they can be read
+    # (e.g. ``RemoteStore``), so that only the parts of the item required to check its
+    # format are retrieved
+    def probe_datatype(self, entry: DataEntry, datatype: ty.Type[DataType]) -> None:
+        """Checks whether the item stored in the entry matches the given datatype,
+        e.g. when matching entries to a column. Defaults to retrieving the item.
+
+        Parameters
+        ----------
+        entry : DataEntry
+            the entry to check the format of
+        datatype : type
+            the datatype to check the item against
+
+        Raises
+        ------
+        FormatMismatchError
+            if the item doesn't match the datatype
+        """
+        entry.get_item(datatype)
+
+    # Can be overridden by stores that are able to provide the checksums of items
+    # without retrieving them (e.g. ``RemoteStore``)
+    def item_checksums(self, entry: DataEntry) -> ty.Dict[str, ty.Any]:
+        """Returns checksums of the item in the entry, which are used to detect whether
+        the inputs of a pipeline have changed since its outputs were derived. By
+        default, the checksums provided when the entry was found are used if present,
+        otherwise the files of file-sets are hashed and fields are returned as is
+
+        Parameters
+        ----------
+        entry : DataEntry
+            the entry to return the checksums of
+
+        Returns
+        -------
+        checksums : dict[str, Any]
+            the checksums of the files in the entry keyed by their relative paths, or
+            the value of field entries
+        """
+        if entry.checksums:
+            return entry.checksums
+        item = entry.item
+        if isinstance(item, FileSet):
+            return hash_fileset(item)
+        return {"value": item.value}
+
+    # Can be overridden by stores that are able to detect whether an item has changed
+    # more cheaply than retrieving it again, to enable in-process caching of items
+    def item_cache_key(
+        self, entry: DataEntry
+    ) -> ty.Optional[ty.Tuple[ty.Hashable, ty.Optional[ty.Hashable]]]:
+        """Returns the key used to cache items retrieved from the entry within the
+        current process (see ``frametree.core.entry.ItemCache``)
+
+        Parameters
+        ----------
+        entry : DataEntry
+            the entry to return the cache key for
+
+        Returns
+        -------
+        cache_key : tuple[Hashable, Hashable or None] or None
+            a key identifying the location of the entry uniquely across stores, and a
+            token that changes whenever the item in the entry changes (e.g.
+            modification time or checksums), which is None if it can't currently be
+            relied on to detect changes. None if items from the store can't be cached
+            (the default)
+        """
+        return None
+
+    # Can be overridden by stores that are able to detect whether an item has changed
+    # more cheaply than calculating its checksums (e.g. ``FileSystem``)
+    def item_change_token(self, entry: DataEntry) -> ty.Optional[ty.Any]:
+        """Returns a token that changes whenever the item in the entry changes, which
+        is recorded in the provenance of derivatives alongside the checksums of their
+        inputs and outputs, so that the checksums only need to be calculated again
+        when the token has changed (see ``item_checksums``)
+
+        Parameters
+        ----------
+        entry : DataEntry
+            the entry to return the change token of
+
+        Returns
+        -------
+        token : list or None
+            a JSON-serialisable token, or None if changes can't currently be detected
+            from it (the default)
+        """
+        return None
+
+    # Can be overridden by stores that are able to persist the scanned data tree
+    # between sessions (e.g. ``FileSystem``) to avoid rescanning it every time the
+    # tree is entered
+    def load_tree_index(self, tree: DataTree) -> bool:
+        """Populates the data tree from an index saved by a previous call to
+        ``save_tree_index``, if one exists and is still up to date. Called by
+        ``DataTree.enter`` before falling back to ``populate_tree``
+
+        Parameters
+        ----------
+        tree : DataTree
+            the tree to populate with nodes
+
+        Returns
+        -------
+        loaded : bool
+            whether the tree was populated from the saved index
+        """
+        return False
+
+    def save_tree_index(self, tree: DataTree) -> None:
+        """Saves an index of the scanned data tree (and any entries found in its rows)
+        so it can be loaded by ``load_tree_index`` the next time the tree is entered.
+        Called by ``DataTree.exit`` before the tree is discarded
+
+        Parameters
+        ----------
+        tree : DataTree
+            the tree to save the index of
+        """
+
     ##################
     # Helper methods #
     ##################
 
+    async def _run_in_thread(self, func: ty.Callable[..., T], *args: ty.Any) -> T:
+        """Calls a synchronous method of the store in a worker thread, within a
+        connection context of its own"""
+
+        def call() -> T:
+            with self.connection:
+                return func(*args)
+
+        return await asyncio.to_thread(call)
+
     def check_store_version(self, store_version: str) -> None:
         """Check whether version store used to save the dataset is compatible with the
         current version of the software. Can be overridden by store subclasses where
@@ -0,0 +1,705 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+import typing as ty
+from contextlib import contextmanager
+from pathlib import Path
+from uuid import uuid4
+
+import attrs
+from fasteners import InterProcessLock, InterProcessReaderWriterLock
+
+from frametree.core.exceptions import FrameTreeUsageError
+from frametree.core.utils import append_suffix
+
+from .transfer import TransferMode, transfer_path
+
+logger = logging.getLogger("frametree")
+
+
+# Pins held on cache entries by the current process, keyed by the path of the entry
+# (a reference count and the inter-process lock held while the count is non-zero).
+# Inter-process locks are held per process, so pins and evictions made by different
+# threads of the same process need to be coordinated separately
+_pins: ty.Dict[str, ty.Tuple[int, InterProcessReaderWriterLock]] = {}
+_pins_lock = threading.Lock()
+# Serialises updates to cache indices made by different threads of the same process
+_index_lock = threading.Lock()
+# Guards the accesses, hits and misses buffered by cache managers
+_buffer_lock = threading.Lock()
+# Releases for the pins acquired within the current thread's `CacheManager.pinned`
+# contexts, keyed by the ID of the cache manager
+_pin_contexts = threading.local()
+
+SIZE_UNITS = {
+    "": 1,
+    "K": 1000,
+    "M": 1000**2,
+    "G": 1000**3,
+    "T": 1000**4,
+    "KI": 1024,
+    "MI": 1024**2,
+    "GI": 1024**3,
+    "TI": 1024**4,
+}
+
+
+def parse_size(size: ty.Union[int, str, None]) -> ty.Optional[int]:
+    """Parses a size in bytes, which can be given as a string with a unit suffix,
+    e.g. "500M", "20GB" or "1.5GiB"
+
+    Parameters
+    ----------
+    size : int or str or None
+        the size to parse
+
+    Returns
+    -------
+    int or None
+        the size in bytes
+    """
+    if size is None or isinstance(size, int):
+        return size
+    match = re.match(r"^\s*(\d+(?:\.\d+)?)\s*([kmgt]i?)?b?\s*$", str(size), re.I)
+    if not match:
+        raise FrameTreeUsageError(f"Could not parse size '{size}'")
+    number, unit = match.groups()
+    return int(float(number) * SIZE_UNITS[(unit or "").upper()])
+
+
+@attrs.define
+class CacheStats:
+    """Summary of the occupancy of a cache directory and how often requests for items
+    were able to be served from it
+
+    Parameters
+    ----------
+    size : int
+        the total size of the entries in the cache in bytes
+    max_size : int or None
+        the size the cache is limited to in bytes, if any
+    num_entries : int
+        the number of entries in the cache
+    hits : int
+        the number of requests served from the cache
+    misses : int
+        the number of requests that required the item to be downloaded
+    """
+
+    size: int
+    max_size: ty.Optional[int]
+    num_entries: int
+    hits: int
+    misses: int
+
+    @property
+    def occupancy(self) -> ty.Optional[float]:
+        "The fraction of the size limit of the cache that is in use"
+        return self.size / self.max_size if self.max_size else None
+
+    @property
+    def hit_rate(self) -> ty.Optional[float]:
+        "The fraction of requests that were served from the cache"
+        requests = self.hits + self.misses
+        return self.hits / requests if requests else None
+
+
+@attrs.define
+class CacheManager:
+    """Keeps track of the entries downloaded into the cache directory of a remote
+    store, evicting the least recently used ones (along with their checksum sidecars)
+    when the total size of the cache exceeds its limit.
+
+    The sizes of the entries and the times they were last accessed are saved in an
+    index at the top of the cache directory, which consists of a snapshot and a journal
+    of the changes made since it was taken. Each process keeps a copy of the index in
+    memory, which is brought up to date by reading the changes appended to the
+    journal by other processes, so that the index doesn't need to be read or rewritten
+    in full whenever an entry is accessed or added. Accesses are buffered in memory
+    and appended to the journal in batches, and the journal is compacted into a new
+    snapshot once it grows larger than the index.
+
+    Entries can be pinned to prevent them from being evicted while they are in use,
+    by this or any other process sharing the cache directory.
+
+    Entries can also be added to a content-addressed store of "blobs" keyed by their
+    checksums, so that entries with identical contents at different URIs can be
+    hard-linked to a single copy instead of being downloaded again. Blobs are removed
+    when the last entry linked to them is evicted.
+
+    Parameters
+    ----------
+    cache_dir : Path
+        the cache directory to manage
+    max_size : int, optional
+        the maximum total size of the entries in the cache in bytes, by default the
+        size of the cache isn't limited
+    sidecar_suffix : str
+        the suffix appended to the path of each entry to give the path of its sidecar
+    """
+
+    INDEX_FNAME = ".cache-index.json"
+    JOURNAL_FNAME_TEMPLATE = ".cache-index.{}.journal"
+    BLOBS_DIR = ".blobs"
+    PIN_SUFFIX = ".pin"
+    LOCK_SUFFIX = ".lock"
+    # The fraction of the size limit the cache is reduced to when it is exceeded, so
+    # that entries are evicted in batches instead of every time an entry is added
+    EVICTION_TARGET = 0.9
+    # The number of accesses that are buffered before they are written to the journal
+    MAX_BUFFERED_ACCESSES = 1000
+    # The minimum number of changes in the journal before it is compacted
+    MIN_COMPACTED_RECORDS = 1000
+
+    cache_dir: Path
+    max_size: ty.Optional[int] = attrs.field(default=None, converter=parse_size)
+    sidecar_suffix: str = ".md5.json"
+    # Hits and misses that haven't been added to the totals in the index yet
+    _hits: int = attrs.field(default=0, init=False)
+    _misses: int = attrs.field(default=0, init=False)
+    # Times that entries were accessed that haven't been written to the journal yet
+    _accessed: ty.Dict[str, int] = attrs.field(
+        factory=dict, init=False, eq=False, repr=False
+    )
+    # The in-memory copy of the index, the identity of the snapshot it was loaded from,
+    # and the position and number of records read from the journal since
+    _index: ty.Optional[ty.Dict[str, ty.Any]] = attrs.field(
+        default=None, init=False, eq=False, repr=False
+    )
+    _snapshot_key: ty.Optional[ty.Tuple[int, int, int]] = attrs.field(
+        default=None, init=False, eq=False, repr=False
+    )
+    _journal_pos: int = attrs.field(default=0, init=False, eq=False, repr=False)
+    _journal_records: int = attrs.field(default=0, init=False, eq=False, repr=False)
+
+    @property
+    def index_path(self) -> Path:
+        return self.cache_dir / self.INDEX_FNAME
+
+    def hit(self, cache_path: Path) -> None:
+        """Records that a request for an entry was served from the cache
+
+        Parameters
+        ----------
+        cache_path : Path
+            the path of the entry in the cache
+        """
+        relpath = cache_path.relative_to(self.cache_dir).as_posix()
+        with _buffer_lock:
+            self._hits += 1
+            self._accessed[relpath] = time.time_ns()
+            num_buffered = len(self._accessed)
+        if num_buffered >= self.MAX_BUFFERED_ACCESSES:
+            self.flush()
+
+    def miss(self) -> None:
+        "Records that a request for an entry required it to be downloaded"
+        with _buffer_lock:
+            self._misses += 1
+
+    def added(self, cache_path: Path) -> None:
+        """Records the size of an entry that has been added (or replaced) in the cache,
+        evicting least recently used entries if the cache is now over its size limit
+
+        Parameters
+        ----------
+        cache_path : Path
+            the path of the entry in the cache
+        """
+        relpath = cache_path.relative_to(self.cache_dir).as_posix()
+        size = self._entry_size(cache_path)
+        with self._locked_index() as index:
+            self._log([["add", relpath, size, time.time_ns()]])
+            if self.max_size is not None and index["size"] > self.max_size:
+                self._evict(
+                    index, int(self.max_size * self.EVICTION_TARGET), keep=relpath
+                )
+
+    def evict(self, max_size: ty.Optional[int] = None) -> int:
+        """Evicts the least recently used entries that aren't pinned until the size of
+        the cache is within the given size
+
+        Parameters
+        ----------
+        max_size : int, optional
+            the size to reduce the cache to, by default the size limit of the cache
+
+        Returns
+        -------
+        int
+            the number of bytes evicted
+        """
+        if max_size is None:
+            max_size = self.max_size
+        with self._locked_index() as index:
+            return self._evict(index, max_size)
+
+    def stats(self) -> CacheStats:
+        """Returns the occupancy and hit-rate of the cache (the hits and misses are
+        totalled across all the processes that have used the cache)
+
+        Returns
+        -------
+        CacheStats
+            the statistics of the cache
+        """
+        with self._locked_index() as index:
+            pass
+        return CacheStats(
+            size=index["size"],
+            max_size=self.max_size,
+            num_entries=len(index["entries"]),
+            hits=index["hits"] + self._hits,
+            misses=index["misses"] + self._misses,
+        )
+
+    def flush(self) -> None:
+        """Writes the accesses, hits and misses recorded by this process since they
+        were last written to the index"""
+        with _buffer_lock:
+            buffered = self._hits or self._misses or self._accessed
+        if buffered:
+            with self._locked_index():
+                pass
+
+    def clear(self) -> None:
+        "Removes all entries from the cache"
+        with _index_lock:
+            shutil.rmtree(self.cache_dir)
+            self.cache_dir.mkdir()
+            with _buffer_lock:
+                self._hits = self._misses = 0
+                self._accessed = {}
+            self._index = None
+
+    @contextmanager
+    def pinned(self) -> ty.Iterator[None]:
+        """Context manager within which entries passed to `retain` are protected from
+        eviction"""
+        contexts = _pin_contexts.__dict__.setdefault("contexts", {})
+        if id(self) in contexts:  # nested within an existing context
+            yield
+            return
+        releases = contexts[id(self)] = []
+        try:
+            yield
+        finally:
+            del contexts[id(self)]
+            for release in releases:
+                release()
+            self.flush()
+
+    def retain(self, cache_path: Path) -> None:
+        """Pins an entry until the current thread's `pinned` context exits, if one is
+        active
+
+        Parameters
+        ----------
+        cache_path : Path
+            the path of the entry in the cache
+        """
+        releases = getattr(_pin_contexts, "contexts", {}).get(id(self))
+        if releases is not None:
+            releases.append(self.pin(cache_path))
+
+    def pin(self, cache_path: Path) -> ty.Callable[[], None]:
+        """Pins an entry in the cache so that it isn't evicted by this or any other
+        process until the pin is released
+
+        Parameters
+        ----------
+        cache_path : Path
+            the path of the entry in the cache
+
+        Returns
+        -------
+        release : Callable
+            function to call to release the pin
+        """
+        key = str(cache_path)
+        pin_path = append_suffix(cache_path, self.PIN_SUFFIX)
+        with _pins_lock:
+            count, lock = _pins.get(key, (0, None))
+            while not count:
+                lock = InterProcessReaderWriterLock(pin_path)
+                lock.acquire_read_lock()
+                # The pin file is removed when the entry is evicted, in which case the
+                # lock is acquired again on the file that replaces it
+                if is_current_lock_file(lock, pin_path):
+                    break
+                lock.release_read_lock()
+            _pins[key] = (count + 1, lock)
+
+        def release() -> None:
+            with _pins_lock:
+                count, lock = _pins.pop(key)
+                if count > 1:
+                    _pins[key] = (count - 1, lock)
+                else:
+                    lock.release_read_lock()
+
+        return release
+
+    def blob_path(self, checksums: ty.Dict[str, ty.Any]) -> Path:
+        """Path to the blob containing the files of entries with the given checksums
+
+        Parameters
+        ----------
+        checksums : dict[str, Any]
+            the checksums of the files in the entry
+
+        Returns
+        -------
+        Path
+            the path to the blob directory
+        """
+        key = hashlib.sha256(json.dumps(checksums, sort_keys=True).encode()).hexdigest()
+        return self.cache_dir / self.BLOBS_DIR / key[:2] / key
+
+    def add_blob(self, cache_path: Path, checksums: ty.Dict[str, ty.Any]) -> None:
+        """Adds the files of an entry to the blob store (as hard-links) if there isn't
+        already a blob with the same checksums
+
+        Parameters
+        ----------
+        cache_path : Path
+            the path of the entry in the cache
+        checksums : dict[str, Any]
+            the checksums of the files in the entry
+        """
+        blob_path = self.blob_path(checksums)
+        if blob_path.exists():
+            return
+        blob_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = blob_path.with_name(f".{blob_path.name}.{uuid4()}.tmp")
+        transfer_path(cache_path, tmp_path, TransferMode.hardlink)
+        try:
+            os.rename(tmp_path, blob_path)
+        except OSError:  # blob was added by another process in the meantime
+            shutil.rmtree(tmp_path)
+
+    def link_blob(
+        self,
+        cache_path: Path,
+        checksums: ty.Dict[str, ty.Any],
+        names: ty.Collection[str],
+    ) -> bool:
+        """Populates an entry in the cache with hard-links to the files of the blob
+        with matching checksums, if there is one. The files are linked under the names
+        of the entry's own files, as the names of files in identical file-sets can
+        differ (e.g. single files named after the entries they were put into)
+
+        Parameters
+        ----------
+        cache_path : Path
+            the path of the entry in the cache
+        checksums : dict[str, Any]
+            the checksums of the files in the entry
+        names : Collection[str]
+            the paths of the files in the entry, relative to the entry
+
+        Returns
+        -------
+        bool
+            whether a matching blob was found and linked
+        """
+        blob_path = self.blob_path(checksums)
+        try:
+            blob_names = _relative_file_paths(blob_path)
+        except FileNotFoundError:
+            return False
+        names = sorted(names)
+        if blob_names == names:
+            renames = {n: n for n in names}
+        elif len(blob_names) == 1 and len(names) == 1:
+            # The checksums of single files don't depend on their names
+            renames = {blob_names[0]: names[0]}
+        else:
+            return False
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_name(f".{cache_path.name}.{uuid4()}.tmp")
+        try:
+            for blob_name, name in renames.items():
+                dest = tmp_path / name
+                dest.parent.mkdir(parents=True, exist_ok=True)
+                transfer_path(blob_path / blob_name, dest, TransferMode.hardlink)
+        except FileNotFoundError:  # blob was removed by another process
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            return False
+        if cache_path.exists():
+            shutil.rmtree(cache_path)
+        os.rename(tmp_path, cache_path)
+        return True
+
+    ##################
+    # Helper methods #
+    ##################
+
+    @contextmanager
+    def _locked_index(self) -> ty.Iterator[ty.Dict[str, ty.Any]]:
+        """Brings the in-memory copy of the index up to date within inter-process and
+        inter-thread locks, including the accesses, hits and misses recorded since they
+        were last written to the journal"""
+        with _index_lock, InterProcessLock(
+            append_suffix(self.index_path, self.LOCK_SUFFIX), logger=logger
+        ):
+            index = self._sync_index()
+            with _buffer_lock:
+                accessed, self._accessed = self._accessed, {}
+                hits, misses = self._hits, self._misses
+                self._hits = self._misses = 0
+            records: ty.List[ty.List[ty.Any]] = []
+            if accessed:
+                records.append(["access", accessed])
+            if hits or misses:
+                records.append(["stats", hits, misses])
+            self._log(records)
+            yield index
+            if self._journal_records > max(
+                self.MIN_COMPACTED_RECORDS, len(index["entries"])
+            ):
+                self._save_snapshot(index)
+
+    def _sync_index(self) -> ty.Dict[str, ty.Any]:
+        """Reloads the index if a new snapshot has been saved since it was loaded, and
+        applies the changes appended to the journal since it was last read"""
+        try:
+            stat = os.stat(self.index_path)
+        except FileNotFoundError:
+            snapshot_key = None
+        else:
+            snapshot_key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if self._index is None or snapshot_key != self._snapshot_key:
+            index = self._load_snapshot()
+            if index is None:
+                self._save_snapshot(self._rebuild_index())
+            else:
+                self._index = index
+                self._snapshot_key = snapshot_key
+                self._journal_pos = self._journal_records = 0
+        try:
+            with open(self._journal_path(self._index["journal"]), "rb") as f:
+                f.seek(self._journal_pos)
+                changes = f.read()
+        except FileNotFoundError:
+            changes = b""
+        # Only complete lines are applied, in case a write was interrupted
+        changes = changes[: changes.rfind(b"\n") + 1]
+        for line in changes.splitlines():
+            self._apply(self._index, json.loads(line))
+            self._journal_records += 1
+        self._journal_pos += len(changes)
+        return self._index
+
+    def _log(self, records: ty.List[ty.List[ty.Any]]) -> None:
+        """Applies changes to the in-memory copy of the index and appends them to the
+        journal, which the copy must be up to date with"""
+        if not records:
+            return
+        for record in records:
+            self._apply(self._index, record)
+        with open(self._journal_path(self._index["journal"]), "a") as f:
+            f.write("".join(json.dumps(r) + "\n" for r in records))
+            self._journal_pos = f.tell()
+        self._journal_records += len(records)
+
+    @staticmethod
+    def _apply(index: ty.Dict[str, ty.Any], record: ty.List[ty.Any]) -> None:
+        entries = index["entries"]
+        kind = record[0]
+        if kind == "add":
+            _, relpath, size, accessed = record
+            previous = entries.get(relpath)
+            index["size"] += size - (previous[0] if previous else 0)
+            entries[relpath] = [size, accessed]
+        elif kind == "remove":
+            previous = entries.pop(record[1], None)
+            if previous:
+                index["size"] -= previous[0]
+        elif kind == "access":
+            for relpath, accessed in record[1].items():
+                entry = entries.get(relpath)
+                if entry is not None and accessed > entry[1]:
+                    entry[1] = accessed
+        elif kind == "stats":
+            index["hits"] += record[1]
+            index["misses"] += record[2]
+
+    def _save_snapshot(self, index: ty.Dict[str, ty.Any]) -> None:
+        """Saves the index as a new snapshot with an empty journal, removing the
+        journal of the previous snapshot"""
+        previous = index.get("journal")
+        index["journal"] = uuid4().hex
+        tmp_path = self.index_path.with_name(f".{self.INDEX_FNAME}.{uuid4()}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self.index_path)
+        stat = os.stat(self.index_path)
+        self._index = index
+        self._snapshot_key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        self._journal_pos = self._journal_records = 0
+        if previous is not None:
+            self._journal_path(previous).unlink(missing_ok=True)
+
+    def _load_snapshot(self) -> ty.Optional[ty.Dict[str, ty.Any]]:
+        try:
+            with open(self.index_path) as f:
+                index = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if not isinstance(index, dict) or "journal" not in index:
+            return None  # saved by a previous version
+        return index
+
+    def _rebuild_index(self) -> ty.Dict[str, ty.Any]:
+        """Indexes the entries that are already present in the cache from their
+        sidecars, using their modification times as the times they were last accessed"""
+        for journal in self.cache_dir.glob(self.JOURNAL_FNAME_TEMPLATE.format("*")):
+            journal.unlink(missing_ok=True)
+        entries = {}
+        for sidecar in self.cache_dir.rglob("*" + self.sidecar_suffix):
+            cache_path = sidecar.with_name(sidecar.name[: -len(self.sidecar_suffix)])
+            if cache_path.exists():
+                relpath = cache_path.relative_to(self.cache_dir).as_posix()
+                entries[relpath] = [
+                    self._entry_size(cache_path),
+                    os.stat(sidecar).st_mtime_ns,
+                ]
+        return {
+            "entries": entries,
+            "size": sum(s for s, _ in entries.values()),
+            "hits": 0,
+            "misses": 0,
+        }
+
+    def _journal_path(self, journal: str) -> Path:
+        return self.cache_dir / self.JOURNAL_FNAME_TEMPLATE.format(journal)
+
+    def _evict(
+        self,
+        index: ty.Dict[str, ty.Any],
+        max_size: ty.Optional[int],
+        keep: ty.Optional[str] = None,
+    ) -> int:
+        size = index["size"]
+        if max_size is None or size <= max_size:
+            return 0
+        evicted = 0
+        removed = []
+        candidates = sorted(
+            ((r, e) for r, e in index["entries"].items() if r != keep),
+            key=lambda item: item[1][1],
+        )
+        for relpath, (entry_size, _) in candidates:
+            if size - evicted <= max_size:
+                break
+            if self._remove(self.cache_dir / relpath):
+                evicted += entry_size
+                removed.append(["remove", relpath])
+        self._log(removed)
+        if size - evicted > max_size:
+            logger.warning(
+                "Could not reduce the size of the cache at %s (%s bytes) below its "
+                "limit of %s bytes as the remaining entries are in use",
+                self.cache_dir,
+                size - evicted,
+                max_size,
+            )
+        logger.info(
+            "Evicted %s bytes from cache at %s to keep it within %s bytes",
+            evicted,
+            self.cache_dir,
+            max_size,
+        )
+        return evicted
+
+    def _remove(self, cache_path: Path) -> bool:
+        """Removes an entry and its sidecar from the cache unless it is pinned"""
+        with _pins_lock:
+            if str(cache_path) in _pins:
+                return False
+            lock = InterProcessReaderWriterLock(
+                append_suffix(cache_path, self.PIN_SUFFIX)
+            )
+            if not lock.acquire_write_lock(blocking=False):
+                return False
+            sidecar = append_suffix(cache_path, self.sidecar_suffix)
+            try:
+                with open(sidecar) as f:
+                    checksums = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                checksums = None
+            try:
+                shutil.rmtree(cache_path, ignore_errors=True)
+                sidecar.unlink(missing_ok=True)
+                # Removed while the lock is held, so that the pin files of evicted
+                # entries don't accumulate (see ``is_current_lock_file``)
+                append_suffix(cache_path, self.PIN_SUFFIX).unlink(missing_ok=True)
+            finally:
+                lock.release_write_lock()
+        if checksums:
+            self._prune_blob(self.blob_path(checksums))
+        return True
+
+    @staticmethod
+    def _prune_blob(blob_path: Path) -> None:
+        """Removes a blob if none of its files are linked to by entries any more"""
+        if not blob_path.exists():
+            return
+        for dpath, _, fnames in os.walk(blob_path):
+            for fname in fnames:
+                if os.stat(os.path.join(dpath, fname)).st_nlink > 1:
+                    return
+        shutil.rmtree(blob_path, ignore_errors=True)
+
+    @staticmethod
+    def _entry_size(cache_path: Path) -> int:
+        if not cache_path.is_dir():
+            return cache_path.stat().st_size if cache_path.exists() else 0
+        return sum(
+            os.stat(os.path.join(dpath, fname)).st_size
+            for dpath, _, fnames in os.walk(cache_path)
+            for fname in fnames
+        )
+
+
+def _relative_file_paths(path: Path) -> ty.List[str]:
+    """The paths of all the files within a directory relative to it, sorted"""
+    if not path.exists():
+        raise FileNotFoundError(path)
+    return sorted(str(p.relative_to(path)) for p in path.rglob("*") if p.is_file())
+
+
+def is_current_lock_file(
+    lock: ty.Union[InterProcessLock, InterProcessReaderWriterLock], path: Path
+) -> bool:
+    """Whether an acquired inter-process lock is still held on the file at the given
+    path. Lock files that are removed by the process holding them (so that they don't
+    accumulate) may have been replaced by the time a waiting process acquires its lock
+    on the removed file, in which case it needs to acquire the lock again
+
+    Parameters
+    ----------
+    lock : InterProcessLock or InterProcessReaderWriterLock
+        the acquired lock
+    path : Path
+        the path of the lock file
+
+    Returns
+    -------
+    bool
+        whether the lock is held on the file currently at the path
+    """
+    try:
+        current = os.stat(path)
+    except FileNotFoundError:
+        return False
+    locked = os.fstat(lock.lockfile.fileno())
+    return (locked.st_dev, locked.st_ino) == (current.st_dev, current.st_ino)
@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import hashlib
+import mmap
+import os
+import threading
+import time
+import typing as ty
+from collections import OrderedDict
+from pathlib import Path
+
+from fileformats.core import FileSet
+
+from frametree.core.utils import HASH_CHUNK_SIZE
+
+# Digests calculated while files are transferred (or when they are first hashed), keyed
+# by the identity of the file (i.e. device, inode, size and modification time) and the
+# hash algorithm, so that the files don't need to be read again to calculate them. As
+# hard-links and renamed files keep the same inode, digests are also reused for files
+# linked or moved into the cache
+_digests: ty.OrderedDict[ty.Tuple[int, int, int, int, str], str] = OrderedDict()
+_digests_lock = threading.Lock()
+
+# Maximum number of digests that are remembered, least recently used first
+MAX_RECORDED_DIGESTS = 100000
+
+# Files that are read within this many seconds of being modified could be modified
+# again without their modification time changing, as file-system timestamps are updated
+# with a coarse granularity, so their digests aren't recorded (see
+# ``FileSystem.RACY_MTIME_WINDOW``)
+RACY_MTIME_WINDOW = 2.0
+
+
+def record_digest(path: Path, algorithm: str, digest: str) -> None:
+    """Records the digest of a file that has just been written, so that it doesn't
+    need to be read again to calculate its checksum
+
+    Parameters
+    ----------
+    path : Path
+        the path of the file, which shouldn't be modified afterwards
+    algorithm : str
+        the name of the hashlib algorithm the digest was calculated with
+    digest : str
+        the hex digest of the contents of the file
+    """
+    key = _file_key(path, algorithm)
+    with _digests_lock:
+        _digests[key] = digest
+        _digests.move_to_end(key)
+        while len(_digests) > MAX_RECORDED_DIGESTS:
+            _digests.popitem(last=False)
+
+
+def file_digest(path: Path, algorithm: str, use_mmap: bool = False) -> str:
+    """Returns the hex digest of a file, which is only calculated if it wasn't recorded
+    when the file was written
+
+    Parameters
+    ----------
+    path : Path
+        the path of the file to hash
+    algorithm : str
+        the name of the hashlib algorithm to calculate the digest with
+    use_mmap : bool
+        whether to memory-map the file instead of reading it into a buffer
+
+    Returns
+    -------
+    str
+        the hex digest of the contents of the file
+    """
+    key = _file_key(path, algorithm)
+    with _digests_lock:
+        try:
+            digest = _digests[key]
+        except KeyError:
+            pass
+        else:
+            _digests.move_to_end(key)
+            return digest
+    hasher = hashlib.new(algorithm)
+    with open(path, "rb") as f:
+        _stream(f, use_mmap, hasher.update)
+    digest = hasher.hexdigest()
+    _record_read_digest(path, algorithm, digest)
+    return digest
+
+
+def copy_file_hashed(
+    src: Path, dest: Path, algorithm: str, use_mmap: bool = False
+) -> str:
+    """Copies a file while calculating the digest of its contents, so that they are
+    only read once, and records the digest against both the source (unless it has
+    just been modified) and the copy
+
+    Parameters
+    ----------
+    src : Path
+        the file to copy
+    dest : Path
+        the path to copy it to
+    algorithm : str
+        the name of the hashlib algorithm to calculate the digest with
+    use_mmap : bool
+        whether to memory-map the source file instead of reading it into a buffer
+
+    Returns
+    -------
+    str
+        the hex digest of the contents of the file
+    """
+    hasher = hashlib.new(algorithm)
+    with open(src, "rb") as fsrc, open(dest, "wb") as fdest:
+        _stream(fsrc, use_mmap, hasher.update, fdest.write)
+    digest = hasher.hexdigest()
+    _record_read_digest(src, algorithm, digest)
+    record_digest(dest, algorithm, digest)
+    return digest
+
+
+def hash_fileset(
+    fileset: FileSet, algorithm: str = "sha256", use_mmap: bool = False
+) -> ty.Dict[str, str]:
+    """Calculates the checksums of a file-set in the same form as
+    ``FileSet.hash_files()``, reusing the digests recorded when its files were written
+    instead of reading them again where possible
+
+    Parameters
+    ----------
+    fileset : FileSet
+        the file-set to calculate the checksums of
+    algorithm : str
+        the name of the hashlib algorithm to calculate the digests with
+    use_mmap : bool
+        whether to memory-map files that need to be read instead of reading them into
+        a buffer
+
+    Returns
+    -------
+    dict[str, str]
+        the hex digests of the files in the file-set keyed by their relative paths
+    """
+    # The relative paths are yielded in the same order as the file paths, and the files
+    # aren't read unless the byte iterators are consumed
+    rel_paths = [p for p, _ in fileset.byte_chunks()]
+    return {
+        r: file_digest(p, algorithm, use_mmap=use_mmap)
+        for r, p in zip(rel_paths, fileset.all_file_paths())
+    }
+
+
+def _record_read_digest(path: Path, algorithm: str, digest: str) -> None:
+    """Records the digest of a file that has been read (rather than written by this
+    process), unless it was modified too recently for subsequent modifications to be
+    detected from its modification time"""
+    if time.time_ns() - os.stat(path).st_mtime_ns > RACY_MTIME_WINDOW * 1e9:
+        record_digest(path, algorithm, digest)
+
+
+def _file_key(path: Path, algorithm: str) -> ty.Tuple[int, int, int, int, str]:
+    stat = os.stat(path)
+    return (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns, algorithm)
+
+
+def _stream(
+    f: ty.BinaryIO, use_mmap: bool, *consumers: ty.Callable[[memoryview], ty.Any]
+) -> None:
+    """Passes the contents of a file to the consumers in blocks of a fixed size, read
+    either into a single reused buffer or from a memory-map of the file"""
+    size = os.fstat(f.fileno()).st_size
+    if use_mmap and size:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            with memoryview(mapped) as view:
+                for offset in range(0, size, HASH_CHUNK_SIZE):
+                    with view[offset : offset + HASH_CHUNK_SIZE] as block:
+                        for consume in consumers:
+                            consume(block)
+        return
+    buffer = bytearray(HASH_CHUNK_SIZE)
+    with memoryview(buffer) as view:
+        while True:
+            nbytes = f.readinto(buffer)
+            if not nbytes:
+                break
+            with view[:nbytes] as block:
+                for consume in consumers:
+                    consume(block)
@@ -3,10 +3,14 @@ from __future__ import annotations
 import errno
 import json
 import logging
+import os
 import re
+import threading
 import typing as ty
 from abc import abstractmethod
+from contextlib import contextmanager
 from pathlib import Path
+from uuid import uuid4
 
 import attrs
 import yaml
@@ -35,6 +39,10 @@ special_dir_re = re.compile(r"(__.*__$|\..*|~.*)")
 
 DT = ty.TypeVar("DT", bound=DataType)
 
+# Updates to JSON files buffered within `LocalStore.batch_writes` contexts, stored per
+# thread and keyed by the ID of the store (a dictionary of updates for each file)
+_json_batches = threading.local()
+
 
 @attrs.define
 class LocalStore(Store):
@@ -365,38 +373,52 @@ class LocalStore(Store):
             raise FrameTreeUsageError(f"Path to dataset root '{id}'' does not exist")
         return super().define_frameset(id, *args, **kwargs)
 
+    @contextmanager
+    def batch_writes(self) -> ty.Iterator[None]:
+        """Buffers updates to JSON files (i.e. fields and field provenance) made within
+        the context, so that each file is locked and rewritten only once, when the
+        context exits"""
+        batches = _json_batches.__dict__.setdefault("batches", {})
+        if id(self) in batches:  # nested within an existing batch
+            yield
+            return
+        batch = batches[id(self)] = {}
+        try:
+            yield
+        finally:
+            del batches[id(self)]
+            for fpath, updates in batch.items():
+                self._update_json(fpath, updates)
+
     ##################
     # Helper methods #
     ##################
 
     def update_json(self, fpath: Path, key: str, value: ty.Any) -> None:
-        """Updates a JSON file in a multi-process safe way"""
-        # Open fields JSON, locking to prevent other processes
-        # reading or writing
-        with InterProcessLock(append_suffix(fpath, self.LOCK_SUFFIX), logger=logger):
-            try:
-                with open(fpath) as f:
-                    dct = json.load(f)
-            except IOError as e:
-                if e.errno == errno.ENOENT:
-                    dct = {}
-                else:
-                    raise
-            dct[key] = value
-            with open(fpath, "w") as f:
-                json.dump(dct, f, indent=4)
+        """Updates a JSON file in a multi-process safe way. Writers are serialised by
+        an inter-process lock, while the updated file is written to a temporary file
+        that atomically replaces the original, so readers never see a partially
+        written file and don't need to acquire the lock. Within a ``batch_writes``
+        context the update is buffered until the context exits"""
+        batch = self._json_batch()
+        if batch is not None:
+            batch.setdefault(Path(fpath), {})[key] = value
+        else:
+            self._update_json(fpath, {key: value})
 
     def read_from_json(self, fpath: Path, key: str) -> ty.Any:
         """
-        Load fields JSON, locking to prevent read/write conflicts
-        Would be better if only checked if locked to allow
-        concurrent reads but not possible with multi-process
-        locks (in my understanding at least).
+        Load a value from a JSON file. As JSON files are only ever replaced atomically
+        by ``update_json``, there is no need to lock them while they are read
         """
+        batch = self._json_batch()
+        if batch is not None:
+            try:
+                return batch[Path(fpath)][key]
+            except KeyError:
+                pass
         try:
-            with InterProcessLock(
-                append_suffix(fpath, self.LOCK_SUFFIX), logger=logger
-            ), open(fpath, "r") as f:
+            with open(fpath, "r") as f:
                 dct = json.load(f)
             return dct[key]
         except (KeyError, IOError) as e:
@@ -411,6 +433,50 @@ class LocalStore(Store):
                 "{} does not exist in the local store {}".format(key, self)
             )
 
+    def _update_json(self, fpath: Path, updates: ty.Dict[str, ty.Any]) -> None:
+        with InterProcessLock(append_suffix(fpath, self.LOCK_SUFFIX), logger=logger):
+            try:
+                with open(fpath) as f:
+                    dct = json.load(f)
+            except IOError as e:
+                if e.errno == errno.ENOENT:
+                    dct = {}
+                else:
+                    raise
+            dct.update(updates)
+            self.write_json(fpath, dct)
+
+    def _json_batch(self) -> ty.Optional[ty.Dict[Path, ty.Dict[str, ty.Any]]]:
+        """Returns the JSON updates buffered by the current thread's ``batch_writes``
+        context, if one is active"""
+        return getattr(_json_batches, "batches", {}).get(id(self))
+
+    @classmethod
+    def write_json(
+        cls, fpath: Path, dct: ty.Dict[str, ty.Any], indent: ty.Optional[int] = 4
+    ) -> None:
+        """Writes a JSON file atomically, by writing it to a hidden temporary file in
+        the same directory and then replacing the original with it
+
+        Parameters
+        ----------
+        fpath : Path
+            the path to the JSON file to write
+        dct : dict[str, Any]
+            the contents to write to the file
+        indent : int, optional
+            the indentation to format the JSON with, by default 4
+        """
+        fpath = Path(fpath)
+        tmp_path = fpath.parent / f".{fpath.name}.{uuid4().hex}.tmp"
+        try:
+            with open(tmp_path, "x") as f:
+                json.dump(dct, f, indent=indent)
+            os.replace(tmp_path, fpath)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
     def definition_save_path(self, dataset_id: str, name: str) -> Path:
         if not name:
             name = "_"
@@ -1,36 +1,72 @@
 from __future__ import annotations
 
-import errno
+import asyncio
+import hashlib
 import json
 import logging
 import os
-import os.path as op
 import shutil
+import tempfile
+import threading
 import time
 import typing as ty
 from abc import abstractmethod
+from contextlib import contextmanager
+from functools import partial
 from pathlib import Path
+from uuid import uuid4
 
 import attrs
+from fasteners import InterProcessLock
 from fileformats.core import DataType, Field, FieldPrimitive, FileSet, FileSetPrimitive
+from fileformats.core.exceptions import FormatMismatchError
 from fileformats.generic import File
 from pydra.utils.typing import TypeParser, is_fileset_or_union, is_union
 
 from frametree.core.exceptions import DatatypeUnsupportedByStoreError, FrameTreeError
 from frametree.core.utils import (
+    HASH_CHUNK_SIZE,
     JSON_ENCODING,
     append_suffix,
     dict_diff,
-    dir_modtime,
     full_path,
+    to_datatype,
 )
 
 from ..entry import DataEntry
 from ..row import DataRow
 from .base import Store
+from .cache import CacheManager, CacheStats, is_current_lock_file, parse_size
+from .checksums import record_digest
+from .transfer import TransferMode, transfer_fileset
+from .upload import UploadQueue, upload_queue
 
 logger = logging.getLogger("frametree")
 
+# Serialises downloads of the same entry by different threads of the same process, as
+# inter-process locks are held per process and don't exclude other threads
+_download_locks: ty.Dict[str, threading.Lock] = {}
+_download_locks_guard = threading.Lock()
+
+
+def _download_thread_lock(cache_path: Path) -> threading.Lock:
+    with _download_locks_guard:
+        return _download_locks.setdefault(str(cache_path), threading.Lock())
+
+
+def _abandon_download(
+    download: ty.ContextManager[ty.Optional[Path]],
+    thread_lock: threading.Lock,
+    entering: asyncio.Future[ty.Optional[Path]],
+) -> None:
+    """Releases the locks on a download that was cancelled while they were being
+    acquired"""
+    try:
+        if not entering.cancelled() and entering.exception() is None:
+            download.__exit__(None, None, None)
+    finally:
+        thread_lock.release()
+
 
 DT = ty.TypeVar("DT", bound=DataType)
 
@@ -53,9 +89,43 @@ class RemoteStore(Store):
     password : str, optional
         Password to connect to the XNAT repository with, by default None
     race_condition_delay : int
-        The amount of time to wait before checking that the required
-        fileset has been downloaded to cache by another process has
-        completed if they are attempting to download the same fileset
+        The amount of time in seconds without any sign of activity from another process
+        downloading the same file-set before its download is considered to have stalled
+        and is taken over
+    transfer_mode : TransferMode or str
+        how file-sets are transferred into the local cache before they are uploaded
+        (i.e. copy, hardlink, reflink, symlink or move), by default they are copied
+    max_cache_size : int or str, optional
+        the size in bytes (or with a unit suffix, e.g. "20GB") that the cache directory
+        is limited to, by evicting the least recently used entries. By default the
+        size of the cache isn't limited
+    content_addressed_cache : bool
+        whether file-sets with identical checksums are stored only once in the cache,
+        with the cache directory of each URI containing hard-links to a shared copy,
+        so that file-sets that are already in the cache under a different URI don't
+        need to be downloaded again. Requires the store to implement ``list_files``,
+        which is used to link the shared files under the entry's own names. By default
+        False
+    async_uploads : bool
+        whether file-sets are uploaded in the background, so that putting a file-set
+        into the store returns as soon as its copy in the cache has been written to
+        disk. Background uploads are waited for by ``wait_for_uploads`` (e.g. at the
+        end of ``FrameSet.derive`` and of each chunk of rows processed by it), which
+        raises any errors they encountered, and before the process exits. As uploads
+        made by one process can't be waited for by another, ``FrameSet.derive`` only
+        accepts worker processes when the rows are processed in chunks. By default
+        False
+    max_upload_workers : int
+        the maximum number of file-sets uploaded in the background at the same time
+    max_connections : int
+        the maximum number of sessions open to the server at the same time. Threads
+        accessing the store concurrently (e.g. in ``FrameSet.prefetch`` or background
+        uploads) each check out their own session until this number is reached, after
+        which they share them. By default 1
+    connection_idle_timeout : float
+        the number of seconds sessions are kept open for reuse after they are released,
+        checking they are still usable with ``check_connection`` before they are
+        reused. By default 0, i.e. sessions are closed as soon as they are released
     """
 
     server: str = attrs.field()
@@ -64,8 +134,56 @@ class RemoteStore(Store):
     user: str = attrs.field(default=None, metadata={"asdict": False})
     password: str = attrs.field(default=None, metadata={"asdict": False})
     race_condition_delay: int = attrs.field(default=5)
+    transfer_mode: TransferMode = attrs.field(
+        default=TransferMode.copy, converter=TransferMode.cast
+    )
+    max_cache_size: ty.Optional[int] = attrs.field(default=None, converter=parse_size)
+    content_addressed_cache: bool = False
+    async_uploads: bool = False
+    max_upload_workers: int = 4
+    max_connections: int = 1
+    connection_idle_timeout: float = 0.0
+    cache: CacheManager = attrs.field(
+        default=attrs.Factory(
+            lambda self: CacheManager(
+                self.cache_dir, self.max_cache_size, self.CHECKSUM_SUFFIX
+            ),
+            takes_self=True,
+        ),
+        init=False,
+        repr=False,
+        eq=False,
+    )
+    # Results of datatype probes keyed by entry URI, checksums and datatype
+    _probe_results: ty.Dict[ty.Tuple[str, str, type], ty.Optional[str]] = attrs.field(
+        factory=dict, init=False, repr=False, eq=False
+    )
 
     CHECKSUM_SUFFIX = ".md5.json"
+    # Key under which the sizes and modification times of the cached files are saved
+    # in the checksums sidecar in place of checksums, for entries the store doesn't
+    # provide checksums for
+    CACHED_FILES_KEY = "__cached_files__"
+    DOWNLOAD_LOCK_SUFFIX = ".download.lock"
+    # Maximum interval between checks of whether a download lock has been released
+    DOWNLOAD_POLL_INTERVAL = 0.05
+    # Size of the chunks files are downloaded in by stores that implement
+    # `download_chunk`, and therefore the most that is lost if a download is interrupted
+    DOWNLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+    # Name of the file the progress of a chunked download is recorded in, and the
+    # sub-directory the files are downloaded into, within the download directory
+    DOWNLOAD_PROGRESS_FNAME = ".progress.json"
+    CHUNKED_DOWNLOAD_DIR = "chunked"
+    # The hashlib algorithm the checksums returned by `calculate_checksums` are
+    # calculated with, if they are calculated by `checksums.hash_fileset`. If set, the
+    # digests of files are calculated while they are copied into the cache or
+    # downloaded in chunks, so the files don't need to be read again to calculate their
+    # checksums, and chunked downloads are verified against the checksums of the entry
+    CHECKSUM_ALGORITHM = None
+    # Whether files are memory-mapped instead of read into a buffer when they are hashed
+    HASH_WITH_MMAP = False
+    # Number of leading bytes of each file downloaded to check the format of an entry
+    PROBE_BYTES = 64 * 1024
     PROV_SUFFIX = ".__prov__.json"
     FIELD_PROV_RESOURCE = "__provenance__"
     METADATA_RESOURCE = "__frametree__"
@@ -74,6 +192,11 @@ class RemoteStore(Store):
     SITE_LICENSES_USER_ENV = "FRAMETREE_SITE_LICENSE_USER"
     SITE_LICENSES_PASS_ENV = "FRAMETREE_SITE_LICENSE_PASS"
 
+    def __attrs_post_init__(self) -> None:
+        super().__attrs_post_init__()
+        self.connection.max_connections = self.max_connections
+        self.connection.idle_timeout = self.connection_idle_timeout
+
     def __bytes_repr__(self, cache):
         yield from super().__bytes_repr__(cache)
         yield self.server.encode()
@@ -121,9 +244,10 @@ class RemoteStore(Store):
     @abstractmethod
     def download_files(self, entry: DataEntry, download_dir: Path) -> Path:
         """Download files associated with the given entry in the data store, using
-        `download_dir` as temporary storage location (will be monitored by downloads
-        in sibling processes to detect if download activity has stalled), return the
-        path to a directory containing only the downloaded files
+        `download_dir` as temporary storage location, return the path to a directory
+        containing only the downloaded files. Downloads interrupted part way through are
+        restarted from scratch, unless the store implements ``download_chunk``, in which
+        case they are resumed from the last chunk saved instead.
 
         Parameters
         ----------
@@ -131,8 +255,7 @@ class RemoteStore(Store):
             entry in the data store to download the files/directories from
         download_dir : Path
             temporary storage location for the downloaded files and/or compressed
-            archives. Monitored by sibling processes to detect if download activity
-            has stalled.
+            archives
 
         Returns
         -------
@@ -250,6 +373,138 @@ class RemoteStore(Store):
             uri of the data item to download the checksums for
         """
 
+    def get_checksums_many(
+        self, uris: ty.Sequence[str]
+    ) -> ty.Dict[str, ty.Optional[ty.Dict[str, str]]]:
+        """
+        Downloads the checksum digests of multiple file-sets at once (e.g. in a single
+        API request). Used to fill in the checksums of the entries that weren't
+        provided by ``populate_row`` when rows are populated in bulk. Can be left as
+        NotImplementedError if the store can't download checksums in batches, in which
+        case they are downloaded individually by ``get_checksums`` when needed.
+
+        Parameters
+        ----------
+        uris: Sequence[str]
+            uris of the data items to download the checksums for
+
+        Returns
+        -------
+        checksums : dict[str, dict[str, str] or None]
+            the checksums of each data item keyed by its uri
+        """
+        raise NotImplementedError
+
+    def download_headers(self, entry: DataEntry, probe_dir: Path, nbytes: int) -> bool:
+        """Downloads the leading bytes of each file associated with the entry into
+        `probe_dir`, laid out in the same way as the files returned by
+        ``download_files``, so that the format of the entry can be checked without
+        downloading it in full. Can be left as NotImplementedError if the store can't
+        download partial files, in which case the entry is downloaded in full.
+
+        Parameters
+        ----------
+        entry : DataEntry
+            entry in the data store to download the file headers from
+        probe_dir : Path
+            an empty directory to download the file headers into
+        nbytes : int
+            the maximum number of bytes to download from each file
+
+        Returns
+        -------
+        truncated : bool
+            whether any of the files were larger than `nbytes` (and therefore
+            truncated)
+        """
+        raise NotImplementedError
+
+    def list_files(self, entry: DataEntry) -> ty.Dict[str, int]:
+        """Lists the files associated with the entry along with their sizes, so that
+        they can be downloaded in chunks with ``download_chunk``. As only files are
+        listed, empty directories within directory file-sets aren't recreated when they
+        are downloaded in chunks. Can be left as NotImplementedError if the store can't
+        download partial files, in which case entries are downloaded in full by
+        ``download_files`` (and identical file-sets in the cache aren't linked, see
+        ``content_addressed_cache``).
+
+        Parameters
+        ----------
+        entry : DataEntry
+            entry in the data store to list the files of
+
+        Returns
+        -------
+        sizes : dict[str, int]
+            the sizes of the files in bytes, keyed by their paths relative to the
+            directory returned by ``download_files`` (i.e. with any sub-directories of
+            directory file-sets included in the path)
+        """
+        raise NotImplementedError
+
+    def download_chunk(
+        self, entry: DataEntry, path: str, offset: int, nbytes: int
+    ) -> bytes:
+        """Downloads a range of bytes from one of the files associated with the entry,
+        so that interrupted downloads can be resumed from the last chunk that was
+        saved. Can be left as NotImplementedError if the store can't download partial
+        files (see ``list_files``).
+
+        Parameters
+        ----------
+        entry : DataEntry
+            entry in the data store to download the chunk from
+        path : str
+            the path of the file relative to the entry, as returned by ``list_files``
+        offset : int
+            the position in the file the chunk starts at
+        nbytes : int
+            the maximum number of bytes to download
+
+        Returns
+        -------
+        chunk : bytes
+            the downloaded bytes, which are only shorter than `nbytes` if the end of
+            the file is reached
+        """
+        raise NotImplementedError
+
+    async def adownload_files(self, entry: DataEntry, download_dir: Path) -> Path:
+        """Asynchronous version of ``download_files``, for stores with asyncio clients,
+        so that many entries can be downloaded concurrently by ``aget`` without
+        tying up a thread each. Can be left as NotImplementedError, in which case
+        entries are downloaded by ``download_files`` (or ``download_chunk``) in a
+        worker thread.
+
+        Parameters
+        ----------
+        entry : DataEntry
+            entry in the data store to download the files/directories from
+        download_dir : Path
+            temporary storage location for the downloaded files and/or compressed
+            archives
+
+        Returns
+        -------
+        output_dir : Path
+            a directory containing the downloaded files/directories and nothing else
+        """
+        raise NotImplementedError
+
+    async def aupload_files(self, input_dir: Path, entry: DataEntry) -> None:
+        """Asynchronous version of ``upload_files``, for stores with asyncio clients,
+        used by ``aput``. Can be left as NotImplementedError, in which case entries are
+        uploaded by ``upload_files`` in a worker thread.
+
+        Parameters
+        ----------
+        input_dir : Path
+            directory containing the files/directories to be uploaded
+        entry : DataEntry
+            the entry in the data store to upload the files to
+        """
+        raise NotImplementedError
+
     def put_checksums(self, uri: str, fileset: FileSet) -> ty.Dict[str, str]:
         """
         Uploads the checksum digests associated with the files in the file-set to
@@ -292,6 +547,34 @@ class RemoteStore(Store):
     # Abstractmethod implementations
     ################################
 
+    def populate_rows(self, rows: ty.Sequence[DataRow]) -> None:
+        """Populates the rows with the entries found in the store, then downloads the
+        checksums of any file-set entries that weren't provided by ``populate_row`` in
+        a single batch (see ``get_checksums_many``)
+
+        Parameters
+        ----------
+        rows : Sequence[DataRow]
+            The rows to populate with entries
+        """
+        super().populate_rows(rows)
+        missing = {
+            str(e.uri): e
+            for row in rows
+            for e in row.entries_dict.values()
+            if not e.checksums and is_fileset_or_union(e.datatype)
+        }
+        if not missing:
+            return
+        try:
+            with self.connection:
+                checksums = self.get_checksums_many(list(missing))
+        except NotImplementedError:
+            return
+        for uri, entry_checksums in checksums.items():
+            if entry_checksums:
+                missing[uri].checksums = entry_checksums
+
     def get(
         self, entry: DataEntry, datatype: ty.Type[DT]
     ) -> FileSetPrimitive | FieldPrimitive:
@@ -316,6 +599,111 @@ class RemoteStore(Store):
                 raise DatatypeUnsupportedByStoreError(entry.datatype, self)
         return item
 
+    async def aget(
+        self, entry: DataEntry, datatype: ty.Type[DT]
+    ) -> FileSetPrimitive | FieldPrimitive:
+        if not is_fileset_or_union(entry.datatype):
+            return await super().aget(entry, datatype)
+        cache_path = self.cache_path(entry.uri)
+        if not await self._run_in_thread(self._lookup_cache, entry, cache_path):
+            await self._adownload(entry, cache_path)
+        return list(cache_path.iterdir())
+
+    async def aput(self, item: DT, entry: DataEntry) -> DT:
+        # Background uploads are already made without blocking the caller
+        if not is_fileset_or_union(entry.datatype) or self.async_uploads:
+            return await super().aput(item, entry)
+        if not isinstance(item, entry.datatype):
+            item = entry.datatype(item)
+        cache_path = self.cache_path(entry.uri)
+        cached = await asyncio.to_thread(self._cache_fileset, item, entry, cache_path)
+        try:
+            await self.aupload_files(cache_path, entry)
+        except NotImplementedError:
+            await self._run_in_thread(self.upload_files, cache_path, entry)
+        await self._run_in_thread(self._complete_upload, cached, cache_path, entry)
+        return cached
+
+    @contextmanager
+    def pin_cached(self) -> ty.Iterator[None]:
+        with self.cache.pinned():
+            yield
+
+    def is_local(self, entry: DataEntry) -> bool:
+        """File-sets are local if an up-to-date copy is in the cache, while fields are
+        always retrieved from the server"""
+        return is_fileset_or_union(entry.datatype) and self._is_cached(entry)
+
+    def probe_datatype(self, entry: DataEntry, datatype: ty.Type[DataType]) -> None:
+        """Checks whether the file-set stored in the entry matches the datatype from
+        the headers of its files, so that entries that don't match aren't downloaded.
+        Results are memoised by the URI and checksums of the entry.
+
+        Parameters
+        ----------
+        entry : DataEntry
+            the entry to check the format of
+        datatype : type
+            the datatype to check the item against
+
+        Raises
+        ------
+        FormatMismatchError
+            if the item doesn't match the datatype
+        """
+        if not is_fileset_or_union(entry.datatype):
+            super().probe_datatype(entry, datatype)
+            return
+        key = (entry.uri, json.dumps(entry.checksums, sort_keys=True), datatype)
+        try:
+            mismatch = self._probe_results[key]
+        except KeyError:
+            mismatch = self._probe_results[key] = self._probe_fileset(entry, datatype)
+        if mismatch is not None:
+            raise FormatMismatchError(mismatch)
+
+    def item_cache_key(
+        self, entry: DataEntry
+    ) -> ty.Optional[ty.Tuple[ty.Hashable, ty.Optional[ty.Hashable]]]:
+        """File-sets are cached by their URI and checksums while they are held in the
+        local cache. Fields aren't cached, as there is no way to check whether they
+        have changed without downloading them again.
+
+        Parameters
+        ----------
+        entry : DataEntry
+            the entry to return the cache key for
+
+        Returns
+        -------
+        cache_key : tuple[Hashable, Hashable or None] or None
+            the location of the entry and its change token
+        """
+        if entry.uri is None or not is_fileset_or_union(entry.datatype):
+            return None
+        location = (self.server, str(entry.uri))
+        # Pin the entry before checking it, so it can't be evicted before the item is
+        # returned from the item cache
+        self.cache.retain(self.cache_path(entry.uri))
+        if not self._is_cached(entry):
+            return location, None
+        # Include the modification time of the cache directory in case it has been
+        # cleared and redownloaded since
+        try:
+            mtime = os.stat(self.cache_path(entry.uri)).st_mtime_ns
+        except OSError:
+            return location, None
+        return location, (json.dumps(entry.checksums, sort_keys=True), mtime)
+
+    def item_checksums(self, entry: DataEntry) -> ty.Dict[str, ty.Any]:
+        """The checksums of file-sets are provided by the store so they don't need to
+        be downloaded"""
+        if is_fileset_or_union(entry.datatype):
+            checksums = self._entry_checksums(entry)
+            if checksums:
+                return checksums
+        return super().item_checksums(entry)
+
     def create_entry(
         self,
         path: str,
@@ -368,10 +756,9 @@ class RemoteStore(Store):
                 self.SITE_LICENSES_PASS_ENV,
             )
             return None
-        kwargs = attrs.asdict(self, recurse=False)
+        kwargs = attrs.asdict(self, recurse=False, filter=lambda a, _: a.init)
         kwargs["user"] = user
         kwargs["password"] = password
-        del kwargs["connection"]
         store = type(self)(**kwargs)
         try:
             return store.load_frameset(self.SITE_LICENSES_DATASET)
@@ -417,55 +804,10 @@ class RemoteStore(Store):
         FileSet
             the cached file-set
         """
-        logger.info(
-            "Getting %s from %s:%s row via API access",
-            entry.path,
-            entry.row.frequency,
-            entry.row.id,
-        )
         cache_path = self.cache_path(entry.uri)
-        need_to_download = True
-        if cache_path.exists():
-            md5_path = append_suffix(cache_path, self.CHECKSUM_SUFFIX)
-            if md5_path.exists():
-                with open(md5_path, "r") as f:
-                    cached_checksums = json.load(f)
-            if cached_checksums == entry.checksums:
-                need_to_download = False
-        if need_to_download:
+        if not self._lookup_cache(entry, cache_path):
             with self.connection:
-                download_dir = append_suffix(cache_path, ".download")
-                try:
-                    os.makedirs(download_dir)
-                except OSError as e:
-                    if e.errno == errno.EEXIST:
-                        # Attempt to make tmp download directory. This will
-                        # fail if another process (or previous attempt) has
-                        # already created it. In that case this process will
-                        # wait 'race_cond_delay' seconds to see if it has been
-                        # updated (i.e. is being downloaded by the other process)
-                        # and otherwise assume that it was interrupted and redownload.
-                        self._delayed_download(
-                            entry,
-                            download_dir,
-                            cache_path,
-                            delay=self.race_condition_delay,
-                        )
-                    else:
-                        raise
-                else:
-                    data_path = self.download_files(entry, download_dir)
-                    if cache_path.exists():
-                        shutil.rmtree(cache_path)
-                    shutil.move(data_path, cache_path)
-                    shutil.rmtree(download_dir)
-                # Save checksums for future reference, so we can check to see if cache
-                # is stale
-                checksums = self.get_checksums(entry.uri)
-                with open(
-                    str(cache_path) + self.CHECKSUM_SUFFIX, "w", **JSON_ENCODING
-                ) as f:
-                    json.dump(checksums, f, indent=2)
+                self._download(entry, cache_path)
         return list(cache_path.iterdir())
 
     def put_fileset(self, fileset: FileSet, entry: DataEntry) -> FileSet:
@@ -485,17 +827,47 @@ class RemoteStore(Store):
             The locations of the locally cached paths
         """
 
-        # Create cache path
         cache_path = self.cache_path(entry.uri)
-        if cache_path.exists():
-            shutil.rmtree(cache_path)
-        # Copy to cache
-        if isinstance(fileset, File):
-            new_stem = entry.path.split("/")[-1].split("@")[0]
+        cached = self._cache_fileset(fileset, entry, cache_path)
+        if self.async_uploads:
+            self._fsync_tree(cache_path)
+            # The checksums that will be saved by the upload are calculated up front,
+            # so that those of the new item (rather than any it replaces) are returned
+            # by ``item_checksums`` while it is being uploaded
+            entry.checksums = self.calculate_checksums(cached)
+            release = self.cache.pin(cache_path)
+
+            def upload() -> None:
+                try:
+                    with self.connection:
+                        self._upload_fileset(cached, cache_path, entry)
+                finally:
+                    release()
+
+            self.uploads.submit(str(entry.uri), upload)
+            logger.info(
+                "Queued %s in %s:%s row for upload",
+                entry.path,
+                entry.row.frequency,
+                entry.row.id,
+            )
         else:
-            new_stem = None
-        cached = fileset.copy(cache_path, make_dirs=True, new_stem=new_stem, trim=False)
+            self._upload_fileset(cached, cache_path, entry)
+        return cached
+
+    def _upload_fileset(
+        self, cached: FileSet, cache_path: Path, entry: DataEntry
+    ) -> None:
+        """Uploads a file-set that has been copied into the cache and checks or saves
+        its checksums"""
         self.upload_files(cache_path, entry)
+        self._complete_upload(cached, cache_path, entry)
+
+    def _complete_upload(
+        self, cached: FileSet, cache_path: Path, entry: DataEntry
+    ) -> None:
+        """Checks or saves the checksums of a file-set that has just been uploaded from
+        the cache, and records the cached copy as up-to-date"""
         try:
             checksums = self.put_checksums(entry.uri, cached)
         except NotImplementedError:
@@ -522,17 +894,18 @@ class RemoteStore(Store):
                     )
         # Save checksums, to avoid having to redownload if they haven't been altered
         # on XNAT
-        with open(
-            append_suffix(cache_path, self.CHECKSUM_SUFFIX), "w", **JSON_ENCODING
-        ) as f:
-            json.dump(checksums, f, indent=2)
+        self._save_checksums(cache_path, checksums)
+        if checksums:
+            entry.checksums = checksums
+        if self.content_addressed_cache and checksums:
+            self.cache.add_blob(cache_path, checksums)
+        self.cache.added(cache_path)
         logger.info(
             "Put %s into %s:%s row via API access",
             entry.path,
             entry.row.frequency,
             entry.row.id,
         )
-        return cached
 
     def get_field(self, entry: DataEntry, datatype: type) -> FieldPrimitive:
         """
@@ -568,51 +941,576 @@ class RemoteStore(Store):
 
     def clear_cache(self):
         "Clears the cache directory"
-        shutil.rmtree(self.cache_dir)
-        self.cache_dir.mkdir()
+        self.cache.clear()
+
+    def wait_for_uploads(self) -> None:
+        """Waits for the file-sets that are being uploaded in the background (see
+        ``async_uploads``) to finish uploading
+
+        Raises
+        ------
+        FrameTreeError
+            if any of the uploads failed
+        """
+        if self.async_uploads:
+            self.uploads.drain()
+
+    @property
+    def uploads(self) -> UploadQueue:
+        "The queue of file-sets being uploaded in the background by this process"
+        return upload_queue(str(self.cache_dir), self.max_upload_workers)
+
+    def cache_stats(self) -> CacheStats:
+        """Returns the occupancy and hit-rate of the cache directory
+
+        Returns
+        -------
+        CacheStats
+            the statistics of the cache
+        """
+        return self.cache.stats()
 
     ##################
     # Helper methods #
     ##################
 
-    def _delayed_download(
-        self, entry: DataEntry, download_dir: Path, target_path: Path, delay: int
-    ):
+    def _lookup_cache(self, entry: DataEntry, cache_path: Path) -> bool:
+        """Whether an up-to-date copy of the entry is in the cache (or can be linked
+        from an identical one), recording the cache hit or miss"""
         logger.info(
-            "Waiting %s seconds for incomplete download of %s "
-            "initiated another process to finish",
-            delay,
-            entry,
+            "Getting %s from %s:%s row via API access",
+            entry.path,
+            entry.row.frequency,
+            entry.row.id,
         )
-        initial_mod_time = dir_modtime(download_dir)
-        time.sleep(delay)
-        if op.exists(target_path):
-            logger.info(
-                "The download of %s has completed "
-                "successfully in the other process, continuing",
-                entry,
+        if self.async_uploads:
+            # The cached copy isn't marked as up-to-date until it has been uploaded
+            self.uploads.wait_for(str(entry.uri))
+        self.cache.retain(cache_path)
+        if self._is_cached(entry) or self._link_identical(entry, cache_path):
+            self.cache.hit(cache_path)
+            return True
+        self.cache.miss()
+        return False
+
+    def _cache_fileset(
+        self, fileset: FileSet, entry: DataEntry, cache_path: Path
+    ) -> FileSet:
+        """Copies (or links) a file-set that is to be uploaded into the cache"""
+        if self.async_uploads:
+            # Wait for any pending upload of a previous item put into the entry
+            self.uploads.wait_for(str(entry.uri))
+        if cache_path.exists():
+            shutil.rmtree(cache_path)
+        if isinstance(fileset, File):
+            new_stem = entry.path.split("/")[-1].split("@")[0]
+        else:
+            new_stem = None
+        return transfer_fileset(
+            fileset,
+            cache_path,
+            mode=self.transfer_mode,
+            new_stem=new_stem,
+            trim=False,
+            hash_algorithm=self.CHECKSUM_ALGORITHM,
+            use_mmap=self.HASH_WITH_MMAP,
+        )
+
+    def _is_cached(self, entry: DataEntry) -> bool:
+        """Whether an up-to-date copy of the entry is in the cache"""
+        cache_path = self.cache_path(entry.uri)
+        if not cache_path.exists():
+            return False
+        md5_path = append_suffix(cache_path, self.CHECKSUM_SUFFIX)
+        try:
+            with open(md5_path, "r") as f:
+                cached_checksums = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return False
+        if not isinstance(cached_checksums, dict) or not cached_checksums:
+            return False
+        checksums = self._entry_checksums(entry)
+        if checksums is None and self.CACHED_FILES_KEY in cached_checksums:
+            # Without checksums the cached copy can't be compared with the remote, so
+            # it is only checked that it hasn't been altered since it was cached
+            return cached_checksums[self.CACHED_FILES_KEY] == self._cached_files(
+                cache_path
             )
+        return cached_checksums == checksums
+
+    def _entry_checksums(self, entry: DataEntry) -> ty.Optional[ty.Dict[str, ty.Any]]:
+        """The checksums of the entry, as provided by ``populate_row`` (or
+        ``get_checksums_many``), which are only downloaded (and then stored in the
+        entry for reuse) if they weren't"""
+        if not entry.checksums:
+            with self.connection:
+                checksums = self.get_checksums(entry.uri)
+            if not checksums:
+                return None
+            entry.checksums = checksums
+        return entry.checksums
+
+    def _link_identical(self, entry: DataEntry, cache_path: Path) -> bool:
+        """Links the cache directory of the entry to the cached copy of an identical
+        file-set (i.e. one with the same checksums), if there is one, instead of
+        downloading it again. Only the names of the entry's files are listed"""
+        if not self.content_addressed_cache:
+            return False
+        checksums = self._entry_checksums(entry)
+        if not checksums:
+            return False
+        # The files of the blob are linked under the names of the entry's own files,
+        # which can't be determined if the store can't list them
+        try:
+            with self.connection:
+                names = list(self.list_files(entry))
+        except NotImplementedError:
+            return False
+        if not self.cache.link_blob(cache_path, checksums, names):
+            return False
+        logger.info(
+            "Linked %s to identical file-set already in the cache instead of "
+            "downloading it",
+            entry,
+        )
+        self._save_checksums(cache_path, checksums)
+        self.cache.added(cache_path)
+        return True
+
+    def _probe_fileset(
+        self, entry: DataEntry, datatype: ty.Type[DataType]
+    ) -> ty.Optional[str]:
+        """Checks the format of the file-set stored in the entry, downloading only the
+        headers of its files unless they are already cached or are required to
+        confirm a mismatch
+
+        Returns
+        -------
+        mismatch : str or None
+            the message describing why the entry doesn't match the datatype, or None
+            if it does
+        """
+        if not self._is_cached(entry):
+            with tempfile.TemporaryDirectory() as probe_dir:
+                try:
+                    with self.connection:
+                        truncated = self.download_headers(
+                            entry, Path(probe_dir), self.PROBE_BYTES
+                        )
+                except NotImplementedError:
+                    pass
+                else:
+                    try:
+                        to_datatype(list(Path(probe_dir).iterdir()), datatype)
+                    except FormatMismatchError as e:
+                        # If the files were truncated, the mismatch could be due to
+                        # the missing bytes, so the full files need to be checked
+                        if not truncated:
+                            return str(e)
+                    else:
+                        return None
+        try:
+            entry.get_item(datatype)
+        except FormatMismatchError as e:
+            return str(e)
+        return None
+
+    def _download(self, entry: DataEntry, cache_path: Path) -> None:
+        """Downloads the entry into the cache. Downloads of the same entry by other
+        processes (or threads) are coordinated via a lock, which waiters acquire as
+        soon as the download finishes, in which case they use the downloaded copy. While
+        the download is in progress, the lock file is touched periodically to show that
+        the download is still alive, so that if the lock isn't released and the
+        heartbeat stops (e.g. the process is hung or the lock is held on a network
+        file-system by a host that has gone down), the download can be taken over.
+        """
+        # Compare the inode of the checksums sidecar (which is replaced atomically once
+        # a download has completed) to detect whether another process (or thread) has
+        # completed the download while this one was waiting for the lock
+        before = self._sidecar_inode(cache_path)
+        with _download_thread_lock(cache_path):
+            self._locked_download(entry, cache_path, before)
+
+    def _locked_download(
+        self, entry: DataEntry, cache_path: Path, before: ty.Optional[int]
+    ) -> None:
+        """Downloads the entry once the lock for the threads of this process is held"""
+        with self._download_lock(entry, cache_path, before) as download_dir:
+            if download_dir is not None:
+                data_path = self._fetch(entry, download_dir)
+                self._complete_download(entry, cache_path, download_dir, data_path)
+
+    async def _adownload(self, entry: DataEntry, cache_path: Path) -> None:
+        """Asynchronous version of ``_download``, which downloads the entry with
+        ``adownload_files`` if the store implements it"""
+        before = self._sidecar_inode(cache_path)
+        # Poll the lock instead of waiting for it in a worker thread, so that tasks
+        # waiting for the same entry don't exhaust the threads available to the task
+        # that is downloading it
+        thread_lock = _download_thread_lock(cache_path)
+        while not thread_lock.acquire(blocking=False):
+            await asyncio.sleep(self.DOWNLOAD_POLL_INTERVAL)
+        if type(self).adownload_files is RemoteStore.adownload_files:
+            # The whole download is made in a single worker thread, which releases the
+            # locks when it finishes even if this coroutine is cancelled in the meantime
+            def download() -> None:
+                try:
+                    with self.connection:
+                        self._locked_download(entry, cache_path, before)
+                finally:
+                    thread_lock.release()
+
+            try:
+                future = asyncio.get_running_loop().run_in_executor(None, download)
+            except BaseException:
+                thread_lock.release()
+                raise
+            await future
             return
-        elif initial_mod_time != dir_modtime(download_dir):
+        release = True
+        try:
+            download = self._download_lock(entry, cache_path, before)
+            entering = asyncio.ensure_future(asyncio.to_thread(download.__enter__))
+            try:
+                download_dir = await asyncio.shield(entering)
+            except asyncio.CancelledError:
+                # The lock is still being acquired by the worker thread, so it is
+                # released (along with the lock for the threads of this process) once
+                # it has been
+                entering.add_done_callback(
+                    partial(_abandon_download, download, thread_lock)
+                )
+                release = False
+                raise
+            try:
+                if download_dir is not None:
+                    try:
+                        data_path = await self.adownload_files(entry, download_dir)
+                    except NotImplementedError:
+                        data_path = await self._run_in_thread(
+                            self._fetch, entry, download_dir
+                        )
+                    await self._run_in_thread(
+                        self._complete_download,
+                        entry,
+                        cache_path,
+                        download_dir,
+                        data_path,
+                    )
+            except BaseException as e:
+                if not download.__exit__(type(e), e, e.__traceback__):
+                    raise
+            else:
+                download.__exit__(None, None, None)
+        finally:
+            if release:
+                thread_lock.release()
+
+    @contextmanager
+    def _download_lock(
+        self, entry: DataEntry, cache_path: Path, before: ty.Optional[int]
+    ) -> ty.Iterator[ty.Optional[Path]]:
+        """Acquires the inter-process lock on the download of the entry (or takes over
+        a stalled download) and prepares the download directory, which is yielded, or
+        None if the download was completed by another process in the meantime. The
+        lock for the threads of this process must already be held."""
+        lock_path = append_suffix(cache_path, self.DOWNLOAD_LOCK_SUFFIX)
+        download_dir = append_suffix(cache_path, ".download")
+        while True:
+            lock = InterProcessLock(lock_path, logger=logger)
+            acquired = lock.acquire(blocking=False)
+            if not acquired:
+                logger.info(
+                    "Waiting for the download of %s by another process to finish",
+                    entry,
+                )
+                acquired = self._wait_for_download(entry, lock)
+            # The lock file is removed by the process holding it once its download
+            # has finished, in which case the lock is acquired again
+            if not acquired or is_current_lock_file(lock, lock_path):
+                break
+            lock.release()
+        try:
+            if (
+                self._sidecar_inode(cache_path) != before
+                and cache_path.exists()
+                and not download_dir.exists()
+            ):
+                logger.info(
+                    "The download of %s has been completed by another process",
+                    entry,
+                )
+                yield None
+                return
+            with self._heartbeat(lock_path):
+                if (
+                    download_dir.exists()
+                    and not (download_dir / self.DOWNLOAD_PROGRESS_FNAME).exists()
+                ):
+                    # Left behind by an interrupted download
+                    shutil.rmtree(download_dir)
+                download_dir.mkdir(parents=True, exist_ok=True)
+                yield download_dir
+        finally:
+            if acquired:
+                # Removed while the lock is held so that lock files don't accumulate
+                lock_path.unlink(missing_ok=True)
+                lock.release()
+
+    def _fetch(self, entry: DataEntry, download_dir: Path) -> Path:
+        """Downloads the files of the entry into the download directory, in chunks if
+        the store supports it"""
+        try:
+            return self._download_chunked(entry, download_dir)
+        except NotImplementedError:
+            return self.download_files(entry, download_dir)
+
+    def _complete_download(
+        self, entry: DataEntry, cache_path: Path, download_dir: Path, data_path: Path
+    ) -> None:
+        """Moves the downloaded files into the cache and saves their checksums"""
+        if cache_path.exists():
+            shutil.rmtree(cache_path)
+        shutil.move(data_path, cache_path)
+        shutil.rmtree(download_dir)
+        # Save checksums for future reference, so we can check to see if
+        # cache is stale
+        checksums = self._entry_checksums(entry)
+        self._save_checksums(cache_path, checksums)
+        if self.content_addressed_cache and checksums:
+            self.cache.add_blob(cache_path, checksums)
+        self.cache.added(cache_path)
+
+    def _download_chunked(self, entry: DataEntry, download_dir: Path) -> Path:
+        """Downloads the files of the entry in chunks, recording the progress of each
+        file in the download directory after each chunk is saved, so that if the
+        download is interrupted it can be resumed from the last chunk. The last chunk
+        saved of each file is verified against its recorded digest before it is
+        resumed, and downloads are restarted from scratch if the checksums of the entry
+        have changed since they were started.
+
+        Raises
+        ------
+        NotImplementedError
+            if the store doesn't support chunked downloads
+        """
+        sizes = self.list_files(entry)
+        data_path = download_dir / self.CHUNKED_DOWNLOAD_DIR
+        progress_path = download_dir / self.DOWNLOAD_PROGRESS_FNAME
+        checksums = self._entry_checksums(entry)
+        try:
+            with open(progress_path, **JSON_ENCODING) as f:
+                progress = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            progress = {}
+        if "files" not in progress or progress.get("checksums") != checksums:
+            if progress:
+                logger.info(
+                    "%s has changed since it was partially downloaded, restarting the "
+                    "download",
+                    entry,
+                )
+            progress = {"checksums": checksums, "files": {}}
+            if data_path.exists():
+                shutil.rmtree(data_path)
+        files_progress = progress["files"]
+        for path, size in sorted(sizes.items()):
+            fspath = data_path / path
+            fspath.parent.mkdir(parents=True, exist_ok=True)
+            completed = self._verified_progress(fspath, size, files_progress.get(path))
+            if completed:
+                logger.info(
+                    "Resuming the download of '%s' in %s from byte %s of %s",
+                    path,
+                    entry,
+                    completed,
+                    size,
+                )
+            if self.CHECKSUM_ALGORITHM:
+                hasher = hashlib.new(self.CHECKSUM_ALGORITHM)
+            else:
+                hasher = None
+            with open(fspath, "r+b" if completed else "wb") as f:
+                f.truncate(completed)
+                if hasher is not None:
+                    # Hash the part of the file downloaded by the previous attempt
+                    while f.tell() < completed:
+                        nbytes = min(HASH_CHUNK_SIZE, completed - f.tell())
+                        hasher.update(f.read(nbytes))
+                f.seek(completed)
+                while completed < size:
+                    chunk = self.download_chunk(
+                        entry,
+                        path,
+                        completed,
+                        min(self.DOWNLOAD_CHUNK_SIZE, size - completed),
+                    )
+                    if not chunk:
+                        raise FrameTreeError(
+                            f"Download of '{path}' in {entry} ended after {completed} "
+                            f"of {size} bytes"
+                        )
+                    f.write(chunk)
+                    f.flush()
+                    os.fsync(f.fileno())
+                    if hasher is not None:
+                        hasher.update(chunk)
+                    files_progress[path] = {
+                        "size": size,
+                        "completed": completed + len(chunk),
+                        "chunk_offset": completed,
+                        "chunk_digest": hashlib.sha256(chunk).hexdigest(),
+                    }
+                    completed += len(chunk)
+                    self._save_json_atomic(progress_path, progress)
+            if hasher is not None:
+                record_digest(fspath, self.CHECKSUM_ALGORITHM, hasher.hexdigest())
+        if self.CHECKSUM_ALGORITHM and checksums and sizes:
+            # Calculated from the digests recorded while the files were downloaded
+            downloaded = self.calculate_checksums(FileSet(data_path.iterdir()))
+            if downloaded != checksums:
+                shutil.rmtree(data_path)
+                progress_path.unlink()
+                raise FrameTreeError(
+                    f"Checksums of the files downloaded from {entry} don't match "
+                    "those of the entry:\n\n"
+                    + dict_diff(
+                        downloaded, checksums, label1="downloaded", label2="remote"
+                    )
+                )
+        return data_path
+
+    @staticmethod
+    def _verified_progress(
+        fspath: Path, size: int, recorded: ty.Optional[ty.Dict[str, ty.Any]]
+    ) -> int:
+        """Returns the number of bytes of a partially downloaded file that can be
+        resumed from, i.e. up to the end of the last chunk recorded in the progress if
+        it can be read back from the file and matches its digest, otherwise 0"""
+        if not recorded or recorded["size"] != size:
+            return 0
+        completed = recorded["completed"]
+        offset = recorded["chunk_offset"]
+        try:
+            with open(fspath, "rb") as f:
+                f.seek(offset)
+                chunk = f.read(completed - offset)
+        except FileNotFoundError:
+            return 0
+        if (
+            len(chunk) != completed - offset
+            or hashlib.sha256(chunk).hexdigest() != recorded["chunk_digest"]
+        ):
+            return 0
+        return completed
+
+    def _wait_for_download(self, entry: DataEntry, lock: InterProcessLock) -> bool:
+        """Waits for the download lock held by another process to be released
+
+        Returns
+        -------
+        acquired : bool
+            whether the lock was acquired, or False if the download was considered
+            stalled and is being taken over without the lock
+        """
+        while True:
+            if lock.acquire(
+                max_delay=self.DOWNLOAD_POLL_INTERVAL,
+                timeout=self.race_condition_delay,
+            ):
+                return True
+            try:
+                heartbeat = os.stat(lock.path).st_mtime
+            except FileNotFoundError:
+                continue
+            if time.time() - heartbeat > self.race_condition_delay:
+                logger.warning(
+                    "The download of %s hasn't been updated in %s seconds, assuming "
+                    "that it has stalled and taking it over",
+                    entry,
+                    self.race_condition_delay,
+                )
+                return False
             logger.info(
-                "The download of %s hasn't completed yet, but it has"
-                " been updated.  Waiting another %s seconds before "
-                "checking again.",
-                entry,
-                delay,
-            )
-            self._delayed_download(entry, download_dir, target_path, delay)
-        else:
-            logger.warning(
-                "The download of %s hasn't updated in %s "
-                "seconds, assuming that it was interrupted and "
-                "restarting download",
+                "The download of %s hasn't completed yet but is still active, "
+                "waiting another %s seconds",
                 entry,
-                delay,
+                self.race_condition_delay,
             )
-            shutil.rmtree(download_dir)
-            os.mkdir(download_dir)
-            self.download_files(entry, download_dir)
+
+    @contextmanager
+    def _heartbeat(self, path: Path) -> ty.Iterator[None]:
+        """Periodically touches the given path within the context to show that the
+        process holding it is still active"""
+        stop = threading.Event()
+
+        def beat() -> None:
+            while not stop.wait(self.race_condition_delay / 4):
+                try:
+                    os.utime(path)
+                except OSError:
+                    pass
+
+        thread = threading.Thread(target=beat, daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def _save_checksums(
+        self, cache_path: Path, checksums: ty.Optional[ty.Dict[str, ty.Any]]
+    ) -> None:
+        """Saves the checksums of a cached file-set in a sidecar file, replacing any
+        existing one atomically. If the store doesn't provide checksums for the entry,
+        the sizes and modification times of the cached files are saved instead"""
+        if not checksums:
+            checksums = {self.CACHED_FILES_KEY: self._cached_files(cache_path)}
+        self._save_json_atomic(
+            append_suffix(cache_path, self.CHECKSUM_SUFFIX), checksums
+        )
+
+    @staticmethod
+    def _cached_files(cache_path: Path) -> ty.Dict[str, ty.List[int]]:
+        """The sizes and modification times of the files in a cache directory, keyed
+        by their paths relative to it"""
+        cached_files = {}
+        for fspath in sorted(cache_path.rglob("*")):
+            if fspath.is_dir():
+                continue
+            stat = fspath.stat()
+            cached_files[fspath.relative_to(cache_path).as_posix()] = [
+                stat.st_size,
+                stat.st_mtime_ns,
+            ]
+        return cached_files
+
+    @staticmethod
+    def _fsync_tree(path: Path) -> None:
+        """Flushes the files within a directory (and the directory itself) to disk"""
+        for fspath in [path] + sorted(path.rglob("*")):
+            if fspath.is_symlink():
+                continue
+            fd = os.open(fspath, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    @staticmethod
+    def _save_json_atomic(path: Path, obj: ty.Any) -> None:
+        """Saves an object to a JSON file, replacing any existing file atomically"""
+        tmp_path = path.with_name(f".{path.name}.{uuid4()}.tmp")
+        with open(tmp_path, "w", **JSON_ENCODING) as f:
+            json.dump(obj, f, indent=2)
+        os.replace(tmp_path, path)
+
+    def _sidecar_inode(self, cache_path: Path) -> ty.Optional[int]:
+        try:
+            return os.stat(append_suffix(cache_path, self.CHECKSUM_SUFFIX)).st_ino
+        except FileNotFoundError:
+            return None
 
     def cache_path(self, uri: str):
         """Path to the directory where the item is/should be cached. Note that
@@ -1,21 +1,40 @@
+import asyncio
+import errno
+import hashlib
+import json
+import multiprocessing
 import operator as op
+import os
+import threading
 import time
+import typing as ty
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from functools import partial, reduce
 from multiprocessing import Pool, cpu_count
 from pathlib import Path
 from typing import Any, Type
 
 import pytest
+from fasteners import InterProcessLock
+from fileformats.application import Json
+from fileformats.core import FileSet
+from fileformats.core.exceptions import FormatMismatchError
 from fileformats.field import Text as TextField
 from fileformats.generic import File
 from fileformats.text import Plain as PlainText
 from fileformats.text import TextFile
 from pydra.utils.typing import is_fileset_or_union
 
-from frametree.core.entry import DataEntry
+from frametree.core.entry import DataEntry, ItemCache, item_cache
+from frametree.core.exceptions import FrameTreeError
 from frametree.core.frameset.base import FrameSet
 from frametree.core.serialize import asdict
-from frametree.core.store import Store
+from frametree.core.store import Store, checksums, remote, transfer
+from frametree.core.store.cache import CacheManager
+from frametree.core.store.transfer import TransferMode, transfer_fileset, transfer_path
+from frametree.core.store.upload import upload_queue
+from frametree.core.utils import append_suffix
 from frametree.file_system import FileSystem
 from frametree.testing import MockRemote, TestAxes
 from frametree.testing.blueprint import FieldEntryBlueprint as FieldBP
@@ -164,19 +183,120 @@ def test_delayed_download(
             p.close()  # Marks the pool as closed.
             p.join()  # Required to get the concurrency to show up in test coverage
 
-    assert no_offset == "file1.txt"
-    assert with_offset == "modified"
+    # The second process waits for the download by the first instead of downloading
+    # the file-set again
+    assert no_offset == with_offset
+    assert no_offset[0] == "file1.txt"
 
 
-def delayed_download(entry: DataEntry, start_offset: float) -> str:
+def delayed_download(entry: DataEntry, start_offset: float) -> ty.Tuple[str, int]:
     # Set the downloads off at slightly different times
     time.sleep(start_offset)
     text_file = TextFile(entry.item)  # type: ignore[arg-type]
-    contents: str = text_file.raw_contents
-    if not start_offset:
-        with open(text_file.fspath, "w") as f:
-            f.write("modified")
-    return contents
+    return text_file.raw_contents, os.lstat(text_file.fspath).st_mtime_ns
+
+
+def test_download_takeover(
+    delayed_mock_remote: MockRemote,
+    simple_dataset_blueprint: TestDatasetBlueprint,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+
+    delayed_mock_remote.race_condition_delay = 1
+    dataset = simple_dataset_blueprint.make_dataset(
+        delayed_mock_remote, "download_takeover"
+    )
+    entry = next(iter(dataset.rows())).entry("file1")
+    delayed_mock_remote.clear_cache()
+    cache_path = delayed_mock_remote.cache_path(entry.uri)
+    # Simulate a download by another process that has stalled after downloading the
+    # file, which shouldn't need to be downloaded again
+    with monkeypatch.context() as m:
+
+        def stall(*args: Any) -> None:
+            raise ConnectionError("stalled")
+
+        m.setattr(MockRemote, "_complete_download", stall)
+        with delayed_mock_remote.connection, pytest.raises(ConnectionError):
+            delayed_mock_remote._download(entry, cache_path)
+    downloaded_chunks = []
+
+    def recorded_download_chunk(self: MockRemote, *args: Any) -> bytes:
+        downloaded_chunks.append(args)
+        raise AssertionError("Files downloaded by the stalled process were fetched")
+
+    monkeypatch.setattr(MockRemote, "download_chunk", recorded_download_chunk)
+    lock_path = append_suffix(cache_path, MockRemote.DOWNLOAD_LOCK_SUFFIX)
+    locked = multiprocessing.Event()
+    holder = multiprocessing.Process(target=hold_lock, args=(lock_path, locked))
+    holder.start()
+    try:
+        assert locked.wait(10)
+        start = time.time()
+        assert (
+            TextFile(entry.item).raw_contents
+            == (delayed_mock_remote.entry_fspath(entry) / "file1.txt").read_text()
+        )
+        assert time.time() - start < 5
+    finally:
+        holder.terminate()
+        holder.join()
+    assert not downloaded_chunks
+
+
+def test_resume_download(
+    delayed_mock_remote: MockRemote, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+
+    blueprint = TestDatasetBlueprint(
+        hierarchy=["abcd"],
+        axes=TestAxes,
+        dim_lengths=[1, 1, 1, 1],
+        entries=[],
+    )
+    dataset = blueprint.make_dataset(delayed_mock_remote, "resume_download")
+    dataset.add_sink("sink1", File)
+    dataset.save()
+    contents = bytes(range(256)) * 40
+    src = tmp_path / "file.bin"
+    src.write_bytes(contents)
+    dataset.row("abcd", "a0b0c0d0")["sink1"] = File(src)
+    delayed_mock_remote.clear_cache()
+    item_cache.clear()
+    monkeypatch.setattr(MockRemote, "DOWNLOAD_CHUNK_SIZE", 1024)
+    download_chunk = MockRemote.download_chunk
+    offsets: ty.List[int] = []
+    fail_after: ty.List[int] = [3]
+
+    def recorded_download_chunk(
+        self: MockRemote, entry: DataEntry, path: str, offset: int, nbytes: int
+    ) -> bytes:
+        if len(offsets) == fail_after[0]:
+            raise ConnectionError("connection reset")
+        offsets.append(offset)
+        return download_chunk(self, entry, path, offset, nbytes)
+
+    monkeypatch.setattr(MockRemote, "download_chunk", recorded_download_chunk)
+
+    dataset = delayed_mock_remote.load_frameset("resume_download")
+    entry = dataset.row("abcd", "a0b0c0d0").cell("sink1").entry
+    with pytest.raises(ConnectionError):
+        entry.item
+    download_dir = append_suffix(delayed_mock_remote.cache_path(entry.uri), ".download")
+    assert (download_dir / MockRemote.DOWNLOAD_PROGRESS_FNAME).exists()
+    # The download is resumed from the end of the last chunk that was saved
+    offsets.clear()
+    fail_after[0] = -1
+    assert File(entry.item).read_contents() == contents
+    assert offsets == list(range(3 * 1024, len(contents), 1024))
+    assert not download_dir.exists()
+
+
+def hold_lock(lock_path: Path, locked: ty.Any) -> None:
+    with InterProcessLock(lock_path):
+        os.utime(lock_path, (0, 0))  # no heartbeat
+        locked.set()
+        time.sleep(60)
 
 
 def test_entry_access(tmp_path: Path) -> None:
@@ -217,3 +337,829 @@ def test_entry_access(tmp_path: Path) -> None:
     assert PlainText(row.entry("file1", key="2").item).contents == "2.txt"
     with pytest.raises(ValueError):
         row.entry("file1", order=0, key="0")
+
+
+def test_probe_datatype(
+    delayed_mock_remote: MockRemote, monkeypatch: pytest.MonkeyPatch
+) -> None:
+
+    blueprint = TestDatasetBlueprint(
+        hierarchy=["abcd"],
+        axes=TestAxes,
+        dim_lengths=[1, 1, 1, 1],
+        entries=[
+            FileBP(path="file1", datatype=PlainText, filenames=["file1.txt"]),
+            FileBP(path="file2", datatype=Json, filenames=["file2.json"]),
+        ],
+    )
+    dataset = blueprint.make_dataset(delayed_mock_remote, "probe_datatype")
+    delayed_mock_remote.clear_cache()
+    dataset.add_source("json", Json, path=r"file\d", is_regex=True)
+
+    def download_files_fail(*args: Any, **kwargs: Any) -> None:
+        raise AssertionError("Entries should be matched from their file headers")
+
+    with monkeypatch.context() as m:
+        m.setattr(MockRemote, "download_files", download_files_fail)
+        m.setattr(MockRemote, "list_files", download_files_fail)
+        row = next(iter(dataset.rows()))
+        entry = row.cell("json").entry
+        assert entry.path == "file2"
+        # Results of the probe are memoised
+        m.setattr(MockRemote, "download_headers", download_files_fail)
+        delayed_mock_remote.probe_datatype(entry, Json)
+        with pytest.raises(FormatMismatchError):
+            delayed_mock_remote.probe_datatype(row.entry("file1"), Json)
+    assert isinstance(row["json"], Json)
+
+
+def test_item_cache(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+
+    blueprint = TestDatasetBlueprint(
+        hierarchy=["abcd"],
+        axes=TestAxes,
+        dim_lengths=[1, 1, 1, 1],
+        entries=[
+            FileBP(path="file1", datatype=PlainText, filenames=["file1.txt"]),
+            FieldBP(path="field1", datatype=TextField, value="value1"),
+        ],
+    )
+    dataset = blueprint.make_dataset(FileSystem(), tmp_path / "item-cache")
+    row = next(iter(dataset.rows()))
+    file_entry = row.entry("file1.txt")
+    field_entry = row.entry("field1")
+
+    # Push modification times outside the window in which they are considered too
+    # recent to be relied on
+    mtime = time.time() - 60
+    for path in (tmp_path / "item-cache").rglob("*"):
+        os.utime(path, (mtime, mtime))
+
+    item_cache.clear()
+    file_item = file_entry.get_item(PlainText)
+    field_item = field_entry.get_item(TextField)
+    assert (item_cache.hits, item_cache.misses) == (0, 2)
+
+    def get_fail(*args: Any, **kwargs: Any) -> None:
+        raise AssertionError("Items should be retrieved from the item cache")
+
+    with monkeypatch.context() as m:
+        m.setattr(FileSystem, "get", get_fail)
+        assert file_entry.get_item(PlainText) is file_item
+        assert field_entry.get_item(TextField) is field_item
+    assert (item_cache.hits, item_cache.misses) == (2, 2)
+
+    # Writing to the entry invalidates the cached item
+    field_entry.item = TextField("value2")
+    assert field_entry.get_item(TextField).value == "value2"
+
+    # Least-recently used items are evicted when the limits are exceeded
+    cache = ItemCache(max_items=2)
+    for i in range(3):
+        cache.put(i, "token", TextField, TextField(str(i)))
+    assert len(cache) == 2
+    assert cache.get(0, "token", TextField) is None
+    assert cache.get(2, "token", TextField).value == "2"
+    assert cache.get(2, "another-token", TextField) is None
+
+
+def test_update_json_atomic(tmp_path: Path) -> None:
+
+    store = FileSystem()
+    fpath = tmp_path / "__fields__.json"
+    store.update_json(fpath, "a", 1)
+    errors = []
+
+    def read_repeatedly() -> None:
+        for _ in range(200):
+            try:
+                store.read_from_json(fpath, "a")
+            except Exception as e:  # pragma: no cover
+                errors.append(e)
+
+    readers = [threading.Thread(target=read_repeatedly) for _ in range(4)]
+    for reader in readers:
+        reader.start()
+    for i in range(50):
+        store.update_json(fpath, f"key{i}", "x" * 1000)
+    for reader in readers:
+        reader.join()
+    assert not errors
+    assert store.read_from_json(fpath, "key49") == "x" * 1000
+    # No temporary files are left behind
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "__fields__.json",
+        "__fields__.json.lock",
+    ]
+
+
+def test_update_json_batched(tmp_path: Path) -> None:
+
+    store = FileSystem()
+    fpath = tmp_path / "__fields__.json"
+    store.update_json(fpath, "a", 1)
+    with store.batch_writes():
+        for i in range(10):
+            store.update_json(fpath, f"key{i}", i)
+        with store.batch_writes():  # nested contexts join the outer batch
+            store.update_json(fpath, "a", 2)
+        # Buffered updates are visible to the writing thread but not yet written
+        assert store.read_from_json(fpath, "key9") == 9
+        assert store.read_from_json(fpath, "a") == 2
+        assert json.loads(fpath.read_text()) == {"a": 1}
+    assert json.loads(fpath.read_text()) == {
+        "a": 2,
+        **{f"key{i}": i for i in range(10)},
+    }
+
+
+@pytest.mark.parametrize("mode", list(TransferMode))
+def test_put_fileset_transfer_modes(mode: TransferMode, tmp_path: Path) -> None:
+
+    src_dir = tmp_path / "src"
+    src_dir.mkdir()
+    src = src_dir / "file.txt"
+    src.write_text("contents")
+    dataset = TestDatasetBlueprint(
+        hierarchy=["abcd"],
+        axes=TestAxes,
+        dim_lengths=[1, 1, 1, 1],
+        entries=[],
+    ).make_dataset(FileSystem(transfer_mode=mode.name), tmp_path / "dataset")
+    dataset.add_sink("sink", TextFile)
+    dataset.row("abcd", "a0b0c0d0")["sink"] = TextFile(src)
+    stored = dataset.row("abcd", "a0b0c0d0")["sink"].fspath
+    assert stored.read_text() == "contents"
+    if mode is TransferMode.hardlink:
+        assert stored.stat().st_ino == src.stat().st_ino
+    elif mode is TransferMode.symlink:
+        assert stored.is_symlink()
+    elif mode is TransferMode.move:
+        assert not src.exists()
+    else:
+        assert stored.stat().st_ino != src.stat().st_ino
+
+
+@pytest.mark.parametrize("mode", [TransferMode.hardlink, TransferMode.reflink])
+def test_transfer_fallback(
+    mode: TransferMode, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    def unsupported(*args: Any) -> None:
+        raise OSError(errno.EXDEV, "Invalid cross-device link")
+
+    monkeypatch.setattr(os, "link", unsupported)
+    monkeypatch.setattr(transfer, "reflink_file", unsupported)
+    src = tmp_path / "src"
+    (src / "sub").mkdir(parents=True)
+    (src / "sub" / "file.txt").write_text("contents")
+    dest = tmp_path / "dest"
+    transfer_path(src, dest, mode)
+    assert (dest / "sub" / "file.txt").read_text() == "contents"
+    assert (src / "sub" / "file.txt").exists()
+
+
+def test_transfer_fileset(tmp_path: Path) -> None:
+
+    src_dir = tmp_path / "src"
+    (src_dir / "sub").mkdir(parents=True)
+    header = src_dir / "image.hdr"
+    header.write_text("header")
+    (src_dir / "sub" / "image.img").write_text("image")
+    fileset = FileSet([header, src_dir / "sub" / "image.img"])
+    dest_dir = tmp_path / "dest"
+    (dest_dir / "sub").mkdir(parents=True)
+    # Existing paths, including dangling symlinks, are overwritten
+    (dest_dir / "sub" / "image.img").symlink_to(tmp_path / "missing")
+    transferred = transfer_fileset(fileset, dest_dir, trim=False)
+    assert sorted(transferred.fspaths) == [
+        dest_dir / "image.hdr",
+        dest_dir / "sub" / "image.img",
+    ]
+    assert (dest_dir / "sub" / "image.img").read_text() == "image"
+    renamed = transfer_fileset(
+        fileset,
+        tmp_path / "renamed",
+        collation=FileSet.CopyCollation.adjacent,
+        new_stem="renamed",
+        trim=False,
+    )
+    assert sorted(p.name for p in renamed.fspaths) == ["renamed.hdr", "renamed.img"]
+    assert len({p.parent for p in renamed.fspaths}) == 1
+
+
+def test_cache_eviction(tmp_path: Path) -> None:
+
+    cache = CacheManager(tmp_path, max_size="2.5K")
+
+    def add_entry(name: str, mtime: int) -> Path:
+        cache_path = tmp_path / "proj" / name
+        cache_path.mkdir(parents=True)
+        (cache_path / "file.txt").write_bytes(b"x" * 1000)
+        sidecar = append_suffix(cache_path, cache.sidecar_suffix)
+        sidecar.write_text("{}")
+        os.utime(sidecar, (mtime, mtime))
+        cache.added(cache_path)
+        return cache_path
+
+    a = add_entry("a", 100)
+    b = add_entry("b", 200)
+    release_b = cache.pin(b)
+    cache.hit(a)  # a is now the most recently used
+    c = add_entry("c", 300)
+    # b is the least recently used but is pinned so a is evicted instead
+    assert b.exists() and c.exists()
+    assert not a.exists()
+    assert not append_suffix(a, cache.sidecar_suffix).exists()
+    release_b()
+    add_entry("d", 400)
+    assert not b.exists()
+    # The pin lock files of evicted entries are removed along with them
+    assert not append_suffix(a, cache.PIN_SUFFIX).exists()
+    assert not append_suffix(b, cache.PIN_SUFFIX).exists()
+    cache.miss()
+    stats = cache.stats()
+    assert stats.num_entries == 2
+    assert stats.size == 2000
+    assert stats.occupancy == 0.8
+    assert stats.hits == 1 and stats.misses == 1
+    assert stats.hit_rate == 0.5
+    # Index is rebuilt from the sidecars if it is lost
+    cache.index_path.unlink()
+    assert cache.stats().size == 2000
+
+
+def test_cache_index_journal(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+
+    cache = CacheManager(tmp_path, max_size="10K")
+
+    def add_entry(name: str) -> Path:
+        cache_path = tmp_path / "proj" / name
+        cache_path.mkdir(parents=True)
+        (cache_path / "file.txt").write_bytes(b"x" * 1000)
+        append_suffix(cache_path, cache.sidecar_suffix).write_text("{}")
+        cache.added(cache_path)
+        return cache_path
+
+    a = add_entry("a")
+    snapshot = cache.index_path.stat()
+    # Changes are appended to the journal instead of rewriting the index
+    add_entry("b")
+    cache.hit(a)
+    cache.hit(a)
+    cache.flush()
+    assert cache.index_path.stat().st_ino == snapshot.st_ino
+    assert cache.index_path.stat().st_mtime_ns == snapshot.st_mtime_ns
+    # The changes made by other processes are read from the journal
+    other = CacheManager(tmp_path, max_size="10K")
+    stats = other.stats()
+    assert stats.num_entries == 2 and stats.size == 2000 and stats.hits == 2
+    add_entry("c")
+    other.hit(tmp_path / "proj" / "c")
+    other.flush()
+    stats = cache.stats()
+    assert stats.num_entries == 3 and stats.size == 3000 and stats.hits == 3
+    # Buffered accesses are recorded before entries are evicted, so b is evicted as
+    # it was accessed least recently
+    cache.hit(a)
+    other.evict(2000)
+    assert a.exists() and not (tmp_path / "proj" / "b").exists()
+    # The journal is compacted into a new snapshot once it grows too large
+    monkeypatch.setattr(CacheManager, "MIN_COMPACTED_RECORDS", 2)
+    add_entry("d")
+    assert cache.index_path.stat().st_ino != snapshot.st_ino
+    # The journal of the previous snapshot is removed
+    assert not list(tmp_path.glob(CacheManager.JOURNAL_FNAME_TEMPLATE.format("*")))
+    stats = other.stats()
+    assert stats.num_entries == 3 and stats.size == 3000 and stats.hits == 4
+
+
+def test_content_addressed_cache(
+    delayed_mock_remote: MockRemote, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+
+    delayed_mock_remote.content_addressed_cache = True
+    blueprint = TestDatasetBlueprint(
+        hierarchy=["abcd"],
+        axes=TestAxes,
+        dim_lengths=[1, 1, 1, 1],
+        entries=[],
+    )
+    dataset = blueprint.make_dataset(delayed_mock_remote, "content_addressed")
+    dataset.add_sink("sink1", TextFile)
+    dataset.add_sink("sink2", TextFile)
+    dataset.save()
+    src = tmp_path / "file.txt"
+    src.write_text("contents")
+    row = dataset.row("abcd", "a0b0c0d0")
+    row["sink1"] = TextFile(src)
+    row["sink2"] = TextFile(src)
+    delayed_mock_remote.clear_cache()
+    item_cache.clear()
+    dataset = delayed_mock_remote.load_frameset("content_addressed")
+    row = dataset.row("abcd", "a0b0c0d0")
+    first = row["sink1"]
+
+    def download_files_fail(*args: Any, **kwargs: Any) -> None:
+        raise AssertionError("Identical file-set should be linked from the cache")
+
+    with monkeypatch.context() as m:
+        m.setattr(MockRemote, "download_files", download_files_fail)
+        m.setattr(MockRemote, "download_chunk", download_files_fail)
+        second = row["sink2"]
+    # The shared files are linked under the names of the entry's own files
+    assert first.fspath.name == "sink1.txt"
+    assert second.fspath.name == "sink2.txt"
+    assert second.raw_contents == "contents"
+    assert second.fspath.stat().st_ino == first.fspath.stat().st_ino
+    # The shared copy is removed once both entries have been evicted
+    blobs_dir = delayed_mock_remote.cache_dir / CacheManager.BLOBS_DIR
+    assert list(blobs_dir.glob("*/*"))
+    delayed_mock_remote.cache.evict(0)
+    assert not list(blobs_dir.glob("*/*"))
+    # No lock files are left behind by the downloads or evictions
+    assert not [
+        p
+        for p in delayed_mock_remote.cache_dir.rglob("*")
+        if p.name.endswith((CacheManager.PIN_SUFFIX, MockRemote.DOWNLOAD_LOCK_SUFFIX))
+    ]
+
+
+def test_prefetch(
+    delayed_mock_remote: MockRemote, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+
+    blueprint = TestDatasetBlueprint(
+        hierarchy=["abcd"],
+        axes=TestAxes,
+        dim_lengths=[1, 1, 1, 3],
+        entries=[],
+    )
+    dataset = blueprint.make_dataset(delayed_mock_remote, "prefetched")
+    dataset.add_sink("sink1", TextFile)
+    dataset.save()
+    for i, row in enumerate(dataset.rows("abcd")):
+        src = tmp_path / f"file{i}.txt"
+        src.write_text("x" * (i + 1))
+        row["sink1"] = TextFile(src)
+    delayed_mock_remote.clear_cache()
+    item_cache.clear()
+    dataset = delayed_mock_remote.load_frameset("prefetched")
+    report = dataset.prefetch(["sink1"], ids=["a0b0c0d0", "a0b0c0d2"], max_workers=2)
+    assert report.num_items == 2
+    assert report.num_bytes == 4
+    assert not report.failures
+    assert delayed_mock_remote.cache.stats().num_entries == 2
+    # Only the rows that are prefetched are populated
+    assert not dataset.row("abcd", "a0b0c0d1").populated
+    # Items that are already cached aren't counted as transferred
+    report = dataset.prefetch(["sink1"])
+    assert report.num_items == 3
+    assert report.num_bytes == 2
+    # Failed downloads are reported rather than raised
+    delayed_mock_remote.clear_cache()
+    item_cache.clear()
+    dataset = delayed_mock_remote.load_frameset("prefetched")
+
+    def download_files_fail(*args: Any, **kwargs: Any) -> None:
+        raise OSError("connection reset")
+
+    with monkeypatch.context() as m:
+        m.setattr(MockRemote, "download_files", download_files_fail)
+        m.setattr(MockRemote, "list_files", download_files_fail)
+        report = dataset.prefetch(["sink1"])
+    assert report.num_items == 0
+    assert sorted(report.failures) == [
+        "sink1:a0b0c0d0",
+        "sink1:a0b0c0d1",
+        "sink1:a0b0c0d2",
+    ]
+    assert all("connection reset" in e for e in report.failures.values())
+
+
+def test_checksums_reused(
+    delayed_mock_remote: MockRemote, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+
+    blueprint = TestDatasetBlueprint(
+        hierarchy=["abcd"],
+        axes=TestAxes,
+        dim_lengths=[1, 1, 1, 3],
+        entries=[],
+    )
+    dataset = blueprint.make_dataset(delayed_mock_remote, "checksums_reused")
+    dataset.add_sink("sink1", TextFile)
+    dataset.save()
+    for i, row in enumerate(dataset.rows("abcd")):
+        src = tmp_path / f"file{i}.txt"
+        src.write_text(str(i))
+        row["sink1"] = TextFile(src)
+    delayed_mock_remote.clear_cache()
+    item_cache.clear()
+    dataset = delayed_mock_remote.load_frameset("checksums_reused")
+    calls: ty.Dict[str, int] = {"get_checksums": 0, "get_checksums_many": 0}
+
+    def count_calls(name: str) -> ty.Callable[..., ty.Any]:
+        method = getattr(MockRemote, name)
+
+        def counted(*args: Any, **kwargs: Any) -> ty.Any:
+            calls[name] += 1
+            return method(*args, **kwargs)
+
+        return counted
+
+    monkeypatch.setattr(MockRemote, "get_checksums", count_calls("get_checksums"))
+    monkeypatch.setattr(
+        MockRemote, "get_checksums_many", count_calls("get_checksums_many")
+    )
+    items = [c.item for c in dataset["sink1"].cells()]
+    assert [i.raw_contents for i in items] == ["0", "1", "2"]
+    # The checksums are downloaded in a single batch when the rows are populated and
+    # reused to validate the cache instead of being downloaded again per file-set
+    assert calls == {"get_checksums": 0, "get_checksums_many": 1}
+    item_cache.clear()
+
+    def download_files_fail(*args: Any, **kwargs: Any) -> None:
+        raise AssertionError("Cached file-set should be reused")
+
+    monkeypatch.setattr(MockRemote, "download_files", download_files_fail)
+    monkeypatch.setattr(MockRemote, "list_files", download_files_fail)
+    assert [c.item.raw_contents for c in dataset["sink1"].cells()] == ["0", "1", "2"]
+    assert calls["get_checksums"] == 0
+
+
+def test_cache_without_checksums(
+    delayed_mock_remote: MockRemote, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+
+    monkeypatch.setattr(MockRemote, "_read_checksums", lambda self, uri: None)
+    blueprint = TestDatasetBlueprint(
+        hierarchy=["abcd"],
+        axes=TestAxes,
+        dim_lengths=[1, 1, 1, 2],
+        entries=[],
+    )
+    dataset = blueprint.make_dataset(delayed_mock_remote, "cache_no_checksums")
+    dataset.add_sink("sink1", TextFile)
+    dataset.save()
+    for i, row in enumerate(dataset.rows("abcd")):
+        src = tmp_path / f"file{i}.txt"
+        src.write_text(str(i))
+        row["sink1"] = TextFile(src)
+    delayed_mock_remote.clear_cache()
+    item_cache.clear()
+    dataset = delayed_mock_remote.load_frameset("cache_no_checksums")
+    assert [c.item.raw_contents for c in dataset["sink1"].cells()] == ["0", "1"]
+    item_cache.clear()
+    fetch = MockRemote._fetch
+    downloaded = []
+
+    def counted_fetch(self: MockRemote, entry: DataEntry, download_dir: Path) -> Path:
+        downloaded.append(entry.row.id)
+        return fetch(self, entry, download_dir)
+
+    monkeypatch.setattr(MockRemote, "_fetch", counted_fetch)
+    # Cached copies are reused even though they can't be validated against checksums
+    assert [c.item.raw_contents for c in dataset["sink1"].cells()] == ["0", "1"]
+    assert not downloaded
+    # unless they have been altered since they were cached
+    cell = next(iter(dataset["sink1"].cells()))
+    cached = delayed_mock_remote.cache_path(cell.entry.uri)
+    next(cached.iterdir()).write_text("altered")
+    item_cache.clear()
+    assert cell.item.raw_contents == "0"
+    assert downloaded == [cell.row.id]
+
+
+def test_async_uploads(
+    delayed_mock_remote: MockRemote, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+
+    delayed_mock_remote.async_uploads = True
+    blueprint = TestDatasetBlueprint(
+        hierarchy=["abcd"],
+        axes=TestAxes,
+        dim_lengths=[1, 1, 1, 2],
+        entries=[],
+    )
+    dataset = blueprint.make_dataset(delayed_mock_remote, "async_uploads")
+    dataset.add_sink("sink1", TextFile)
+    dataset.save()
+    upload_files = MockRemote.upload_files
+    release_uploads = threading.Event()
+
+    def blocked_upload_files(
+        self: MockRemote, cache_path: Path, entry: DataEntry
+    ) -> None:
+        assert release_uploads.wait(10)
+        if "d1" in str(entry.uri):
+            raise ConnectionError("connection reset")
+        upload_files(self, cache_path, entry)
+
+    monkeypatch.setattr(MockRemote, "upload_files", blocked_upload_files)
+    rows = list(dataset.rows("abcd"))
+    for i, row in enumerate(rows):
+        src = tmp_path / f"file{i}.txt"
+        src.write_text(str(i))
+        # Returns before the upload has completed
+        row["sink1"] = TextFile(src)
+    entry = rows[0].cell("sink1").entry
+    uploaded = delayed_mock_remote.entry_fspath(entry) / MockRemote.CHECKSUMS_FILE
+    assert not uploaded.exists()
+    release_uploads.set()
+    # Reads of the item wait until it has been uploaded
+    assert TextFile(entry.item).raw_contents == "0"
+    assert uploaded.exists()
+    with pytest.raises(FrameTreeError, match="1 background upload"):
+        delayed_mock_remote.wait_for_uploads()
+    # Errors are only raised once
+    delayed_mock_remote.wait_for_uploads()
+
+
+def _queue_upload(dest: Path) -> None:
+    def upload() -> None:
+        time.sleep(0.5)
+        dest.write_text("uploaded")
+
+    upload_queue(str(dest.parent), 1).submit(str(dest), upload)
+
+
+def test_uploads_drained_on_worker_exit(tmp_path: Path) -> None:
+    dest = tmp_path / "uploaded.txt"
+    # Uploads still pending when a worker process exits are completed before it exits
+    worker = multiprocessing.Process(target=_queue_upload, args=(dest,))
+    worker.start()
+    worker.join(10)
+    assert worker.exitcode == 0
+    assert dest.read_text() == "uploaded"
+
+
+def test_async_api(
+    delayed_mock_remote: MockRemote, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+
+    delayed_mock_remote.mock_delay = 0
+    blueprint = TestDatasetBlueprint(
+        hierarchy=["abcd"],
+        axes=TestAxes,
+        dim_lengths=[1, 1, 1, 3],
+        entries=[],
+    )
+    dataset = blueprint.make_dataset(delayed_mock_remote, "async_api")
+    dataset.add_sink("sink1", TextFile)
+    dataset.save()
+
+    def make_file(name: str, contents: str) -> TextFile:
+        src = tmp_path / f"{name}.txt"
+        src.write_text(contents)
+        return TextFile(src)
+
+    rows = list(dataset.rows("abcd"))
+    for i, row in enumerate(rows):
+        row["sink1"] = make_file(f"a{i}", f"a{i}")
+
+    async def put_all() -> None:
+        await asyncio.gather(
+            *(
+                r.cell("sink1").entry.aput_item(make_file(f"b{i}", f"b{i}"))
+                for i, r in enumerate(rows)
+            )
+        )
+
+    # Uploaded in worker threads by default
+    asyncio.run(put_all())
+
+    active = max_active = 0
+
+    async def adownload_files(
+        self: MockRemote, entry: DataEntry, download_dir: Path
+    ) -> Path:
+        nonlocal active, max_active
+        active += 1
+        max_active = max(max_active, active)
+        await asyncio.sleep(0.1)
+        active -= 1
+        with self.connection:
+            return self.download_files(entry, download_dir)
+
+    monkeypatch.setattr(MockRemote, "adownload_files", adownload_files)
+    delayed_mock_remote.clear_cache()
+    item_cache.clear()
+    dataset = delayed_mock_remote.load_frameset("async_api")
+
+    async def get_all() -> ty.Dict[str, str]:
+        rows = [r async for r in dataset.aiter_rows("abcd")]
+        assert all(r.populated for r in rows)
+        items = await asyncio.gather(*(r.aget("sink1") for r in rows))
+        return {r.id: item.raw_contents for r, item in zip(rows, items)}
+
+    assert asyncio.run(get_all()) == {
+        "a0b0c0d0": "b0",
+        "a0b0c0d1": "b1",
+        "a0b0c0d2": "b2",
+    }
+    # The native downloads were made concurrently
+    assert max_active == 3
+    assert delayed_mock_remote.cache.stats().num_entries == 3
+
+    async def stop_early() -> int:
+        rows = dataset.aiter_rows("abcd")
+        await rows.__anext__()
+        # The generator isn't closed until the event loop is shut down
+        return dataset.tree.depth
+
+    # The tree isn't left entered when the iteration is stopped early
+    assert asyncio.run(stop_early()) == 0
+
+
+@pytest.mark.parametrize("native", [False, True])
+def test_async_download_cancelled(
+    native: bool,
+    delayed_mock_remote: MockRemote,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+
+    delayed_mock_remote.mock_delay = 0
+    blueprint = TestDatasetBlueprint(
+        hierarchy=["abcd"],
+        axes=TestAxes,
+        dim_lengths=[1, 1, 1, 1],
+        entries=[FileBP(path="file1", datatype=TextFile, filenames=["file1.txt"])],
+    )
+    dataset = blueprint.make_dataset(delayed_mock_remote, "async_cancelled")
+    entry = next(iter(dataset.rows("abcd"))).entry("file1")
+    cache_path = delayed_mock_remote.cache_path(entry.uri)
+    download_lock = MockRemote._download_lock
+
+    opened = []
+
+    @contextmanager
+    def slow_lock(*args: Any) -> ty.Iterator[ty.Optional[Path]]:
+        time.sleep(0.5)
+        with download_lock(*args) as download_dir:
+            yield download_dir
+
+    def slow_download_lock(*args: Any) -> ty.ContextManager[ty.Optional[Path]]:
+        # Keep references to the locks so they aren't released by garbage collection
+        opened.append(slow_lock(*args))
+        return opened[-1]
+
+    monkeypatch.setattr(MockRemote, "_download_lock", slow_download_lock)
+    if native:
+
+        async def adownload_files(
+            self: MockRemote, entry: DataEntry, download_dir: Path
+        ) -> Path:
+            with self.connection:
+                return self.download_files(entry, download_dir)
+
+        monkeypatch.setattr(MockRemote, "adownload_files", adownload_files)
+    num_threads = threading.active_count()
+
+    async def cancel_download() -> None:
+        task = asyncio.create_task(delayed_mock_remote._adownload(entry, cache_path))
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # Give the worker thread time to acquire the lock after the cancellation
+        await asyncio.sleep(1)
+
+    asyncio.run(cancel_download())
+    # The locks and heartbeat thread have been released
+    assert not remote._download_thread_lock(cache_path).locked()
+    lock = InterProcessLock(append_suffix(cache_path, MockRemote.DOWNLOAD_LOCK_SUFFIX))
+    assert lock.acquire(blocking=False)
+    lock.release()
+    assert threading.active_count() == num_threads
+    assert TextFile(entry.item).raw_contents == "file1.txt"
+
+
+def test_connection_pool(tmp_path: Path) -> None:
+
+    (tmp_path / "remote").mkdir()
+    (tmp_path / "cache").mkdir()
+    store = MockRemote(
+        server="http://a.server.com",
+        cache_dir=tmp_path / "cache",
+        remote_dir=tmp_path / "remote",
+        max_connections=2,
+        connection_idle_timeout=60,
+    )
+    entered = threading.Barrier(3)
+    sessions = {}
+
+    def check_out(name: str) -> None:
+        with store.connection:
+            with store.connection:  # nested contexts reuse the thread's session
+                sessions[name] = store.connection.session
+            entered.wait(10)
+
+    threads = [threading.Thread(target=check_out, args=(n,)) for n in "abc"]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Threads check out their own sessions until the maximum is reached
+    assert len({id(s) for s in sessions.values()}) == 2
+    assert store.connection.session is None
+    # Released sessions are kept open and reused
+    with store.connection:
+        reused = store.connection.session
+    assert reused.active and reused in sessions.values()
+    # Sessions dropped while they are idle are replaced
+    reused.active = False
+    with store.connection:
+        assert store.connection.session is not reused
+        assert store.connection.session.active
+    # Threads that haven't entered the context use the session of the enclosing one
+    with store.connection:
+        outer = store.connection.session
+        with ThreadPoolExecutor() as executor:
+            assert executor.submit(lambda: store.connection.session).result() is outer
+    store.connection.close()
+    assert not any(s.active for s in sessions.values())
+    # Sessions are closed as soon as they are released without an idle timeout
+    store.connection.idle_timeout = 0
+    with store.connection:
+        session = store.connection.session
+    assert not session.active
+
+
+def test_racy_digests_not_recorded(tmp_path: Path) -> None:
+
+    path = tmp_path / "file.txt"
+    path.write_text("aaaa")
+    assert checksums.file_digest(path, "sha256") == hashlib.sha256(b"aaaa").hexdigest()
+    # The file is rewritten with the same size within the modification-time
+    # granularity of the file-system, so it isn't detected by its (dev, ino, size,
+    # mtime) key
+    mtime_ns = path.stat().st_mtime_ns
+    path.write_text("bbbb")
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+    assert checksums.file_digest(path, "sha256") == hashlib.sha256(b"bbbb").hexdigest()
+    # Digests of files that haven't been modified recently are reused
+    settled = time.time_ns() - int(2 * checksums.RACY_MTIME_WINDOW * 1e9)
+    os.utime(path, ns=(settled, settled))
+    digest = checksums.file_digest(path, "sha256")
+    path.write_text("cccc")
+    os.utime(path, ns=(settled, settled))
+    assert checksums.file_digest(path, "sha256") == digest
+
+
+@pytest.mark.parametrize("use_mmap", [False, True])
+def test_checksums_streamed(
+    delayed_mock_remote: MockRemote,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    use_mmap: bool,
+) -> None:
+
+    monkeypatch.setattr(MockRemote, "HASH_WITH_MMAP", use_mmap)
+    blueprint = TestDatasetBlueprint(
+        hierarchy=["abcd"],
+        axes=TestAxes,
+        dim_lengths=[1, 1, 1, 1],
+        entries=[],
+    )
+    dataset = blueprint.make_dataset(delayed_mock_remote, "checksums_streamed")
+    dataset.add_sink("sink1", File)
+    dataset.save()
+    contents = os.urandom(3 * 1024 * 1024 + 7)
+    src = tmp_path / "file.bin"
+    src.write_bytes(contents)
+    stream = checksums._stream
+    num_reads = [0]
+
+    def counted_stream(*args: Any, **kwargs: Any) -> None:
+        num_reads[0] += 1
+        stream(*args, **kwargs)
+
+    monkeypatch.setattr(checksums, "_stream", counted_stream)
+    row = dataset.row("abcd", "a0b0c0d0")
+    row["sink1"] = File(src)
+    # The file is hashed while it is copied into the cache, and not read again to
+    # calculate the checksums that are uploaded and saved in the cache sidecar
+    assert num_reads[0] == 1
+    entry = row.cell("sink1").entry
+    cache_path = delayed_mock_remote.cache_path(entry.uri)
+    with open(append_suffix(cache_path, MockRemote.CHECKSUM_SUFFIX)) as f:
+        assert json.load(f) == {".": hashlib.sha256(contents).hexdigest()}
+    # Downloaded files are verified against the checksums of the entry from the
+    # digests calculated while they are downloaded
+    delayed_mock_remote.clear_cache()
+    item_cache.clear()
+    monkeypatch.setattr(MockRemote, "DOWNLOAD_CHUNK_SIZE", 1024 * 1024)
+    assert File(entry.item).read_contents() == contents
+    assert num_reads[0] == 1
+    # Corrupted downloads are detected
+    delayed_mock_remote.clear_cache()
+    item_cache.clear()
+    download_chunk = MockRemote.download_chunk
+
+    def corrupted_download_chunk(*args: Any, **kwargs: Any) -> bytes:
+        return bytes(reversed(download_chunk(*args, **kwargs)))
+
+    monkeypatch.setattr(MockRemote, "download_chunk", corrupted_download_chunk)
+    with pytest.raises(FrameTreeError, match="don't match"):
+        entry.item
@@ -0,0 +1,361 @@
+from __future__ import annotations
+
+import errno
+import logging
+import os
+import shutil
+import sys
+import typing as ty
+from contextlib import contextmanager
+from enum import Enum
+from functools import partial
+from pathlib import Path
+
+from fileformats.core import FileSet
+
+from frametree.core.exceptions import FrameTreeUsageError
+
+from .checksums import copy_file_hashed
+
+if sys.platform.startswith("linux"):
+    import fcntl
+else:
+    fcntl = None
+
+logger = logging.getLogger("frametree")
+
+FS = ty.TypeVar("FS", bound=FileSet)
+
+# Linux ioctl request code used to clone the extents of one file into another
+# (i.e. a copy-on-write "reflink" on file-systems that support it such as btrfs & XFS)
+FICLONE = 0x40049409
+
+# Errors raised by link/clone/kernel-copy operations that just mean they aren't
+# supported between the source and destination paths, in which case we fall back to a
+# plain copy instead
+FALLBACK_ERRNOS = frozenset(
+    [
+        errno.EXDEV,
+        errno.EPERM,
+        errno.EMLINK,
+        errno.EINVAL,
+        errno.ENOSYS,
+        errno.ENOTTY,
+        errno.EOPNOTSUPP,
+        errno.ENOTSUP,
+        errno.EBADF,
+    ]
+)
+
+
+class TransferMode(Enum):
+    """How the files of a file-set are transferred into a store
+
+    copy
+        a full copy of the files, made by the kernel where possible
+    hardlink
+        hard-links to the original files, falling back to a copy if the files are on
+        a different file-system
+    reflink
+        copy-on-write clones of the original files, falling back to a copy if the
+        file-system doesn't support them
+    symlink
+        symbolic links to the original files, falling back to a copy if the
+        file-system doesn't support them
+    move
+        the original files are moved into the store (i.e. they are removed from their
+        original location), falling back to copying and deleting them if they are on a
+        different file-system
+    """
+
+    copy = 1
+    hardlink = 2
+    reflink = 3
+    symlink = 4
+    move = 5
+
+    def __str__(self) -> str:
+        return self.name
+
+    @classmethod
+    def cast(cls, mode: ty.Union[TransferMode, str]) -> TransferMode:
+        if isinstance(mode, str):
+            try:
+                mode = cls[mode]
+            except KeyError:
+                raise FrameTreeUsageError(
+                    f"Unrecognised transfer mode '{mode}', can be one of "
+                    + ", ".join(m.name for m in cls)
+                )
+        return mode
+
+
+def transfer_fileset(
+    fileset: FS,
+    dest_dir: Path,
+    mode: TransferMode = TransferMode.copy,
+    collation: FileSet.CopyCollation = FileSet.CopyCollation.any,
+    new_stem: ty.Optional[str] = None,
+    trim: bool = True,
+    hash_algorithm: ty.Optional[str] = None,
+    use_mmap: bool = False,
+) -> FS:
+    """Transfers the files of a file-set into a destination directory, overwriting
+    any existing files at the new locations
+
+    Parameters
+    ----------
+    fileset : FileSet
+        the file-set to transfer
+    dest_dir : Path
+        the directory to transfer the file-set into, created if it doesn't exist
+    mode : TransferMode
+        how the files are transferred, by default they are copied
+    collation : FileSet.CopyCollation
+        how the relative paths of the files within the file-set are treated. See
+        ``FileSet.copy()`` for details
+    new_stem : str, optional
+        the file name excluding file extensions to give the transferred files
+    trim : bool
+        whether to only transfer the file-paths that are required by the file-set
+    hash_algorithm : str, optional
+        the hashlib algorithm to calculate the digests of copied files with while they
+        are copied, so they don't need to be read again to calculate their checksums
+        (see ``checksums.file_digest``)
+    use_mmap : bool
+        whether to memory-map files that are hashed while they are copied
+
+    Returns
+    -------
+    FileSet
+        the file-set at its new location
+    """
+    dest_dir = Path(dest_dir)
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    src_dest = _src_dest_pairs(fileset, dest_dir, collation, new_stem, trim)
+    for src, dest in src_dest:
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        if dest.is_symlink() or dest.is_file():
+            dest.unlink()
+        elif dest.is_dir():
+            shutil.rmtree(dest)
+        transfer_path(src, dest, mode, hash_algorithm=hash_algorithm, use_mmap=use_mmap)
+    return type(fileset)([d for _, d in src_dest])
+
+
+def transfer_path(
+    src: Path,
+    dest: Path,
+    mode: TransferMode,
+    hash_algorithm: ty.Optional[str] = None,
+    use_mmap: bool = False,
+) -> None:
+    """Transfers a file or directory to a new location, falling back to a copy if the
+    requested transfer mode isn't supported between the two paths
+
+    Parameters
+    ----------
+    src : Path
+        the file or directory to transfer
+    dest : Path
+        the path to transfer it to, which shouldn't already exist
+    mode : TransferMode
+        how to transfer the file or directory
+    hash_algorithm : str, optional
+        the hashlib algorithm to calculate the digests of copied files with while they
+        are copied
+    use_mmap : bool
+        whether to memory-map files that are hashed while they are copied
+    """
+    transfer_file = partial(
+        _transfer_file, mode=mode, hash_algorithm=hash_algorithm, use_mmap=use_mmap
+    )
+    if mode is TransferMode.symlink:
+        try:
+            os.symlink(Path(src).absolute(), dest, target_is_directory=src.is_dir())
+        except OSError as e:
+            _check_fallback(e, src, dest, mode)
+        else:
+            return
+    elif mode is TransferMode.move:
+        try:
+            os.rename(src, dest)
+        except OSError as e:
+            _check_fallback(e, src, dest, mode)
+            transfer_path(
+                src,
+                dest,
+                TransferMode.copy,
+                hash_algorithm=hash_algorithm,
+                use_mmap=use_mmap,
+            )
+            if src.is_dir():
+                shutil.rmtree(src)
+            else:
+                os.unlink(src)
+        return
+    if src.is_dir():
+        shutil.copytree(src, dest, copy_function=transfer_file)
+    else:
+        transfer_file(src, dest)
+
+
+def copy_file(src: Path, dest: Path) -> None:
+    """Copies the contents of a file using the kernel's ``copy_file_range``, which
+    avoids passing the data through user space and can be offloaded to the file-system
+    (e.g. server-side copies on NFS), falling back to ``shutil.copyfile`` (which uses
+    ``sendfile`` on Linux) where it isn't supported
+
+    Parameters
+    ----------
+    src : Path
+        the file to copy
+    dest : Path
+        the path to copy it to
+    """
+    if hasattr(os, "copy_file_range"):
+        with open(src, "rb") as fsrc, open(dest, "wb") as fdst:
+            size = os.fstat(fsrc.fileno()).st_size
+            copied = 0
+            try:
+                while copied < size:
+                    nbytes = os.copy_file_range(
+                        fsrc.fileno(), fdst.fileno(), size - copied
+                    )
+                    if not nbytes:  # e.g. pseudo files that report the wrong size
+                        break
+                    copied += nbytes
+            except OSError as e:
+                if copied or e.errno not in FALLBACK_ERRNOS:
+                    raise
+            if copied == size:
+                return
+    shutil.copyfile(src, dest)
+
+
+def reflink_file(src: Path, dest: Path) -> None:
+    """Creates a copy-on-write clone of a file, raising an OSError if it isn't
+    supported by the file-system (or platform)
+
+    Parameters
+    ----------
+    src : Path
+        the file to clone
+    dest : Path
+        the path to create the clone at
+    """
+    if fcntl is None:
+        raise OSError(errno.ENOTSUP, "Reflinks are only supported on Linux", str(src))
+    with open(src, "rb") as fsrc, open(dest, "wb") as fdst:
+        fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+
+
+@contextmanager
+def override_transfer_mode(
+    store: ty.Any, mode: ty.Union[TransferMode, str, None]
+) -> ty.Iterator[None]:
+    """Temporarily sets the transfer mode of a store
+
+    Parameters
+    ----------
+    store : Store
+        the store to set the transfer mode of
+    mode : TransferMode or str or None
+        the transfer mode to use within the context, if None the store's transfer mode
+        is left unchanged
+    """
+    if mode is None:
+        yield
+        return
+    try:
+        original = store.transfer_mode
+    except AttributeError:
+        raise FrameTreeUsageError(
+            f"{type(store).__name__} stores don't support setting the transfer mode"
+        )
+    store.transfer_mode = TransferMode.cast(mode)
+    try:
+        yield
+    finally:
+        store.transfer_mode = original
+
+
+def _src_dest_pairs(
+    fileset: FileSet,
+    dest_dir: Path,
+    collation: FileSet.CopyCollation,
+    new_stem: ty.Optional[str],
+    trim: bool,
+) -> ty.List[ty.Tuple[Path, Path]]:
+    """Determines the paths that the top-level file-paths of a file-set are transferred
+    to, following the same naming rules as ``FileSet.copy()``"""
+    decomposed = fileset.decomposed_fspaths(required_only=trim)
+    if not decomposed:
+        raise FrameTreeUsageError(
+            f"Cannot transfer {fileset} because none of its file-paths are required, "
+            "set trim=False to transfer all of them"
+        )
+    if len(decomposed) == 1:
+        # No relative paths to preserve or names to clash
+        collation = FileSet.CopyCollation.siblings
+    names = [stem + ext for _, stem, ext in decomposed]
+    if collation >= FileSet.CopyCollation.siblings and len(set(names)) < len(names):
+        raise FrameTreeUsageError(
+            f"Cannot transfer {fileset} with '{collation}' collation as there are "
+            f"duplicate file names in {names}"
+        )
+    exts = [ext for _, _, ext in decomposed]
+    if collation is FileSet.CopyCollation.adjacent or new_stem:
+        if len(set(exts)) < len(exts):
+            raise FrameTreeUsageError(
+                f"Cannot transfer {fileset} with '{collation}' collation or a new "
+                f"stem as there are duplicate extensions in {exts}"
+            )
+        if new_stem is None:
+            new_stem = sorted(decomposed)[0][1]
+    pairs = []
+    for parent_dir, stem, ext in decomposed:
+        dest_parent = dest_dir
+        if collation is FileSet.CopyCollation.any:
+            dest_parent = dest_dir / parent_dir.relative_to(fileset.parent)
+        pairs.append(
+            (parent_dir / (stem + ext), dest_parent / ((new_stem or stem) + ext))
+        )
+    return pairs
+
+
+def _transfer_file(
+    src: Path,
+    dest: Path,
+    mode: TransferMode,
+    hash_algorithm: ty.Optional[str] = None,
+    use_mmap: bool = False,
+) -> None:
+    if mode is TransferMode.hardlink:
+        try:
+            os.link(src, dest)
+        except OSError as e:
+            _check_fallback(e, src, dest, mode)
+        else:
+            return
+    elif mode is TransferMode.reflink:
+        try:
+            reflink_file(src, dest)
+        except OSError as e:
+            _check_fallback(e, src, dest, mode)
+        else:
+            return
+    if hash_algorithm is not None:
+        # Copy the file through user space instead of in the kernel, so that it can be
+        # hashed in the same pass
+        copy_file_hashed(src, dest, hash_algorithm, use_mmap=use_mmap)
+    else:
+        copy_file(src, dest)
+
+
+def _check_fallback(e: OSError, src: Path, dest: Path, mode: TransferMode) -> None:
+    if e.errno not in FALLBACK_ERRNOS:
+        raise e
+    logger.debug(
+        "Could not %s '%s' to '%s' (%s), falling back to a copy", mode, src, dest, e
+    )
@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import typing as ty
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+
+import attrs
+
+from frametree.core.exceptions import FrameTreeError
+
+logger = logging.getLogger("frametree")
+
+# Upload queues of the stores in the current process, keyed by the cache directory of
+# the store so that copies of the same store (e.g. unpickled by pydra) share a queue
+_upload_queues: ty.Dict[str, UploadQueue] = {}
+_upload_queues_lock = threading.Lock()
+
+
+def upload_queue(key: str, max_workers: int) -> UploadQueue:
+    """Returns the upload queue for a store in the current process, creating it if
+    required
+
+    Parameters
+    ----------
+    key : str
+        the key identifying the store the uploads are queued for
+    max_workers : int
+        the maximum number of uploads made at the same time
+
+    Returns
+    -------
+    UploadQueue
+        the queue for the store
+    """
+    with _upload_queues_lock:
+        queue = _upload_queues.get(key)
+        # Queues inherited from a parent process (via fork) don't have any running
+        # threads, so are replaced
+        if queue is None or queue.pid != os.getpid():
+            queue = _upload_queues[key] = UploadQueue(max_workers)
+        return queue
+
+
+@attrs.define
+class UploadQueue:
+    """Uploads items to a store in background threads, so that the items can be put
+    into the store without waiting for their upload to complete
+
+    Parameters
+    ----------
+    max_workers : int
+        the maximum number of uploads made at the same time
+    """
+
+    max_workers: int
+    pid: int = attrs.field(factory=os.getpid, init=False)
+    _executor: ThreadPoolExecutor = attrs.field(init=False, repr=False)
+    _pending: ty.Dict[str, Future[None]] = attrs.field(
+        factory=dict, init=False, repr=False
+    )
+    _errors: ty.List[ty.Tuple[str, BaseException]] = attrs.field(
+        factory=list, init=False, repr=False
+    )
+    _lock: threading.Lock = attrs.field(factory=threading.Lock, init=False, repr=False)
+
+    def __attrs_post_init__(self) -> None:
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="frametree-upload"
+        )
+
+    def submit(self, uri: str, upload: ty.Callable[[], None]) -> None:
+        """Queues an upload, after waiting for any pending upload to the same URI
+
+        Parameters
+        ----------
+        uri : str
+            the URI of the entry the item is uploaded to
+        upload : Callable
+            the function that performs the upload
+        """
+        self.wait_for(uri)
+        future = self._executor.submit(upload)
+        future.add_done_callback(lambda f: self._log_failure(uri, f))
+        with self._lock:
+            previous = self._pending.get(uri)
+            # Keep the error of the previous upload (if any) so it is still raised by
+            # ``drain`` after it is replaced
+            if previous is not None and previous.exception() is not None:
+                self._errors.append((uri, previous.exception()))
+            self._pending[uri] = future
+
+    def wait_for(self, uri: str) -> None:
+        """Waits for any pending upload to the given URI to complete. Errors are
+        raised by ``drain`` instead
+
+        Parameters
+        ----------
+        uri : str
+            the URI of the entry to wait for
+        """
+        with self._lock:
+            future = self._pending.get(uri)
+        if future is not None:
+            wait([future])
+
+    def drain(self) -> None:
+        """Waits for all pending uploads to complete
+
+        Raises
+        ------
+        FrameTreeError
+            if any of the uploads failed
+        """
+        while True:
+            with self._lock:
+                pending = dict(self._pending)
+            if not pending:
+                break
+            wait(pending.values())
+            with self._lock:
+                for uri, future in pending.items():
+                    # Uploads that have since been replaced by another upload to the
+                    # same URI have their errors recorded by ``submit``
+                    if self._pending.get(uri) is future:
+                        del self._pending[uri]
+                        if future.exception() is not None:
+                            self._errors.append((uri, future.exception()))
+        with self._lock:
+            errors, self._errors = self._errors, []
+        if errors:
+            raise FrameTreeError(
+                f"{len(errors)} background upload(s) failed:\n"
+                + "\n".join(f"    {uri}: {e}" for uri, e in errors)
+            ) from errors[0][1]
+
+    @staticmethod
+    def _log_failure(uri: str, future: Future[None]) -> None:
+        if future.exception() is not None:
+            logger.error("Upload to %s failed: %s", uri, future.exception())
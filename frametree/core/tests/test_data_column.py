@@ -7,6 +7,8 @@ from fileformats.generic import File
 from fileformats.text import TextFile
 from pydra.utils.typing import is_fileset_or_union
 
+from frametree.core.column import compile_path, compile_path_regex
+from frametree.core.entry import DataEntry
 from frametree.core.frameset.base import FrameSet
 from frametree.file_system import FileSystem
 from frametree.testing.blueprint import (
@@ -87,3 +89,83 @@ def test_column_datatype_conversion(tmp_path: Path):
     assert [p.name for p in frameset["optional_file"][ID_KEY].fspaths] == ["file2.txt"]
     assert frameset["text_field"][ID_KEY].value == "sample-text"
     assert frameset["boolean_field"][ID_KEY].value is False
+
+
+def test_column_cells_populate_rows_in_batch(dataset: FrameSet, monkeypatch):
+
+    bp = dataset.__annotations__["blueprint"]
+    fileset_bp = bp.entries[0]
+    dataset.add_source(fileset_bp.path, fileset_bp.datatype)
+
+    store_type = type(dataset.store)
+    batches = []
+    orig_populate_rows = store_type.populate_rows
+
+    def populate_rows(self, rows):
+        batches.append(len(rows))
+        orig_populate_rows(self, rows)
+
+    def populate_row_fail(self, row):
+        raise AssertionError(f"{row} should have been populated in a batch")
+
+    monkeypatch.setattr(store_type, "populate_rows", populate_rows)
+    with dataset.tree:
+        cells = list(dataset[fileset_bp.path].cells())
+        monkeypatch.setattr(store_type, "populate_row", populate_row_fail)
+        assert not any(c.is_empty for c in cells)
+        # Rows are only populated once
+        list(dataset[fileset_bp.path].cells())
+    assert batches == [reduce(mul, bp.dim_lengths)]
+
+
+def test_column_cells_cached(dataset: FrameSet, monkeypatch):
+
+    bp = dataset.__annotations__["blueprint"]
+    fileset_bp = bp.entries[0]
+    dataset.add_source(fileset_bp.path, fileset_bp.datatype)
+    column = dataset[fileset_bp.path]
+    matched = []
+    match_entry = type(column).match_entry
+
+    def counted_match_entry(self, row, **kwargs):
+        matched.append(row.id)
+        return match_entry(self, row, **kwargs)
+
+    monkeypatch.setattr(type(column), "match_entry", counted_match_entry)
+    with dataset.tree:
+        cells = list(column.cells())
+        assert len(matched) == len(cells)
+        # The entries are matched against the column once in a single pass over the
+        # rows and then looked up in the column's index
+        matched.clear()
+        for row in dataset.rows(column.row_frequency):
+            row._cells.clear()
+        assert [c.entry for c in column.cells()] == [c.entry for c in cells]
+        assert [c.entry for c in column.cells()] == [c.entry for c in cells]
+        assert not matched
+        assert cells[1].row.cell(fileset_bp.path).entry is cells[1].entry
+
+        # Adding an entry to a row invalidates its cells, but not those of other rows
+        row = cells[0].row
+        row.found_entry(
+            path="new-entry", datatype=fileset_bp.datatype, uri="new-entry-uri"
+        )
+        assert [c.entry for c in column.cells()] == [c.entry for c in cells]
+        assert matched == [row.id]
+        assert row.cell(fileset_bp.path) is not cells[0]
+
+
+def test_path_matching_precompiled():
+
+    entry = DataEntry(
+        path="anat/T1w.nii@an_analysis", datatype=File, row=None, uri="dummy"
+    )
+    assert entry.path_parts == ("anat", "T1w", "nii")
+    assert entry.base_path == "anat/T1w.nii"
+    assert entry.dataset_name == "an_analysis"
+    assert compile_path("anat/T1w@an_analysis") == (("anat", "T1w"), "an_analysis")
+    assert compile_path("anat/T1w@an_analysis") is compile_path("anat/T1w@an_analysis")
+    pattern = compile_path_regex(r"anat/T\dw")
+    assert pattern.match("anat/T1w.nii")
+    assert pattern.match("anat/T1w/dir")
+    assert not pattern.match("anat/T1wx")
@@ -1,17 +1,28 @@
+import os
+import time
+import typing as ty
 from pathlib import Path
 
+import pytest
 from fileformats.extras.testing import EncodedToTextConverter
 from fileformats.testing import EncodedText
 from fileformats.text import TextFile
 from pydra.compose import python
 
+from frametree.core.entry import DataEntry
+from frametree.core.exceptions import FrameTreeError, FrameTreeUsageError
 from frametree.core.frameset.base import FrameSet
-from frametree.core.pipeline import RuntimeConverterWorkflow
+from frametree.core.pipeline import (
+    Pipeline,
+    PipelineStackWorkflow,
+    RuntimeConverterWorkflow,
+)
 from frametree.core.store.base import Store
 from frametree.file_system import FileSystem
-from frametree.testing import TestAxes
+from frametree.testing import MockRemote, TestAxes
 from frametree.testing.blueprint import FileSetEntryBlueprint as FileBP
 from frametree.testing.blueprint import TestDatasetBlueprint
+from frametree.testing.tasks import Reverse
 
 
 @python.define(outputs=["out_file"])
@@ -77,3 +88,249 @@ def test_pipeline_union_column_datatype(
 
     out = next(iter(frameset.derive("out", cache_dir=work_dir / "cache")[0]))
     assert out.raw_contents == "file.txt"
+
+
+@pytest.fixture
+def make_reversed_frameset(work_dir: Path) -> ty.Callable[..., FrameSet]:
+    """Makes framesets with a 'file' source column, which is reversed into the
+    'reversed' sink column and then restored into the 'restored' sink column by a chain
+    of two pipelines"""
+
+    def make(
+        store: ty.Optional[Store] = None,
+        name: str = "dataset",
+        hierarchy: ty.Sequence[str] = ("abcd",),
+        dim_lengths: ty.Sequence[int] = (1, 1, 1, 3),
+    ) -> FrameSet:
+        bp = TestDatasetBlueprint(
+            hierarchy=list(hierarchy),
+            axes=TestAxes,
+            dim_lengths=list(dim_lengths),
+            entries=[
+                FileBP(path="file", datatype=TextFile, filenames=["file.txt"]),
+            ],
+        )
+        if store is None:
+            frameset = bp.make_dataset(FileSystem(), str(work_dir / name))
+        else:
+            frameset = bp.make_dataset(store, name)
+        frameset.add_source("file", TextFile)
+        frameset.add_sink("reversed", TextFile)
+        frameset.add_sink("restored", TextFile)
+        frameset.apply(
+            "reverse",
+            Reverse(),
+            inputs=[("file", "in_file")],
+            outputs=[("reversed", "out_file")],
+        )
+        frameset.apply(
+            "restore",
+            Reverse(),
+            inputs=[("reversed", "in_file")],
+            outputs=[("restored", "out_file")],
+        )
+        return frameset
+
+    return make
+
+
+def test_derive_async_uploads(
+    delayed_mock_remote: MockRemote,
+    make_reversed_frameset: ty.Callable[..., FrameSet],
+    work_dir: Path,
+    monkeypatch: pytest.MonkeyPatch,
+):
+
+    delayed_mock_remote.async_uploads = True
+    frameset = make_reversed_frameset(
+        delayed_mock_remote, "derive_async_uploads", dim_lengths=[1, 1, 1, 2]
+    )
+    frameset.save()
+    upload_files = MockRemote.upload_files
+
+    def failing_upload_files(
+        self: MockRemote, cache_path: Path, entry: DataEntry
+    ) -> None:
+        if "d1" in str(entry.uri):
+            raise ConnectionError("connection reset")
+        upload_files(self, cache_path, entry)
+
+    monkeypatch.setattr(MockRemote, "upload_files", failing_upload_files)
+    # Uploads made by one worker process can't be waited for by the others unless
+    # the rows are processed in chunks
+    with pytest.raises(FrameTreeUsageError, match="rows_per_job"):
+        frameset.derive("reversed", cache_dir=work_dir / "cache", worker="cf")
+    # Failed uploads are raised once all the uploads have been waited for
+    with pytest.raises(FrameTreeError, match="connection reset"):
+        frameset.derive("reversed", cache_dir=work_dir / "cache")
+    uploaded = frameset.row("abcd", "a0b0c0d0")["reversed"]
+    assert uploaded.raw_contents == "txt.elif"
+
+
+def test_derive_incremental(
+    make_reversed_frameset: ty.Callable[..., FrameSet], work_dir: Path, tmp_path: Path
+):
+
+    frameset = make_reversed_frameset()
+    frameset.derive("reversed", cache_dir=work_dir / "cache1")
+
+    def outputs() -> dict[str, str]:
+        return {r.id: r["reversed"].raw_contents for r in frameset.rows("abcd")}
+
+    assert outputs() == {
+        "a0b0c0d0": "txt.elif",
+        "a0b0c0d1": "txt.elif",
+        "a0b0c0d2": "txt.elif",
+    }
+    row0, row1, row2 = frameset.rows("abcd")
+    provenance = frameset.store.get_provenance(row0.cell("reversed").entry)
+    assert provenance["hash"]
+    # Change the input of the first row, and the output of the second row outside of
+    # the pipeline, which should both be detected and rederived
+    row0["file"].fspath.write_text("changed")
+    sentinel = tmp_path / "sentinel.txt"
+    sentinel.write_text("sentinel")
+    row1["reversed"] = TextFile(sentinel)
+    # Remove the output of the third row so it is repaired
+    row2["reversed"].fspath.unlink()
+    frameset.derive("reversed", cache_dir=work_dir / "cache2")
+    assert outputs() == {
+        "a0b0c0d0": "degnahc",
+        "a0b0c0d1": "txt.elif",
+        "a0b0c0d2": "txt.elif",
+    }
+
+
+def test_derive_unchanged_not_rehashed(
+    make_reversed_frameset: ty.Callable[..., FrameSet],
+    work_dir: Path,
+    monkeypatch: pytest.MonkeyPatch,
+):
+
+    frameset = make_reversed_frameset()
+    frameset.derive("reversed", cache_dir=work_dir / "cache1")
+    # Backdate the files so their modification times can be relied on to detect
+    # changes (i.e. as if they hadn't been written just now)
+    backdated = time.time() - 60
+    for path in Path(frameset.id).rglob("*"):
+        os.utime(path, (backdated, backdated))
+    # The change tokens are recorded the first time the outputs are checked
+    frameset.derive("reversed", cache_dir=work_dir / "cache2")
+
+    def item_checksums(self: Store, entry: DataEntry) -> ty.Dict[str, ty.Any]:
+        raise AssertionError(f"{entry.path} was hashed again")
+
+    monkeypatch.setattr(FileSystem, "item_checksums", item_checksums)
+    frameset.derive("reversed", cache_dir=work_dir / "cache3")
+    # Changed inputs are still detected from their tokens
+    monkeypatch.undo()
+    frameset.row("abcd", "a0b0c0d0")["file"].fspath.write_text("changed")
+    frameset.derive("reversed", cache_dir=work_dir / "cache4")
+    assert frameset.row("abcd", "a0b0c0d0")["reversed"].raw_contents == "degnahc"
+
+
+@python.define(outputs=["out_file"])
+def Concatenate(in_files: list[TextFile]) -> TextFile:
+    out_file = Path("concatenated.txt").absolute()
+    out_file.write_text("\n".join(f.raw_contents for f in in_files))
+    return TextFile(out_file)
+
+
+def test_derive_stack(
+    make_reversed_frameset: ty.Callable[..., FrameSet], work_dir: Path
+):
+
+    frameset = make_reversed_frameset(
+        hierarchy=["a", "b", "c", "abcd"], dim_lengths=[2, 1, 1, 2]
+    )
+    frameset.add_sink("summary", TextFile, row_frequency="a")
+    frameset.apply(
+        "summarise",
+        Concatenate(),
+        inputs=[("restored", "in_files")],
+        outputs=[("summary", "out_file")],
+        row_frequency="a",
+    )
+    # The chained pipelines of the same row frequency are run for each row in turn,
+    # and only the summary pipeline waits for all of the rows
+    stages = [frameset.pipelines[n] for n in ("reverse", "restore", "summarise")]
+    wf = PipelineStackWorkflow(frameset=frameset, stages=stages)
+    node_names = [n.name for n in wf.construct().nodes]
+    assert node_names[:4] == ["to_process0", "per_row0", "to_process1", "per_row1"]
+    # The requested IDs are mapped onto the related rows of the upstream pipelines
+    with frameset.tree:
+        assert Pipeline.stack_ids(stages, [frameset["summary"]], ["a1"]) == [
+            ["a1b0c0d0", "a1b0c0d1"],
+            ["a1b0c0d0", "a1b0c0d1"],
+            ["a1"],
+        ]
+    frameset.derive("restored", ids=["a0b0c0d1"], cache_dir=work_dir / "cache")
+    assert [r.id for r in frameset.rows("abcd") if r.cell("restored").is_empty] == [
+        "a0b0c0d0",
+        "a1b0c0d0",
+        "a1b0c0d1",
+    ]
+    # The summary pipeline is run once the rows it summarises have been derived by
+    # the upstream pipelines within the same workflow
+    frameset.derive("summary", ids=["a1"], cache_dir=work_dir / "cache")
+    assert frameset.row("a", "a0").cell("summary").is_empty
+    assert frameset.row("a", "a1")["summary"].raw_contents == "file.txt\nfile.txt"
+    assert frameset.row("abcd", "a0b0c0d0").cell("restored").is_empty
+    frameset.derive("restored", cache_dir=work_dir / "cache")
+    for row in frameset.rows("abcd"):
+        assert row["reversed"].raw_contents == "txt.elif"
+        assert row["restored"].raw_contents == "file.txt"
+    # Rows are passed into the chain at the first pipeline with outputs to derive, so
+    # only the downstream pipeline is rerun when its output is removed
+    row0 = frameset.row("abcd", "a0b0c0d0")
+    reversed_mtime = row0["reversed"].fspath.stat().st_mtime_ns
+    row0["restored"].fspath.unlink()
+    # and both pipelines are rerun when the input is changed
+    row1 = frameset.row("abcd", "a0b0c0d1")
+    row1["file"].fspath.write_text("changed")
+    frameset.derive("restored", cache_dir=work_dir / "cache2")
+    assert row0["reversed"].fspath.stat().st_mtime_ns == reversed_mtime
+    assert row0["restored"].raw_contents == "file.txt"
+    assert row1["reversed"].raw_contents == "degnahc"
+    assert row1["restored"].raw_contents == "changed"
+    # The summaries of the rows that have changed are rederived, including when the
+    # rows are processed in chunks
+    frameset.derive("summary", cache_dir=work_dir / "cache3", rows_per_job=2)
+    assert frameset.row("a", "a0")["summary"].raw_contents == "file.txt\nchanged"
+    assert frameset.row("a", "a1")["summary"].raw_contents == "file.txt\nfile.txt"
+
+
+def test_derive_rows_per_job(
+    make_reversed_frameset: ty.Callable[..., FrameSet],
+    work_dir: Path,
+    caplog: pytest.LogCaptureFixture,
+):
+
+    frameset = make_reversed_frameset(dim_lengths=[1, 1, 1, 5])
+    # Remove the input of one of the rows so that it fails to be processed
+    frameset.row("abcd", "a0b0c0d3")["file"].fspath.unlink()
+    with frameset.tree:
+        outputs = frameset.pipelines["reverse"](rows_per_job=2, row_workers=2)(
+            cache_root=work_dir / "cache1"
+        )
+    assert sorted(outputs.processed) == [
+        "a0b0c0d0",
+        "a0b0c0d1",
+        "a0b0c0d2",
+        "a0b0c0d4",
+    ]
+    assert outputs.failed == ["a0b0c0d3"]
+    assert not outputs.cant_process
+    # The failed row doesn't stop the other rows from being passed through the chain,
+    # but is raised once they have been
+    with pytest.raises(FrameTreeError, match="a0b0c0d3"):
+        frameset.derive("restored", cache_dir=work_dir / "cache2", rows_per_job=3)
+    for row in frameset.rows("abcd"):
+        if row.id == "a0b0c0d3":
+            assert row.cell("restored").is_empty
+        else:
+            assert row["reversed"].raw_contents == "txt.elif"
+            assert row["restored"].raw_contents == "file.txt"
+    # The errors of the failed rows are logged with their tracebacks
+    failures = [r for r in caplog.records if "a0b0c0d3 row failed" in r.getMessage()]
+    assert failures and all(r.exc_info for r in failures)
@@ -1,5 +1,8 @@
+import pickle
+
 from pydra.utils.hash import hash_single, Cache
 from fileformats.generic import File
+from fileformats.text import Plain as PlainText
 from frametree.testing import MockRemote
 from frametree.core.frameset import FrameSet
 
@@ -13,3 +16,38 @@ def test_row_hash(saved_dataset: FrameSet) -> None:
     row.create_entry("dummy", File)
     hsh2 = hash_single(row, Cache())
     assert hsh2 == hsh, "Hash should not change after adding an entry to the row."
+
+
+def test_row_snapshot(saved_dataset: FrameSet) -> None:
+    """Test that rows can be restored from snapshots without scanning the tree"""
+    saved_dataset.add_source("file1", PlainText)
+    with saved_dataset.tree:
+        row = next(iter(saved_dataset.rows()))
+        expected = row["file1"].raw_contents
+        snapshot = pickle.loads(pickle.dumps(row.snapshot()))
+    frameset = pickle.loads(pickle.dumps(saved_dataset))
+    restored = snapshot.restore(frameset)
+    assert restored.id == row.id
+    assert restored.populated
+    assert restored["file1"].raw_contents == expected
+    assert frameset.tree.root is None, "tree shouldn't be scanned to restore the row"
+
+
+def test_row_snapshot_related(saved_dataset: FrameSet) -> None:
+    """Test that the related rows included in a snapshot are restored with it, so
+    they don't need to be looked up in the tree"""
+    parent_freq = saved_dataset.parse_frequency(saved_dataset.hierarchy[0])
+    leaf_freq = max(saved_dataset.axes)
+    with saved_dataset.tree:
+        row = next(iter(saved_dataset.rows(parent_freq)))
+        related = row.related_rows(leaf_freq)
+        assert related
+        assert all(r.ids[parent_freq] == row.id for r in related)
+        assert [p.id for r in related for p in r.related_rows(parent_freq)] == [
+            row.id
+        ] * len(related)
+        snapshot = pickle.loads(pickle.dumps(row.snapshot(related=[leaf_freq])))
+    frameset = pickle.loads(pickle.dumps(saved_dataset))
+    restored = snapshot.restore(frameset)
+    assert [r.id for r in restored.related_rows(leaf_freq)] == [r.id for r in related]
+    assert frameset.tree.root is None, "tree shouldn't be scanned for related rows"
@@ -1,4 +1,6 @@
 from __future__ import annotations
+import os
+import time
 from operator import itemgetter
 import pytest
 import typing as ty
@@ -281,3 +283,92 @@ def test_auto_ids(work_dir, fixture):
 
     for key, ids in expected.items():
         assert sorted(dataset.row_ids(key)) == ids
+
+
+def test_tree_index(work_dir, monkeypatch):
+
+    blueprint = TestDatasetBlueprint(  # dataset name
+        axes=TestAxes,
+        hierarchy=["a", "b", "c", "abcd"],
+        dim_lengths=[1, 2, 3, 4],
+        entries=[
+            FileSetEntryBlueprint(
+                path="file1", datatype=TextFile, filenames=["file1.txt"]
+            ),
+        ],
+        id_patterns={"d": r"abcd::.*(d\d+)"},
+    )
+    dataset_path = work_dir / "tree-index"
+    blueprint.make_dataset(store=FileSystem(), dataset_id=dataset_path)
+    (dataset_path / FileSystem.FRAMETREE_DIR).mkdir(exist_ok=True)
+
+    def backdate_mtimes():
+        # Push modification times outside the window in which they are considered
+        # too recent to be relied on
+        mtime = time.time() - 60
+        for path in [dataset_path, *dataset_path.rglob("*")]:
+            os.utime(path, (mtime, mtime))
+
+    def load_dataset():
+        return FileSystem().define_frameset(
+            dataset_path,
+            axes=TestAxes,
+            hierarchy=blueprint.hierarchy,
+            id_patterns=blueprint.id_patterns,
+        )
+
+    backdate_mtimes()
+    dataset = load_dataset()
+    expected_ids = sorted(dataset.row_ids())
+    with dataset.tree:
+        # Populate the entries of the rows so they are saved in the index
+        expected_entries = {
+            r.id: sorted((e.path, e.uri) for e in r.entries) for r in dataset.rows()
+        }
+    assert all(expected_entries.values())
+    assert dataset.store._tree_index_path(dataset.id).exists()
+
+    def scan_fail(*args, **kwargs):
+        raise AssertionError("Dataset should be loaded from the tree index")
+
+    with monkeypatch.context() as m:
+        m.setattr(FileSystem, "_scan_row", scan_fail)
+        m.setattr(os, "walk", scan_fail)
+        dataset = load_dataset()
+        assert sorted(dataset.row_ids()) == expected_ids
+        assert {
+            r.id: sorted((e.path, e.uri) for e in r.entries) for r in dataset.rows()
+        } == expected_entries
+
+    # Adding a new leaf directory invalidates the index
+    new_leaf = dataset_path / "a0" / "b0" / "c0" / "a0b0c0d4"
+    new_leaf.mkdir()
+    dataset = load_dataset()
+    assert sorted(dataset.row_ids()) == sorted(expected_ids + ["a0b0c0d4"])
+
+
+def test_scan_skips_special_dirs(work_dir):
+
+    blueprint = TestDatasetBlueprint(  # dataset name
+        axes=TestAxes,
+        hierarchy=["a", "b", "c", "abcd"],
+        dim_lengths=[1, 2, 3, 4],
+        entries=[
+            FileSetEntryBlueprint(
+                path="file1", datatype=TextFile, filenames=["file1.txt"]
+            ),
+        ],
+        id_patterns={"d": r"abcd::.*(d\d+)"},
+    )
+    dataset_path = work_dir / "special-dirs"
+    dataset = blueprint.make_dataset(store=FileSystem(), dataset_id=dataset_path)
+    expected_ids = sorted(dataset.row_ids())
+    for special_dir in (".hidden", "__pycache__", "~backup"):
+        (dataset_path / "a0" / "b0" / special_dir / "a0b0c0d9").mkdir(parents=True)
+    dataset = FileSystem().define_frameset(
+        dataset_path,
+        axes=TestAxes,
+        hierarchy=blueprint.hierarchy,
+        id_patterns=blueprint.id_patterns,
+    )
+    assert sorted(dataset.row_ids()) == expected_ids
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import functools
 import logging
 import re
 import typing as ty
@@ -8,7 +9,7 @@ from collections import defaultdict
 import attrs
 
 from frametree.core.axes import Axes
-from frametree.core.exceptions import FrameTreeConstructionError, FrameTreeNameError
+from frametree.core.exceptions import FrameTreeConstructionError
 from frametree.core.utils import NestedContext
 
 from .row import DataRow
@@ -24,11 +25,28 @@ def auto_ids_default():
     return defaultdict(dict)
 
 
+@functools.lru_cache(maxsize=None)
+def frequency_diff(frequency: Axes, parent: Axes) -> Axes:
+    """The axes of `frequency` that aren't covered by `parent` (cached as it is
+    evaluated for every parent of every row added to the tree)"""
+    return (frequency ^ parent) & frequency
+
+
+@functools.lru_cache(maxsize=None)
+def ancestor_frequencies(frequency: Axes) -> ty.FrozenSet[Axes]:
+    """The frequencies that are parents of, or equal to, `frequency`"""
+    return frozenset(
+        f for f in type(frequency) if f.is_parent(frequency, if_match=True)
+    )
+
+
 @attrs.define
 class DataTree(NestedContext):
 
     frameset: ty.Optional[FrameSet] = None
     root: ty.Optional[DataRow] = None
+    # Store-specific snapshot of the scanned tree (see ``Store.load_tree_index``)
+    index: ty.Any = attrs.field(default=None, repr=False)
     _auto_ids: ty.Dict[ty.Tuple[str, ...], ty.Dict[str, int]] = attrs.field(
         factory=auto_ids_default
     )
@@ -36,9 +54,19 @@ class DataTree(NestedContext):
     def enter(self):
         assert self.root is None
         self._set_root()
-        self.frameset.store.populate_tree(self)
+        store = self.frameset.store
+        if self.index is not None:
+            # Save any updates made to the index since the tree was last exited (e.g.
+            # the entries found when populating rows outside of the tree context)
+            store.save_tree_index(self)
+            self.index = None
+        if not store.load_tree_index(self):
+            store.populate_tree(self)
 
     def exit(self):
+        # The index is kept after the tree is exited so that rows can continue to
+        # update it while they are populated
+        self.frameset.store.save_tree_index(self)
         self.root = None
 
     @property
@@ -218,6 +246,29 @@ class DataTree(NestedContext):
             row_frequency=self.frameset.axes.leaf(),
         )
 
+    def restore_leaf(self, ids: ty.Dict[str, ty.Union[str, ty.Tuple[str, ...], None]]):
+        """Adds a leaf row whose IDs have already been resolved by a previous call to
+        ``add_leaf``, e.g. when restoring the data tree from an index saved by the store.
+        The inclusion/exclusion criteria and ID inference are not reapplied.
+
+        Parameters
+        ----------
+        ids : dict[str, str or tuple[str, ...] or None]
+            the IDs of the leaf row for each frequency in the data space, keyed by the
+            frequency name
+
+        Returns
+        -------
+        row : DataRow
+            the added row
+        """
+        if self.root is None:
+            self._set_root()
+        axes = self.frameset.axes
+        return self._add_row(
+            ids={axes[f]: i for f, i in ids.items()}, row_frequency=max(axes)
+        )
+
     def _add_row(self, ids: ty.Dict[Axes, str], row_frequency):
         """Adds a row to the dataset, creating all parent "aggregate" rows
         (e.g. for each subject, group or visit) where required
@@ -235,7 +286,8 @@ class DataTree(NestedContext):
             If inserting a multiple IDs of the same class within the tree if
             one of their ids is None
         """
-        row_frequency = self.frameset.parse_frequency(row_frequency)
+        if not isinstance(row_frequency, self.frameset.axes):
+            row_frequency = self.frameset.parse_frequency(row_frequency)
         row = DataRow(ids=ids, frequency=row_frequency, frameset=self.frameset)
         # Create new data row
         try:
@@ -258,19 +310,18 @@ class DataTree(NestedContext):
         for parent_freq, parent_id in row.ids.items():
             if not parent_freq:
                 continue  # Don't need to insert root row again
-            diff_freq = (row.frequency ^ parent_freq) & row.frequency
+            diff_freq = frequency_diff(row_frequency, parent_freq)
             if diff_freq:
+                # Look up the parent row directly instead of via `FrameSet.row`, which
+                # formats an error message listing all row IDs on every miss
                 try:
-                    parent_row = self.frameset.row(frequency=parent_freq, id=parent_id)
-                except FrameTreeNameError:
-                    parent_ids = {
-                        f: i
-                        for f, i in row.ids.items()
-                        if f.is_parent(parent_freq, if_match=True)
-                    }
+                    parent_row = self.root.children[parent_freq][parent_id]
+                except KeyError:
+                    ancestors = ancestor_frequencies(parent_freq)
+                    parent_ids = {f: i for f, i in row.ids.items() if f in ancestors}
                     parent_row = self._add_row(parent_ids, parent_freq)
                 # Set reference to level row in new row
-                diff_id = row.frequency_id(diff_freq)
+                diff_id = row.ids[diff_freq]
                 try:
                     children_dict = parent_row.children[row_frequency]
                 except KeyError:
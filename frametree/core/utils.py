@@ -8,8 +8,10 @@ import operator
 import os.path
 import re
 import subprocess as sp
+import threading
 import traceback
 import typing as ty
+import weakref
 from collections.abc import Iterable
 from contextlib import contextmanager
 from pathlib import Path
@@ -46,6 +48,12 @@ FRAMETREE_PIP = "git+ssh://git@github.com/australian-imaging-service/frametree.g
 
 HASH_CHUNK_SIZE = 2**20  # 1MB in calc. checksums to avoid mem. issues
 
+# Locks guarding the depths of nested contexts, keyed by the ID of the context. They
+# are kept outside of the contexts themselves so that the contexts can still be
+# pickled (e.g. along with the stores they belong to)
+_nested_context_locks: ty.Dict[int, threading.RLock] = {}
+_nested_context_locks_guard = threading.Lock()
+
 
 @attrs.define
 class NestedContext:
@@ -70,9 +78,17 @@ class NestedContext:
         # methods that need connections, and therefore control their
         # own connection, in batches using the same connection by
         # placing the groupedvisit calls within an outer context.
-        self.depth += 1
-        if self.depth == 1:
-            self.enter()
+        # The depth is updated under a lock so that the context can be entered from
+        # multiple threads at once (e.g. ``FrameSet.prefetch``), with any threads
+        # entering it while it is being set up waiting until it is ready
+        with self._depth_lock():
+            self.depth += 1
+            if self.depth == 1:
+                try:
+                    self.enter()
+                except BaseException:
+                    self.depth -= 1
+                    raise
         return self
 
     def __exit__(
@@ -81,9 +97,10 @@ class NestedContext:
         exception_value: ty.Optional[BaseException],
         traceback: ty.Optional[TracebackType],
     ) -> None:
-        self.depth -= 1
-        if self.depth == 0:
-            self.exit()
+        with self._depth_lock():
+            self.depth -= 1
+            if self.depth == 0:
+                self.exit()
 
     def enter(self) -> None:
         "To be overridden in subclasses as necessary"
@@ -93,6 +110,16 @@ class NestedContext:
         "To be overridden in subclasses as necessary"
         pass
 
+    def _depth_lock(self) -> threading.RLock:
+        key = id(self)
+        with _nested_context_locks_guard:
+            try:
+                return _nested_context_locks[key]
+            except KeyError:
+                lock = _nested_context_locks[key] = threading.RLock()
+                weakref.finalize(self, _nested_context_locks.pop, key, None)
+                return lock
+
 
 def get_home_dir() -> Path:
     try:
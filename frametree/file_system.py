@@ -4,7 +4,9 @@ import json
 import logging
 import os
 import re
+import time
 import typing as ty
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import attrs
@@ -15,6 +17,7 @@ from frametree.core.entry import DataEntry
 from frametree.core.exceptions import FrameTreeUsageError
 from frametree.core.row import DataRow
 from frametree.core.store import LocalStore
+from frametree.core.store.transfer import TransferMode, transfer_fileset
 from frametree.core.tree import DataTree
 from frametree.core.utils import full_path
 
@@ -30,21 +33,78 @@ logger = logging.getLogger("frametree")
 special_dir_re = re.compile(r"(__.*__$|\..*|~.*)")
 
 
+@attrs.define
+class TreeIndex:
+    """A snapshot of the directories (and the entries within them) found when scanning
+    a file-system dataset, which is saved within the dataset so that the data tree can
+    be rebuilt without rescanning it
+
+    Parameters
+    ----------
+    hierarchy : list[str]
+        the hierarchy of the data tree the dataset was scanned with
+    mtimes : dict[str, int]
+        modification times (in ns) of the directories above the leaf layer, relative
+        to the dataset root, at the time of the scan. Rows that are added or removed
+        change the modification time of their parent directory, invalidating the index
+    leaves : list[list[str]]
+        the tree paths of all leaf directories found in the scan
+    definition : dict[str, Any]
+        the parts of the frameset definition that were used to resolve the IDs of the
+        leaves (i.e. axes, ID patterns and inclusion/exclusion criteria)
+    ids : list[dict[str, Any]]
+        the resolved IDs of the included leaf rows in the order they were added
+    rows : dict[str, dict[str, Any]]
+        the entries found in each row that has been populated, keyed by the relative
+        path to the row, along with the modification times of the directories and
+        files they were found in
+    """
+
+    hierarchy: ty.List[str]
+    mtimes: ty.Dict[str, ty.Optional[int]]
+    leaves: ty.List[ty.List[str]]
+    definition: ty.Dict[str, ty.Any]
+    ids: ty.List[ty.Dict[str, ty.Any]]
+    rows: ty.Dict[str, ty.Dict[str, ty.Any]] = attrs.field(factory=dict)
+    # Whether the index has been updated since it was loaded/saved (not persisted)
+    modified: bool = attrs.field(default=False, eq=False)
+
+    def asdict(self) -> ty.Dict[str, ty.Any]:
+        return attrs.asdict(self, filter=lambda a, _: a.name != "modified")
+
+
 @attrs.define
 class FileSystem(LocalStore):
     """
     A Repository class for data stored hierarchically within sub-directories
     of a file-system directory. The depth and which layer in the data tree
     the sub-directories correspond to is defined by the `hierarchy` argument.
+
+    Parameters
+    ----------
+    transfer_mode : TransferMode or str
+        how file-sets are transferred into the store (i.e. copy, hardlink, reflink,
+        symlink or move), by default they are copied
     """
 
     PROV_SUFFIX = ".provenance"
     FIELDS_FNAME = "__fields__.json"
     FIELDS_PROV_FNAME = "__fields_provenance__.json"
+    TREE_INDEX_FNAME = ".tree-index.json"
+    # Modification times within this many seconds of a scan can't be relied on to
+    # detect subsequent changes, as file-system timestamps are updated with a coarse
+    # granularity, so anything this fresh is left out of the tree index
+    RACY_MTIME_WINDOW = 2.0
+    # Number of threads used to scan the sub-trees under the top-level directories
+    # of the dataset, and the directories of rows, in parallel
+    MAX_SCAN_WORKERS = 8
 
     # Note this name will be constant, as there is only ever one store,
     # which covers whole FS
     name: str = "file_system"
+    transfer_mode: TransferMode = attrs.field(
+        default=TransferMode.copy, converter=TransferMode.cast
+    )
 
     #################################
     # Abstract-method implementations
@@ -64,14 +124,19 @@ class FileSystem(LocalStore):
                 f"Could not find a directory at '{tree.dataset_id}' to be the "
                 "root row of the dataset"
             )
-        dpaths = sorted(d for d, _, _ in os.walk(tree.dataset_id))
-        for dpath in dpaths:
-            tree_path = tuple(Path(dpath).relative_to(tree.dataset_id).parts)
-            if len(tree_path) != len(tree.hierarchy):
-                continue
-            if self.FRAMETREE_DIR in tree_path:
-                continue
+        scan_time = time.time_ns()
+        leaves, mtimes = self._scan_tree_dirs(tree.dataset_id, len(tree.hierarchy))
+        for tree_path in leaves:
             tree.add_leaf(tree_path)
+        if not self._is_racy(mtimes, scan_time):
+            tree.index = TreeIndex(
+                hierarchy=list(tree.hierarchy),
+                mtimes=mtimes,
+                leaves=[list(p) for p in leaves],
+                definition=self._tree_index_definition(tree),
+                ids=self._tree_index_ids(tree),
+                modified=True,
+            )
 
     def populate_row(self, row: DataRow) -> None:
         """Scans the node in the data tree corresponding to the data row and populates
@@ -82,59 +147,114 @@ class FileSystem(LocalStore):
         row : DataRow
             the data row to populate
         """
-
-        def filter_entry_dir(entry_dir: Path) -> ty.Iterator[Path]:
-            for subpath in entry_dir.iterdir():
-                entry_name = subpath.name
-                if (
-                    not entry_name.startswith(".")
-                    and entry_name != self.FRAMETREE_DIR
-                    and entry_name
-                    not in (
-                        self.FIELDS_FNAME,
-                        self.FIELDS_PROV_FNAME,
-                        self.FIELDS_FNAME + self.LOCK_SUFFIX,
-                    )
-                    and not entry_name.endswith(self.PROV_SUFFIX)
-                ):
-                    yield subpath
-
-        root_dir = full_path(row.frameset.id)
-
-        # Iterate through all directories saved for the source and dataset derivatives
-        for dataset_name in self._row_dataset_names(row):
-            row_dir = root_dir / self._row_relpath(row, dataset_name=dataset_name)
-            if row_dir.exists():
-                # Filter contents of directory to omit fields JSON and provenance and
-                # add file-set entries
-                for entry_fspath in filter_entry_dir(row_dir):
-                    path = str(entry_fspath.relative_to(row_dir))
-                    if dataset_name is not None:
-                        path += "@" + dataset_name
+        index = row.frameset.tree.index
+        row_key = str(self._row_relpath(row))
+        if index is not None:
+            cached = index.rows.get(row_key)
+            if cached and self._mtimes_match(row.frameset.id, cached["mtimes"]):
+                for path, datatype, uri in cached["entries"]:
                     row.found_entry(
                         path=path,
-                        datatype=FileSet,
-                        uri=str(entry_fspath.relative_to(root_dir)),
+                        datatype=FileSet if datatype == "fileset" else Field,
+                        uri=uri,
                     )
-                # Add field entries
-                fields_json = row_dir / self.FIELDS_FNAME
-                try:
-                    with open(fields_json) as f:
-                        fields_dict = json.load(f)
-                except FileNotFoundError:
-                    pass
-                else:
-                    for name in fields_dict:
-                        path = (
-                            f"{name}@{dataset_name}"
-                            if dataset_name is not None
-                            else name
-                        )
-                        row.found_entry(
-                            path=path,
-                            datatype=Field,
-                            uri=str(fields_json.relative_to(root_dir)) + "::" + name,
-                        )
+                return
+        scan_time = time.time_ns()
+        entries, mtimes = self._scan_row(row)
+        for path, datatype, uri in entries:
+            row.found_entry(
+                path=path,
+                datatype=FileSet if datatype == "fileset" else Field,
+                uri=uri,
+            )
+        if index is not None and not self._is_racy(mtimes, scan_time):
+            index.rows[row_key] = {"mtimes": mtimes, "entries": entries}
+            index.modified = True
+
+    def populate_rows(self, rows: ty.Sequence[DataRow]) -> None:
+        """Populates the rows in parallel, as scanning each row is mostly spent
+        waiting on file-system metadata calls (e.g. on network file systems)
+
+        Parameters
+        ----------
+        rows : Sequence[DataRow]
+            the rows to populate with entries
+        """
+        if len(rows) < 2:
+            super().populate_rows(rows)
+            return
+        with ThreadPoolExecutor(
+            max_workers=min(self.MAX_SCAN_WORKERS, len(rows))
+        ) as executor:
+            list(executor.map(self.populate_row, rows))
+
+    def load_tree_index(self, tree: DataTree) -> bool:
+        """Populates the data tree from the index saved in the dataset's
+        ``__frametree__`` directory, provided that none of the directories above the
+        leaf layer have been modified since it was saved
+
+        Parameters
+        ----------
+        tree : DataTree
+            the tree to populate
+
+        Returns
+        -------
+        loaded : bool
+            whether the tree was populated from the saved index
+        """
+        try:
+            with open(self._tree_index_path(tree.dataset_id)) as f:
+                index = TreeIndex(**json.load(f))
+        except (OSError, ValueError, TypeError):
+            return False
+        if index.hierarchy != list(tree.hierarchy) or not self._mtimes_match(
+            tree.dataset_id, index.mtimes
+        ):
+            logger.debug("Tree index of '%s' is out of date", tree.dataset_id)
+            return False
+        if index.definition == self._tree_index_definition(tree):
+            for ids in index.ids:
+                tree.restore_leaf(
+                    {f: tuple(i) if isinstance(i, list) else i for f, i in ids.items()}
+                )
+        else:
+            # The IDs need to be resolved again as the frameset definition has changed
+            for tree_path in index.leaves:
+                tree.add_leaf(tree_path)
+            index.definition = self._tree_index_definition(tree)
+            index.ids = self._tree_index_ids(tree)
+            index.modified = True
+        tree.index = index
+        return True
+
+    def save_tree_index(self, tree: DataTree) -> None:
+        """Saves the index of the data tree, along with the entries found in rows that
+        have been populated, into the dataset's ``__frametree__`` directory
+
+        Parameters
+        ----------
+        tree : DataTree
+            the tree to save the index of
+        """
+        index = tree.index
+        if index is None or not index.modified:
+            return
+        index_path = self._tree_index_path(tree.dataset_id)
+        if not index_path.parent.exists():
+            # Creating the directory modifies the dataset root, which invalidates the
+            # index, so it will be saved the next time the tree is scanned instead
+            try:
+                index_path.parent.mkdir()
+            except OSError:
+                pass
+            return
+        try:
+            self.write_json(index_path, index.asdict(), indent=None)
+        except OSError as e:
+            logger.debug("Could not save tree index of '%s': %s", tree.dataset_id, e)
+        else:
+            index.modified = False
 
     def get_field(
         self, entry: DataEntry, datatype: ty.Type[Field[ty.Any, ty.Any]]
@@ -202,15 +322,13 @@ class FileSystem(LocalStore):
                 raise FrameTreeUsageError(
                     "Cannot change extension of file-set when copying to file_system store"
                 )
-        # Create target directory if it doesn't exist already
-        copied_fileset = fileset.copy(
+        return transfer_fileset(
+            fileset,
             dest_dir=fspath.parent,
+            mode=self.transfer_mode,
             collation=fileset.CopyCollation.adjacent,
             new_stem=new_stem,
-            make_dirs=True,
-            overwrite=True,
         )
-        return copied_fileset
 
     def put_field(self, field: Field, entry: DataEntry) -> None:
         """Put a field into the specified data entry
@@ -240,8 +358,11 @@ class FileSystem(LocalStore):
         ty.Dict[str, ty.Any] or None
             the retrieved provenance or None if it doesn't exist
         """
-        with open(self._fileset_prov_fspath(entry)) as f:
-            provenance = json.load(f)
+        try:
+            with open(self._fileset_prov_fspath(entry)) as f:
+                provenance = json.load(f)
+        except FileNotFoundError:
+            return None
         return provenance
 
     def put_fileset_provenance(
@@ -275,9 +396,12 @@ class FileSystem(LocalStore):
             the retrieved provenance or None if it doesn't exist
         """
         fspath, key = self._fields_prov_fspath_and_key(entry)
-        with open(fspath) as f:
-            fields_provenance = json.load(f)
-        return fields_provenance[key]
+        try:
+            with open(fspath) as f:
+                fields_provenance = json.load(f)
+        except FileNotFoundError:
+            return None
+        return fields_provenance.get(key)
 
     def put_field_provenance(
         self, provenance: ty.Dict[str, ty.Any], entry: DataEntry
@@ -294,6 +418,63 @@ class FileSystem(LocalStore):
         fspath, key = self._fields_prov_fspath_and_key(entry)
         self.update_json(fspath, key, provenance)
 
+    def item_cache_key(
+        self, entry: DataEntry
+    ) -> ty.Optional[ty.Tuple[ty.Hashable, ty.Optional[ty.Hashable]]]:
+        """Items are cached by the path to the file-set or fields JSON, along with its
+        modification time and size
+
+        Parameters
+        ----------
+        entry : DataEntry
+            the entry to return the cache key for
+
+        Returns
+        -------
+        cache_key : tuple[Hashable, Hashable or None] or None
+            the location of the entry and its change token
+        """
+        if entry.uri is None:
+            return None
+        if "::" in entry.uri:
+            fspath, key = self._fields_fspath_and_key(entry)
+        else:
+            fspath, key = self._fileset_fspath(entry), None
+        location = (os.path.abspath(fspath), key)
+        try:
+            stat = os.stat(fspath)
+        except OSError:
+            return location, None
+        if self._is_racy({location: stat.st_mtime_ns}, time.time_ns()):
+            return location, None
+        return location, (stat.st_mtime_ns, stat.st_size)
+
+    def item_change_token(self, entry: DataEntry) -> ty.Optional[ty.Any]:
+        """The change token of a file-set is the sizes and modification times of all of
+        its files (including those of directories and side-cars). Fields are read from
+        their JSON file to check them anyway, so don't have one
+
+        Parameters
+        ----------
+        entry : DataEntry
+            the entry to return the change token of
+
+        Returns
+        -------
+        token : list or None
+            the paths, sizes and modification times of the files of the file-set
+        """
+        if entry.uri is None or "::" in entry.uri:
+            return None
+        try:
+            stats = {str(p): os.stat(p) for p in entry.item.all_file_paths()}
+        except OSError:
+            return None
+        mtimes = {p: s.st_mtime_ns for p, s in stats.items()}
+        if self._is_racy(mtimes, time.time_ns()):
+            return None
+        return sorted([p, s.st_size, s.st_mtime_ns] for p, s in stats.items())
+
     def fileset_uri(self, path: str, datatype: type, row: DataRow) -> str:
         """Returns the "uri" (e.g. file-system path relative to root dir) of a file-set
         entry at the given path relative to the given row
@@ -416,6 +597,201 @@ class FileSystem(LocalStore):
                 relpath /= dataset_name
         return relpath
 
+    def _scan_tree_dirs(
+        self, dataset_path: ty.Union[str, Path], depth: int
+    ) -> ty.Tuple[ty.List[ty.Tuple[str, ...]], ty.Dict[str, int]]:
+        """Scans the directories of the dataset down to the depth of the hierarchy,
+        skipping special directories (e.g. hidden or ``__frametree__`` directories)
+        without descending into them
+
+        Parameters
+        ----------
+        dataset_path : str or Path
+            the path to the root of the dataset
+        depth : int
+            the depth of the leaf directories (i.e. the length of the hierarchy)
+
+        Returns
+        -------
+        leaves : list[tuple[str, ...]]
+            the tree paths to the leaf directories, sorted by their relative paths
+        mtimes : dict[str, int]
+            the modification times of the directories above the leaf layer, relative
+            to the dataset root
+        """
+
+        def scan(
+            tree_path: ty.Tuple[str, ...],
+        ) -> ty.Tuple[ty.List[ty.Tuple[str, ...]], ty.Dict[str, int]]:
+            dpath = os.path.join(dataset_path, *tree_path)
+            # Stat the directory before it is read so that any changes made during
+            # the scan invalidate the index
+            mtimes = {str(Path(*tree_path)): os.stat(dpath).st_mtime_ns}
+            with os.scandir(dpath) as dir_entries:
+                subdirs = [
+                    tree_path + (e.name,)
+                    for e in dir_entries
+                    if not special_dir_re.match(e.name)
+                    and e.is_dir(follow_symlinks=False)
+                ]
+            if len(tree_path) + 1 == depth:
+                return subdirs, mtimes
+            leaves = []
+            for subdir in subdirs:
+                sub_leaves, sub_mtimes = scan(subdir)
+                leaves.extend(sub_leaves)
+                mtimes.update(sub_mtimes)
+            return leaves, mtimes
+
+        if depth == 0:
+            return [()], {}
+        if depth == 1:
+            leaves, mtimes = scan(())
+        else:
+            # Scan the sub-trees under each top-level directory in parallel
+            mtimes = {str(Path()): os.stat(dataset_path).st_mtime_ns}
+            with os.scandir(dataset_path) as dir_entries:
+                top_dirs = [
+                    (e.name,)
+                    for e in dir_entries
+                    if not special_dir_re.match(e.name)
+                    and e.is_dir(follow_symlinks=False)
+                ]
+            leaves = []
+            with ThreadPoolExecutor(
+                max_workers=min(self.MAX_SCAN_WORKERS, len(top_dirs)) or 1
+            ) as executor:
+                for sub_leaves, sub_mtimes in executor.map(scan, top_dirs):
+                    leaves.extend(sub_leaves)
+                    mtimes.update(sub_mtimes)
+        leaves.sort(key=lambda p: os.path.join(*p))
+        return leaves, mtimes
+
+    def _scan_row(
+        self, row: DataRow
+    ) -> ty.Tuple[ty.List[ty.List[str]], ty.Dict[str, ty.Optional[int]]]:
+        """Scans the directories of the row for data entries
+
+        Parameters
+        ----------
+        row : DataRow
+            the row to scan
+
+        Returns
+        -------
+        entries : list[list[str]]
+            the path, type ("fileset" or "field") and URI of each entry found
+        mtimes : dict[str, int or None]
+            the modification times of the directories/files that were scanned
+            (None if they don't exist), relative to the dataset root
+        """
+
+        def filter_entry_dir(entry_dir: Path) -> ty.Iterator[Path]:
+            for subpath in entry_dir.iterdir():
+                entry_name = subpath.name
+                if (
+                    not entry_name.startswith(".")
+                    and entry_name != self.FRAMETREE_DIR
+                    and entry_name
+                    not in (
+                        self.FIELDS_FNAME,
+                        self.FIELDS_PROV_FNAME,
+                        self.FIELDS_FNAME + self.LOCK_SUFFIX,
+                    )
+                    and not entry_name.endswith(self.PROV_SUFFIX)
+                ):
+                    yield subpath
+
+        root_dir = full_path(row.frameset.id)
+        entries = []
+        # The directories/files are stat'ed before they are read so that any changes
+        # made during the scan will be picked up the next time the row is populated
+        mtimes = self._stat_mtimes(
+            root_dir, [str(self._row_relpath(row, dataset_name="").parent)]
+        )
+
+        # Iterate through all directories saved for the source and dataset derivatives
+        for dataset_name in self._row_dataset_names(row):
+            row_relpath = str(self._row_relpath(row, dataset_name=dataset_name))
+            fields_relpath = str(Path(row_relpath) / self.FIELDS_FNAME)
+            mtimes.update(self._stat_mtimes(root_dir, [row_relpath, fields_relpath]))
+            row_dir = root_dir / row_relpath
+            if row_dir.exists():
+                # Filter contents of directory to omit fields JSON and provenance and
+                # add file-set entries
+                for entry_fspath in filter_entry_dir(row_dir):
+                    path = str(entry_fspath.relative_to(row_dir))
+                    if dataset_name is not None:
+                        path += "@" + dataset_name
+                    entries.append(
+                        [path, "fileset", str(entry_fspath.relative_to(root_dir))]
+                    )
+                # Add field entries
+                fields_json = row_dir / self.FIELDS_FNAME
+                try:
+                    with open(fields_json) as f:
+                        fields_dict = json.load(f)
+                except FileNotFoundError:
+                    pass
+                else:
+                    for name in fields_dict:
+                        path = (
+                            f"{name}@{dataset_name}"
+                            if dataset_name is not None
+                            else name
+                        )
+                        entries.append(
+                            [
+                                path,
+                                "field",
+                                str(fields_json.relative_to(root_dir)) + "::" + name,
+                            ]
+                        )
+        return entries, mtimes
+
+    def _tree_index_path(self, dataset_id: str) -> Path:
+        return Path(dataset_id) / self.FRAMETREE_DIR / self.TREE_INDEX_FNAME
+
+    def _tree_index_definition(self, tree: DataTree) -> ty.Dict[str, ty.Any]:
+        """The parts of the frameset definition that determine the IDs resolved from
+        the leaves of the tree, normalised into JSON-compatible types"""
+        frameset = tree.frameset
+        return json.loads(
+            json.dumps(
+                {
+                    "axes": f"{frameset.axes.__module__}.{frameset.axes.__name__}",
+                    "id_patterns": frameset.id_patterns,
+                    "include": frameset.include,
+                    "exclude": frameset.exclude,
+                }
+            )
+        )
+
+    def _tree_index_ids(self, tree: DataTree) -> ty.List[ty.Dict[str, ty.Any]]:
+        leaves = tree.root.children.get(max(tree.frameset.axes), {})
+        return [{str(f): i for f, i in r.ids.items()} for r in leaves.values()]
+
+    @classmethod
+    def _stat_mtimes(
+        cls, root_dir: Path, relpaths: ty.Iterable[str]
+    ) -> ty.Dict[str, ty.Optional[int]]:
+        mtimes = {}
+        for relpath in relpaths:
+            try:
+                mtimes[relpath] = os.stat(Path(root_dir) / relpath).st_mtime_ns
+            except FileNotFoundError:
+                mtimes[relpath] = None
+        return mtimes
+
+    @classmethod
+    def _mtimes_match(cls, root_dir: Path, mtimes: ty.Dict[str, ty.Optional[int]]):
+        return cls._stat_mtimes(root_dir, mtimes) == mtimes
+
+    @classmethod
+    def _is_racy(cls, mtimes: ty.Dict[str, ty.Optional[int]], scan_time: int) -> bool:
+        threshold = scan_time - int(cls.RACY_MTIME_WINDOW * 1e9)
+        return any(m is not None and m > threshold for m in mtimes.values())
+
     def _row_dataset_names(self, row: DataRow) -> ty.List[str]:
         """list all dataset names stored in the given row
 
@@ -15,6 +15,7 @@ from frametree.core.entry import DataEntry
 from frametree.core.frameset import FrameSet
 from frametree.core.row import DataRow
 from frametree.core.store import RemoteStore
+from frametree.core.store.checksums import hash_fileset
 from frametree.core.tree import DataTree
 from frametree.core.utils import full_path
 
@@ -41,7 +42,6 @@ class MockRemote(RemoteStore):
 
     remote_dir: Path = attrs.field(converter=full_path)
     mock_delay: float = 0
-    connected: bool = False
     "Mock delay used to simulate time it takes to download from remote"
 
     SITE_LICENSES_DIR = "LICENSE"
@@ -50,6 +50,7 @@ class MockRemote(RemoteStore):
     NON_LEAVES_DIR = "non-leaves"
     FIELDS_FILE = "__FIELD__"
     CHECKSUMS_FILE = "__CHECKSUMS__.json"
+    CHECKSUM_ALGORITHM = "sha256"
 
     #############################
     # Store abstractmethods #
@@ -166,21 +167,24 @@ class MockRemote(RemoteStore):
             definition = None
         return definition  # type: ignore[no-any-return]
 
-    def connect(self) -> None:
+    def connect(self) -> MockSession:
         """
         If a connection session is required to the store manage it here
         """
-        self.connected = True
+        return MockSession()
 
-    def disconnect(self, session: ty.Any) -> None:
+    def disconnect(self, session: MockSession) -> None:
         """
         If a connection session is required to the store manage it here
         """
-        self.connected = False
+        session.active = False
+
+    def check_connection(self, session: MockSession) -> bool:
+        return session.active
 
     def get_provenance(self, entry: DataEntry) -> ty.Dict[str, ty.Any]:
         self._check_connected()
-        prov_path = entry.uri.with_suffix(".json")
+        prov_path = self.entry_fspath(entry).with_suffix(".json")
         if prov_path.exists():
             with open(prov_path) as f:
                 provenance = json.load(f)
@@ -192,7 +196,7 @@ class MockRemote(RemoteStore):
         self, provenance: ty.Dict[str, ty.Any], entry: DataEntry
     ) -> None:
         self._check_connected()
-        prov_path = entry.uri.with_suffix(".json")
+        prov_path = self.entry_fspath(entry).with_suffix(".json")
         with open(prov_path, "w") as f:
             json.dump(provenance, f)
 
@@ -233,12 +237,49 @@ class MockRemote(RemoteStore):
 
     def download_files(self, entry: DataEntry, download_dir: Path) -> Path:
         self._check_connected()
-        fileset = FileSet(self.iterdir(self.entry_fspath(entry)))
         data_path = download_dir / "downloaded"
+        fileset = FileSet(self.iterdir(self.entry_fspath(entry)))
         fileset.copy(data_path, make_dirs=True, mode=fileset.CopyMode.link)
         time.sleep(self.mock_delay)
         return data_path
 
+    def download_headers(self, entry: DataEntry, probe_dir: Path, nbytes: int) -> bool:
+        self._check_connected()
+        truncated = False
+        for top_path in self.iterdir(self.entry_fspath(entry)):
+            sub_paths = sorted(top_path.rglob("*")) if top_path.is_dir() else []
+            for path in [top_path] + sub_paths:
+                dest_path = probe_dir / path.relative_to(top_path.parent)
+                if path.is_dir():
+                    dest_path.mkdir(parents=True, exist_ok=True)
+                    continue
+                with open(path, "rb") as fsrc, open(dest_path, "wb") as fdest:
+                    fdest.write(fsrc.read(nbytes))
+                truncated |= path.stat().st_size > nbytes
+        return truncated
+
+    def list_files(self, entry: DataEntry) -> ty.Dict[str, int]:
+        self._check_connected()
+        entry_fspath = self.entry_fspath(entry)
+        sizes = {}
+        for top_path in self.iterdir(entry_fspath):
+            if top_path.is_dir():
+                paths = sorted(p for p in top_path.rglob("*") if p.is_file())
+            else:
+                paths = [top_path]
+            for path in paths:
+                sizes[str(path.relative_to(entry_fspath))] = path.stat().st_size
+        time.sleep(self.mock_delay)
+        return sizes
+
+    def download_chunk(
+        self, entry: DataEntry, path: str, offset: int, nbytes: int
+    ) -> bytes:
+        self._check_connected()
+        with open(self.entry_fspath(entry) / path, "rb") as f:
+            f.seek(offset)
+            return f.read(nbytes)
+
     def upload_files(self, cache_path: Path, entry: DataEntry) -> None:
         self._check_connected()
         entry_fspath = self.entry_fspath(entry)
@@ -309,12 +350,21 @@ class MockRemote(RemoteStore):
         uri: str
             uri of the data item to download the checksums for
         """
-        fspath = self.remote_dir / uri / self.CHECKSUMS_FILE
-        if not fspath.exists():
-            return None
-        with open(fspath) as f:
-            checksums = json.load(f)
-        return checksums
+        return self._read_checksums(uri)
+
+    def get_checksums_many(
+        self, uris: ty.Sequence[str]
+    ) -> ty.Dict[str, ty.Optional[ty.Dict[str, str]]]:
+        """
+        Downloads the checksum digests of multiple file-sets at once
+
+        Parameters
+        ----------
+        uris: Sequence[str]
+            uris of the data items to download the checksums for
+        """
+        self._check_connected()
+        return {uri: self._read_checksums(uri) for uri in uris}
 
     def calculate_checksums(self, fileset: FileSet) -> ty.Dict[str, str]:
         """
@@ -327,7 +377,14 @@ class MockRemote(RemoteStore):
         uri: str
             uri of the data item to download the checksums for
         """
-        return fileset.hash_files()
+        return hash_fileset(
+            fileset, self.CHECKSUM_ALGORITHM, use_mmap=self.HASH_WITH_MMAP
+        )
+
+    def cache_path(self, uri: str) -> Path:
+        """The URIs of the mock remote are paths relative to the remote directory,
+        which are mirrored within the cache directory"""
+        return self.cache_dir / uri
 
     ##################
     # Helper methods #
@@ -350,7 +407,7 @@ class MockRemote(RemoteStore):
         order_key: int | str | None = None,
     ) -> DataEntry:
         self._check_connected()
-        uri = self.get_row_path(row) / path
+        uri = self.get_row_path(row).relative_to(self.remote_dir) / path
         if order_key is not None:
             uri /= f"__order__{order_key}"
         entry = row.found_entry(
@@ -431,11 +488,27 @@ class MockRemote(RemoteStore):
             )
         )
 
+    def _read_checksums(self, uri: str) -> ty.Optional[ty.Dict[str, str]]:
+        fspath = self.remote_dir / uri / self.CHECKSUMS_FILE
+        if not fspath.exists():
+            return None
+        with open(fspath) as f:
+            checksums = json.load(f)
+        return checksums
+
     def _check_connected(self) -> None:
-        if not self.connected:
+        session = self.connection.session
+        if session is None or not session.active:
             raise RuntimeError("Mock data store has not been connected")
 
 
+@attrs.define(eq=False)
+class MockSession:
+    "Session returned by ``MockRemote.connect``, which is inactive once disconnected"
+
+    active: bool = True
+
+
 class AlternateMockRemote(MockRemote):
     """An alternative mock remote with `put_checksums` implemented for store types like
     Flywheel that don't implement internal checksums